@@ -0,0 +1,8 @@
+"""
+Набор бенчмарков VLESS to Xray Converter
+
+Содержит генератор синтетического корпуса ссылок и раннер, измеряющий
+производительность отдельных этапов конвертации.
+
+Запуск: python -m benchmarks.runner --help
+"""
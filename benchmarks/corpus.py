@@ -0,0 +1,138 @@
+"""
+Генератор синтетического корпуса VLESS ссылок
+
+Корпус детерминирован при фиксированном seed и покрывает типы безопасности
+reality/tls/none, транспорты tcp/ws/grpc, адреса IPv4/IPv6/домены,
+а также содержит заданную долю некорректных строк.
+
+Использование: python -m benchmarks.corpus -n 10000 --seed 1 > corpus.txt
+"""
+
+import sys
+import random
+import argparse
+from typing import Iterator, List
+
+
+SECURITIES = ('reality', 'tls', 'none')
+NETWORKS = ('tcp', 'ws', 'grpc')
+HOST_KINDS = ('ipv4', 'ipv6', 'domain')
+FINGERPRINTS = ('chrome', 'firefox', 'safari', 'randomized')
+SNI_POOL = ('www.microsoft.com', 'www.apple.com', 'dl.google.com', 'cdn.example.net')
+
+_BASE64URL = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_'
+
+# Шаблоны некорректных строк
+_MALFORMED = (
+    'vless://{uuid}{host}:443?security=tls',
+    'vless://{uuid}@{host}:port?type=tcp',
+    'vless://{uuid}@[{host}:443',
+    'vmess://{uuid}@{host}:443',
+    'vless://',
+    '{uuid}',
+)
+
+
+def _uuid(rng: random.Random) -> str:
+    value = f"{rng.getrandbits(128):032x}"
+    return f"{value[:8]}-{value[8:12]}-{value[12:16]}-{value[16:20]}-{value[20:]}"
+
+
+def _host(rng: random.Random, kind: str) -> str:
+    if kind == 'ipv4':
+        return '.'.join(str(rng.randint(1, 254)) for _ in range(4))
+    if kind == 'ipv6':
+        return '[2001:db8:{:x}::{:x}]'.format(rng.getrandbits(16), rng.getrandbits(16))
+    return f"node{rng.randint(1, 99999)}.example{rng.randint(1, 50)}.com"
+
+
+def make_link(rng: random.Random, security: str = None, network: str = None) -> str:
+    """
+    Создает одну корректную VLESS ссылку
+
+    Args:
+        rng: Генератор случайных чисел
+        security: Тип безопасности (по умолчанию случайный)
+        network: Тип транспорта (по умолчанию случайный)
+
+    Returns:
+        Строка VLESS ссылки
+    """
+    security = security or rng.choice(SECURITIES)
+    network = network or rng.choice(NETWORKS)
+    host = _host(rng, rng.choice(HOST_KINDS))
+
+    params = [f"type={network}", f"security={security}"]
+    if security == 'reality':
+        params.append('pbk=' + ''.join(rng.choice(_BASE64URL) for _ in range(43)))
+        params.append(f"sid={rng.getrandbits(32):08x}")
+        params.append(f"sni={rng.choice(SNI_POOL)}")
+        params.append(f"fp={rng.choice(FINGERPRINTS)}")
+        params.append('flow=xtls-rprx-vision')
+    elif security == 'tls':
+        params.append(f"sni={rng.choice(SNI_POOL)}")
+        params.append('alpn=h2%2Chttp%2F1.1')
+        params.append(f"fp={rng.choice(FINGERPRINTS)}")
+
+    if network == 'ws':
+        params.append(f"path=%2Fws{rng.randint(1, 999)}")
+        params.append(f"host={rng.choice(SNI_POOL)}")
+    elif network == 'grpc':
+        params.append(f"serviceName=svc{rng.randint(1, 999)}")
+        params.append(f"mode={rng.choice(('gun', 'multi'))}")
+    elif rng.random() < 0.2:
+        params.append('headerType=http')
+        params.append('path=%2F')
+
+    return f"vless://{_uuid(rng)}@{host}:{rng.randint(1, 65535)}?{'&'.join(params)}#node-{rng.getrandbits(24):06x}"
+
+
+def iter_corpus(count: int, seed: int = 0, malformed_ratio: float = 0.05) -> Iterator[str]:
+    """
+    Лениво генерирует корпус ссылок
+
+    Args:
+        count: Количество строк
+        seed: Начальное значение генератора
+        malformed_ratio: Доля некорректных строк
+
+    Yields:
+        Строки корпуса
+    """
+    rng = random.Random(seed)
+    for _ in range(count):
+        if rng.random() < malformed_ratio:
+            pattern = rng.choice(_MALFORMED)
+            yield pattern.format(uuid=_uuid(rng), host=_host(rng, 'domain'))
+        else:
+            yield make_link(rng)
+
+
+def generate_corpus(count: int, seed: int = 0, malformed_ratio: float = 0.05) -> List[str]:
+    """
+    Генерирует корпус ссылок целиком
+
+    Args:
+        count: Количество строк
+        seed: Начальное значение генератора
+        malformed_ratio: Доля некорректных строк
+
+    Returns:
+        Список строк корпуса
+    """
+    return list(iter_corpus(count, seed, malformed_ratio))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Генератор синтетического корпуса VLESS ссылок')
+    parser.add_argument('--count', '-n', type=int, default=10000, help='Количество строк (по умолчанию: 10000)')
+    parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора (по умолчанию: 0)')
+    parser.add_argument('--malformed', type=float, default=0.05, help='Доля некорректных строк (по умолчанию: 0.05)')
+    args = parser.parse_args()
+
+    for line in iter_corpus(args.count, args.seed, args.malformed):
+        sys.stdout.write(line + '\n')
+
+
+if __name__ == '__main__':
+    main()
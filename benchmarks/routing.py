@@ -0,0 +1,261 @@
+"""
+Бенчмарк компиляции правил маршрутизации
+
+Генерирует routing.rules в духе шаблона openwrt-reverse-proxy с
+подмешанными списками доменов и подсетей (дубликаты, поддомены уже
+перечисленных доменов, пересекающиеся подсети, правила, разбитые на
+части), компилирует их и выводит число правил, доменов и подсетей до и
+после. Затем проверяет на случайных запросах, что первое сработавшее
+правило ведет в тот же outbound, что и до компиляции.
+
+Использование:
+    python -m benchmarks.routing -n 50000
+"""
+
+import os
+import re
+import sys
+import time
+import bisect
+import random
+import argparse
+import ipaddress
+from typing import List, Optional
+
+# Бенчмарк запускается из корня репозитория или как модуль
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vless_converter.routing import compile_rules
+
+_WORDS = ('mail', 'cdn', 'api', 'img', 'shop', 'news', 'video', 'auth', 'static', 'm')
+_ZONES = ('com', 'net', 'org', 'ru', 'io')
+_OUTBOUNDS = ('proxy', 'direct', 'blocked')
+
+
+def random_domain(rng: random.Random, depth: int) -> str:
+    """Домен с depth метками перед зоной"""
+    labels = [rng.choice(_WORDS) if rng.random() < 0.5 else f"s{rng.randrange(500)}"
+              for _ in range(depth - 1)]
+    labels.append(f"site{rng.randrange(300)}")
+    return '.'.join(labels + [rng.choice(_ZONES)])
+
+
+def random_network(rng: random.Random) -> str:
+    """Подсеть IPv4 или IPv6 (иногда одиночный адрес)"""
+    if rng.random() < 0.8:
+        prefix = rng.choice((16, 20, 24, 24, 28, 32))
+        # Адреса сгруппированы, как в реальных списках сетей провайдеров
+        address = ipaddress.IPv4Address((rng.randrange(8) << 28) | rng.randrange(1 << 14) << 8)
+        network = ipaddress.ip_network(f"{address}/{prefix}", strict=False)
+    else:
+        prefix = rng.choice((32, 48, 64))
+        address = ipaddress.IPv6Address((0x2001 << 112) | rng.randrange(1 << 64) << 48)
+        network = ipaddress.ip_network(f"{address}/{prefix}", strict=False)
+    return str(network.network_address) if prefix == network.max_prefixlen else str(network)
+
+
+def generate_rules(count: int, seed: int = 0) -> list:
+    """
+    Генерирует правила маршрутизации
+
+    Args:
+        count: Примерное общее число доменов и подсетей
+        seed: Начальное значение генератора
+
+    Returns:
+        Список правил
+    """
+    rng = random.Random(seed)
+    rules = [
+        {"type": "field", "inboundTag": ["bridge"], "domain": ["full:reverse.xui"], "outboundTag": "proxy"},
+    ]
+    domains = []
+    total = 0
+    outbound = 'proxy'
+    while total < count:
+        # Списки часто разбиты на несколько правил подряд с одним outbound
+        if rng.random() < 0.3:
+            outbound = rng.choice(_OUTBOUNDS)
+        inbound = rng.choice((None, ['bridge'], ['bridge', 'socks']))
+        rule = {"type": "field", "outboundTag": outbound}
+        if inbound:
+            rule['inboundTag'] = list(inbound)
+        if rng.random() < 0.7:
+            entries = []
+            for _ in range(rng.randrange(1, 200)):
+                roll = rng.random()
+                if domains and roll < 0.15:
+                    entries.append(rng.choice(domains))
+                elif domains and roll < 0.35:
+                    # Поддомен уже перечисленного домена
+                    parent = rng.choice(domains).partition(':')[2]
+                    entries.append(f"{rng.choice(('domain', 'full'))}:{rng.choice(_WORDS)}.{parent}")
+                elif roll < 0.4:
+                    entries.append(f"keyword:{rng.choice(_WORDS)}{rng.randrange(50)}")
+                elif roll < 0.42:
+                    entries.append(f"geosite:{rng.choice(('cn', 'google', 'category-ads'))}")
+                else:
+                    entries.append(f"{rng.choice(('domain', 'domain', 'full'))}:{random_domain(rng, rng.randrange(1, 4))}")
+            domains.extend(entry for entry in entries if entry.startswith(('domain:', 'full:')))
+            rule['domain'] = entries
+        else:
+            rule['ip'] = [random_network(rng) for _ in range(rng.randrange(1, 200))]
+            if rng.random() < 0.1:
+                rule['ip'].append('geoip:private')
+        total += len(rule.get('domain', rule.get('ip', ())))
+        rules.append(rule)
+
+    rules.append({"type": "field", "inboundTag": ["bridge"], "outboundTag": "direct"})
+    return rules
+
+
+class _Rule:
+    """Правило, подготовленное для быстрой проверки запроса"""
+
+    def __init__(self, rule: dict):
+        self.target = rule.get('outboundTag') or rule.get('balancerTag')
+        self.inbound = set(rule['inboundTag']) if 'inboundTag' in rule else None
+        # Пустой список в Xray — отсутствие условия
+        self.has_domain = bool(rule.get('domain'))
+        self.full = set()
+        self.suffixes = set()
+        self.keywords = []
+        self.patterns = []
+        self.opaque = set()
+        for entry in rule.get('domain', ()):
+            kind, sep, value = entry.partition(':')
+            if not sep:
+                self.keywords.append(entry)
+            elif kind == 'full':
+                self.full.add(value)
+            elif kind == 'domain':
+                self.suffixes.add(value)
+            elif kind == 'keyword':
+                self.keywords.append(value)
+            elif kind == 'regexp':
+                self.patterns.append(re.compile(value))
+            else:
+                self.opaque.add(entry)
+
+        self.has_ip = bool(rule.get('ip'))
+        ranges = []
+        for entry in rule.get('ip', ()):
+            try:
+                network = ipaddress.ip_network(entry, strict=False)
+            except ValueError:
+                self.opaque.add(entry)
+                continue
+            ranges.append((network.version, int(network.network_address), int(network.broadcast_address)))
+        ranges.sort()
+        self.starts = [start[:2] for start in ranges]
+        self.ranges = ranges
+
+    def _domain_matches(self, domain: str, tags: set) -> bool:
+        if domain in self.full or tags & self.opaque:
+            return True
+        labels = domain.split('.')
+        for index in range(len(labels)):
+            if '.'.join(labels[index:]) in self.suffixes:
+                return True
+        return (any(keyword in domain for keyword in self.keywords)
+                or any(pattern.search(domain) for pattern in self.patterns))
+
+    def _ip_matches(self, ip, tags: set) -> bool:
+        if tags & self.opaque:
+            return True
+        value = (ip.version, int(ip))
+        # Подсети могут вкладываться друг в друга, поэтому проверяются все начинающиеся не позже адреса
+        for index in range(bisect.bisect_right(self.starts, value) - 1, -1, -1):
+            version, start, end = self.ranges[index]
+            if version != ip.version:
+                break
+            if start <= value[1] <= end:
+                return True
+        return False
+
+    def matches(self, inbound: str, domain: Optional[str], ip, tags: set) -> bool:
+        if self.inbound is not None and inbound not in self.inbound:
+            return False
+        if self.has_domain and (domain is None or not self._domain_matches(domain, tags)):
+            return False
+        if self.has_ip and (ip is None or not self._ip_matches(ip, tags)):
+            return False
+        return True
+
+
+def route(rules: List[_Rule], inbound: str, domain: Optional[str], ip, tags: set = frozenset()):
+    """Возвращает назначение первого сработавшего правила (tags — сработавшие geosite/geoip)"""
+    for rule in rules:
+        if rule.matches(inbound, domain, ip, tags):
+            return rule.target
+    return None
+
+
+def random_queries(rules: list, count: int, seed: int) -> list:
+    """Запросы: домены и адреса из правил, их поддомены и соседи, случайные значения"""
+    rng = random.Random(seed)
+    domains = [entry.partition(':')[2] for rule in rules for entry in rule.get('domain', ())
+               if entry.startswith(('domain:', 'full:', 'keyword:'))]
+    networks = [ipaddress.ip_network(entry, strict=False) for rule in rules for entry in rule.get('ip', ())
+                if not entry.startswith('geoip:')]
+    opaque = ['geosite:cn', 'geosite:google', 'geosite:category-ads', 'geoip:private']
+
+    queries = []
+    for _ in range(count):
+        inbound = rng.choice(('bridge', 'socks', 'other'))
+        tags = {rng.choice(opaque)} if rng.random() < 0.05 else frozenset()
+        domain = ip = None
+        roll = rng.random()
+        if roll < 0.6 and domains:
+            domain = rng.choice(domains)
+            if rng.random() < 0.4:
+                domain = f"{rng.choice(_WORDS)}.{domain}"
+            elif rng.random() < 0.2:
+                domain = 'x' + domain
+        elif roll < 0.9 and networks:
+            network = rng.choice(networks)
+            offset = rng.randrange(-2, network.num_addresses + 2)
+            ip = ipaddress.ip_address(max(0, min(int(network.network_address) + offset,
+                                                 (1 << network.max_prefixlen) - 1)) if network.version == 6
+                                      else max(0, min(int(network.network_address) + offset, (1 << 32) - 1)))
+        else:
+            domain = random_domain(rng, rng.randrange(1, 4))
+        queries.append((inbound, domain, ip, tags))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк компиляции правил маршрутизации')
+    parser.add_argument('--count', '-n', type=int, default=50000, help='Число доменов и подсетей в правилах (по умолчанию: 50000)')
+    parser.add_argument('--queries', type=int, default=20000, help='Число запросов для проверки (по умолчанию: 20000)')
+    parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора')
+    args = parser.parse_args()
+
+    rules = generate_rules(args.count, args.seed)
+    start = time.perf_counter()
+    compiled = compile_rules(rules)
+    elapsed = time.perf_counter() - start
+
+    def count(items, field):
+        return sum(len(rule.get(field, ())) for rule in items)
+
+    print(f"{'':<12}{'до':>10}{'после':>10}")
+    print(f"{'Правил':<12}{len(rules):>10}{len(compiled):>10}")
+    print(f"{'Доменов':<12}{count(rules, 'domain'):>10}{count(compiled, 'domain'):>10}")
+    print(f"{'Подсетей':<12}{count(rules, 'ip'):>10}{count(compiled, 'ip'):>10}")
+    print(f"Компиляция: {elapsed * 1000:.1f} мс")
+
+    before = [_Rule(rule) for rule in rules]
+    after = [_Rule(rule) for rule in compiled]
+    queries = random_queries(rules, args.queries, args.seed + 1)
+    for inbound, domain, ip, tags in queries:
+        expected = route(before, inbound, domain, ip, tags)
+        actual = route(after, inbound, domain, ip, tags)
+        if expected != actual:
+            print(f"Ошибка: запрос {inbound} {domain} {ip}: {expected} -> {actual}", file=sys.stderr)
+            sys.exit(1)
+    print(f"Проверено запросов: {len(queries)}, маршруты совпадают")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""
+Раннер бенчмарков по этапам конвертации
+
+Измеряет этапы parse_vless_url, create_xray_config, apply_template и
+сериализацию JSON на синтетическом корпусе. Для каждого этапа выводит
+операций в секунду и задержки p50/p99, а также пиковое потребление памяти.
+Результат можно сохранить как базовую линию и сравнивать с ней следующие
+запуски: при регрессии сверх порога раннер завершается с ненулевым кодом.
+
+Использование:
+    python -m benchmarks.runner --save-baseline baseline.json
+    python -m benchmarks.runner --baseline baseline.json --threshold 10
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from typing import Callable, Iterable, List
+
+# Раннер запускается из корня репозитория или как модуль
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vless_converter.parser import parse_vless_url, try_parse
+from vless_converter.generator import create_xray_config
+from vless_converter.templates import apply_template, get_registry
+from vless_converter.batch import convert_links
+from vless_converter.parallel import convert_parallel
+from vless_converter.serialization import get_serializer, COMPACT
+from vless_converter.validator import validate_link
+
+from benchmarks.corpus import generate_corpus
+
+
+DEFAULT_THRESHOLD = 10.0
+
+
+def peak_rss_kb() -> int:
+    """Возвращает пиковое потребление памяти процессом в килобайтах"""
+    try:
+        import resource
+    except ImportError:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # На macOS значение в байтах, на Linux — в килобайтах
+    if sys.platform == 'darwin':
+        rss //= 1024
+    return rss
+
+
+def _percentile(sorted_values: List[int], fraction: float) -> int:
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+
+def measure(func: Callable, items: Iterable, repeat: int = 1) -> dict:
+    """
+    Измеряет время выполнения функции на каждом элементе
+
+    Args:
+        func: Измеряемая функция одного аргумента
+        items: Входные данные
+        repeat: Количество проходов по данным
+
+    Returns:
+        Словарь с ops_per_sec, p50_us, p99_us и количеством операций
+    """
+    items = list(items)
+    clock = time.perf_counter_ns
+    latencies = []
+    append = latencies.append
+
+    for _ in range(repeat):
+        for item in items:
+            start = clock()
+            try:
+                func(item)
+            except ValueError:
+                pass
+            append(clock() - start)
+
+    latencies.sort()
+    total_ns = sum(latencies) or 1
+    return {
+        'ops': len(latencies),
+        'ops_per_sec': round(len(latencies) * 1e9 / total_ns, 1),
+        'p50_us': round(_percentile(latencies, 0.50) / 1000, 2),
+        'p99_us': round(_percentile(latencies, 0.99) / 1000, 2),
+    }
+
+
+def run_stages(corpus: List[str], repeat: int = 1) -> dict:
+    """
+    Запускает бенчмарк всех этапов конвертации
+
+    Args:
+        corpus: Строки корпуса
+        repeat: Количество проходов по корпусу
+
+    Returns:
+        Словарь {этап: результаты measure}
+    """
+    parsed = []
+    for line in corpus:
+        try:
+            parsed.append(parse_vless_url(line))
+        except ValueError:
+            pass
+
+    configs = [create_xray_config(data) for data in parsed]
+    links = [link for link, _ in map(try_parse, corpus) if link is not None]
+
+    # Шаблон openwrt-reverse рассчитан на REALITY
+    template = get_registry().compiled('openwrt-reverse')
+    reality = [data for data in parsed if data['params'].get('security') == 'reality']
+
+    return {
+        'parse': measure(parse_vless_url, corpus, repeat),
+        'generate': measure(create_xray_config, parsed, repeat),
+        'validate': measure(validate_link, links, repeat),
+        'template': measure(lambda data: apply_template(template, data), reality, repeat),
+        'serialize': measure(get_serializer(COMPACT).dumps, configs, repeat),
+    }
+
+
+def compare_parallel(corpus: List[str], jobs: int) -> dict:
+    """
+    Сравнивает пропускную способность последовательного и параллельного режимов
+
+    Args:
+        corpus: Строки корпуса
+        jobs: Количество процессов для параллельного режима
+
+    Returns:
+        Словарь {режим: ссылок в секунду}
+    """
+    links = list(enumerate(corpus, 1))
+    results = {}
+    for mode, convert in (('serial', lambda: convert_links(links)),
+                          (f'jobs={jobs}', lambda: convert_parallel(links, jobs=jobs))):
+        start = time.perf_counter()
+        for _ in convert():
+            pass
+        elapsed = time.perf_counter() - start
+        results[mode] = round(len(links) / elapsed, 1)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """
+    Сравнивает результаты с базовой линией
+
+    Args:
+        results: Текущие результаты
+        baseline: Сохраненная базовая линия
+        threshold: Допустимое падение ops/sec в процентах
+
+    Returns:
+        Список описаний регрессий (пустой, если регрессий нет)
+    """
+    regressions = []
+    for stage, current in results['stages'].items():
+        previous = baseline.get('stages', {}).get(stage)
+        if not previous:
+            continue
+        limit = previous['ops_per_sec'] * (1 - threshold / 100)
+        if current['ops_per_sec'] < limit:
+            drop = 100 * (1 - current['ops_per_sec'] / previous['ops_per_sec'])
+            regressions.append(
+                f"{stage}: {current['ops_per_sec']:.0f} ops/s против {previous['ops_per_sec']:.0f} (-{drop:.1f}%)"
+            )
+    return regressions
+
+
+def format_table(results: dict) -> str:
+    """Форматирует результаты в виде таблицы"""
+    lines = [f"{'Этап':<12}{'ops/s':>14}{'p50, мкс':>12}{'p99, мкс':>12}{'операций':>12}"]
+    for stage, data in results['stages'].items():
+        lines.append(
+            f"{stage:<12}{data['ops_per_sec']:>14.0f}{data['p50_us']:>12.2f}{data['p99_us']:>12.2f}{data['ops']:>12}"
+        )
+    lines.append(f"Пиковая память: {results['peak_rss_kb'] / 1024:.1f} МБ")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк этапов конвертации VLESS в Xray')
+    parser.add_argument('--count', '-n', type=int, default=20000, help='Размер корпуса (по умолчанию: 20000)')
+    parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора корпуса')
+    parser.add_argument('--repeat', type=int, default=1, help='Количество проходов по корпусу')
+    parser.add_argument('--compare-jobs', type=int, help='Сравнить пакетный режим с параллельным в N процессах')
+    parser.add_argument('--baseline', help='Файл базовой линии для сравнения')
+    parser.add_argument('--save-baseline', help='Сохранить результаты как базовую линию')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'Допустимая регрессия в процентах (по умолчанию: {DEFAULT_THRESHOLD})')
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.count, args.seed)
+    results = {
+        'corpus': {'count': args.count, 'seed': args.seed},
+        'stages': run_stages(corpus, args.repeat),
+    }
+    results['peak_rss_kb'] = peak_rss_kb()
+
+    print(format_table(results))
+
+    if args.compare_jobs:
+        results['parallel'] = compare_parallel(corpus, args.compare_jobs)
+        print("\nПропускная способность пакетного режима:")
+        for mode, rate in results['parallel'].items():
+            print(f"  {mode:<10}{rate:>12.0f} ссылок/с")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"Базовая линия сохранена в файл: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nРегрессии сверх {args.threshold}%:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nРегрессий сверх {args.threshold}% нет")
+
+
+if __name__ == '__main__':
+    main()
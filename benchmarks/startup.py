@@ -0,0 +1,120 @@
+"""
+Проверка бюджета холодного старта CLI
+
+Запускает main.py в новом интерпретаторе с -X importtime для типичных
+вызовов и суммирует собственное время импорта всех модулей, которые не
+загружаются пустым интерпретатором. Завершается с ненулевым кодом, если
+время превышает бюджет или быстрый путь загрузил запрещенный модуль.
+
+Использование: python -m benchmarks.startup --budget-ms 25
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+import subprocess
+from typing import Dict, List, Tuple
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, 'main.py')
+
+DEFAULT_BUDGET_MS = 25.0
+DEFAULT_RUNS = 5
+
+SAMPLE_LINK = (
+    'vless://11111111-2222-3333-4444-555555555555@example.com:443'
+    '?security=reality&type=tcp&pbk=abc&sni=www.example.com&sid=ab&flow=xtls-rprx-vision#node'
+)
+
+# Модули, которые не должны загружаться в быстрых путях CLI
+FORBIDDEN_MODULES = (
+    'argparse', 'typing', 'sqlite3', 'asyncio', 'concurrent.futures',
+    'multiprocessing', 'urllib.parse', 'hashlib', 'orjson',
+)
+
+
+def _importtime(args: List[str]) -> Dict[str, int]:
+    """Запускает интерпретатор с -X importtime и возвращает {модуль: собственное время, мкс}"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime'] + args,
+        cwd=ROOT, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE, text=True, check=False
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(self_us)
+    return modules
+
+
+def measure_startup(args: List[str], runs: int = DEFAULT_RUNS) -> Tuple[float, List[str]]:
+    """
+    Измеряет время импорта, добавленное вызовом CLI
+
+    Args:
+        args: Аргументы интерпретатора (путь к скрипту и его аргументы)
+        runs: Количество запусков, берется лучший результат
+
+    Returns:
+        Кортеж (время в миллисекундах, список загруженных модулей)
+    """
+    baseline = set(_importtime(['-c', 'pass']))
+    best = None
+    modules = []
+    for _ in range(runs):
+        measured = _importtime(args)
+        extra = {name: us for name, us in measured.items() if name not in baseline}
+        total = sum(extra.values()) / 1000
+        if best is None or total < best:
+            best = total
+            modules = sorted(extra)
+    return best, modules
+
+
+def scenarios(output: str) -> Dict[str, List[str]]:
+    """
+    Типичные вызовы CLI
+
+    Args:
+        output: Путь для файла конфигурации
+
+    Returns:
+        Словарь {имя сценария: аргументы интерпретатора}
+    """
+    return {
+        'list-templates': [MAIN, '--list-templates'],
+        'convert': [MAIN, SAMPLE_LINK, '--template', 'openwrt-reverse', '--tag', 'node', '-o', output],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Проверка бюджета холодного старта CLI')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help=f'Допустимое время импорта в миллисекундах (по умолчанию: {DEFAULT_BUDGET_MS})')
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS,
+                        help=f'Количество запусков на сценарий (по умолчанию: {DEFAULT_RUNS})')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        failed = False
+        for name, scenario in scenarios(os.path.join(tmp, 'config.json')).items():
+            elapsed, modules = measure_startup(scenario, args.runs)
+            forbidden = [module for module in FORBIDDEN_MODULES if module in modules]
+            status = 'OK'
+            if elapsed > args.budget_ms or forbidden:
+                status = 'ПРЕВЫШЕН'
+                failed = True
+            print(f"{name:<16}{elapsed:>8.1f} мс  ({len(modules)} модулей)  {status}")
+            if forbidden:
+                print(f"  запрещенные модули: {', '.join(forbidden)}")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Бенчмарк памяти колоночной таблицы ссылок
+
+Сравнивает LinkTable со списком словарей parse_vless_url: занимаемую
+память (по tracemalloc), время построения, выборки по серверу и SNI и
+группировку. Перед замерами проверяется, что материализованные строки
+таблицы совпадают со словарями parse_vless_url.
+
+Использование:
+    python -m benchmarks.table -n 500000
+    python -m benchmarks.table -n 500000 --hosts 200
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+from typing import Callable, List, Tuple
+
+# Бенчмарк запускается из корня репозитория или как модуль
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vless_converter.parser import parse_vless_url
+from vless_converter.table import LinkTable
+
+from benchmarks.corpus import generate_corpus
+
+
+def with_hosts(corpus: List[str], count: int, seed: int = 0) -> List[str]:
+    """
+    Заменяет адреса серверов в ссылках на адреса из пула заданного размера
+
+    В реальных подписках на одном сервере много пользователей, поэтому
+    адреса повторяются сильнее, чем в синтетическом корпусе.
+
+    Args:
+        corpus: Ссылки
+        count: Размер пула адресов
+        seed: Начальное значение генератора
+
+    Returns:
+        Новый список ссылок
+    """
+    rng = random.Random(seed)
+    pool = [f"srv{index}.example.net" for index in range(count)]
+    result = []
+    for url in corpus:
+        head, sep, rest = url.partition('@')
+        if not sep:
+            result.append(url)
+            continue
+        end = rest.find(']') + 1 if rest.startswith('[') else len(rest.partition(':')[0])
+        result.append(f"{head}@{rng.choice(pool)}{rest[end:]}")
+    return result
+
+
+def traced(build: Callable) -> Tuple[object, int]:
+    """
+    Строит структуру и измеряет занятую ею память
+
+    Returns:
+        Кортеж (структура, байт)
+    """
+    tracemalloc.start()
+    try:
+        value = build()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return value, size
+
+
+def timed(func: Callable) -> Tuple[object, float]:
+    """Возвращает (результат, миллисекунд)"""
+    start = time.perf_counter()
+    value = func()
+    return value, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк памяти LinkTable против списка словарей')
+    parser.add_argument('--count', '-n', type=int, default=200000, help='Размер корпуса (по умолчанию: 200000)')
+    parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора корпуса')
+    parser.add_argument('--hosts', type=int, default=0, help='Число различных серверов (по умолчанию: как в корпусе)')
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.count, args.seed, malformed_ratio=0)
+    if args.hosts:
+        corpus = with_hosts(corpus, args.hosts, args.seed)
+
+    # tracemalloc замедляет выделение памяти, поэтому время построения
+    # измеряется отдельным запуском без трассировки
+    build_dicts = lambda: [parse_vless_url(url) for url in corpus]
+    build_table = lambda: LinkTable.from_urls(corpus)
+    _, dicts_time = timed(build_dicts)
+    _, table_time = timed(build_table)
+    dicts, dicts_size = traced(build_dicts)
+    table, table_size = traced(build_table)
+
+    # Таблица должна восстанавливать те же словари
+    step = max(1, len(dicts) // 10000)
+    for row in range(0, len(dicts), step):
+        if table.to_dict(row) != dicts[row]:
+            print(f"Ошибка: строка {row} таблицы отличается от parse_vless_url", file=sys.stderr)
+            sys.exit(1)
+
+    host = dicts[len(dicts) // 2]['server']
+    sni = 'www.apple.com'
+    queries = (
+        ('сервер X', lambda: [d for d in dicts if d['server'] == host],
+         lambda: table.filter(host=host)),
+        ('reality + SNI', lambda: [d for d in dicts if d['params'].get('security') == 'reality'
+                                   and d['params'].get('sni') == sni],
+         lambda: table.filter(security='reality', sni=sni)),
+        ('группы по SNI', lambda: _group(dicts),
+         lambda: table.group_by('sni')),
+    )
+
+    mb = 1024 * 1024
+    print(f"Ссылок: {len(dicts)}, различных серверов: {len(table.distinct('host'))}")
+    print(f"{'':<22}{'список словарей':>18}{'LinkTable':>14}")
+    print(f"{'Память, МБ':<22}{dicts_size / mb:>18.1f}{table_size / mb:>14.1f}")
+    print(f"{'Байт на ссылку':<22}{dicts_size / len(dicts):>18.0f}{table_size / len(dicts):>14.0f}")
+    print(f"{'Построение, с':<22}{dicts_time / 1000:>18.2f}{table_time / 1000:>14.2f}")
+    for name, on_dicts, on_table in queries:
+        expected, dicts_ms = timed(on_dicts)
+        found, table_ms = timed(on_table)
+        if len(expected) != len(found):
+            print(f"Ошибка: запрос '{name}' дал разное число результатов", file=sys.stderr)
+            sys.exit(1)
+        print(f"{name + ', мс':<22}{dicts_ms:>18.1f}{table_ms:>14.1f}")
+
+
+def _group(dicts: List[dict]) -> dict:
+    groups = {}
+    for data in dicts:
+        groups.setdefault(data['params'].get('sni'), []).append(data)
+    return groups
+
+
+if __name__ == '__main__':
+    main()
@@ -7,23 +7,455 @@ VLESS to Xray Converter
 """
 
 import sys
-import argparse
-import json
-from vless_converter import (
-    parse_vless_url,
-    create_xray_config,
-    get_available_templates,
-    load_template,
-    apply_template,
-    save_to_file,
-    display_templates_with_numbers,
-    resolve_template_name
-)
-from vless_converter.utils import format_json_output
+
+# Остальные модули импортируются внутри режимов, которым они нужны:
+# CLI часто вызывается из shell-хуков, и время старта важнее всего
+
+# Опции, которые понимает быстрый путь разбора аргументов
+_FAST_OPTIONS = {
+    '--template': 'template', '-t': 'template',
+    '--output': 'output', '-o': 'output',
+    '--tag': 'tag', '-g': 'tag',
+}
+
+
+def parse_fast_args(argv):
+    """
+    Разбирает типичный вызов без argparse
+
+    Поддерживается только форма "vless://... [--template X] [--tag T] [--output F]".
+
+    Returns:
+        Кортеж (vless_url, tag, template, output) или None, если нужен полный разбор
+    """
+    if not argv or not argv[0].startswith('vless://'):
+        return None
+
+    options = {'template': None, 'output': None, 'tag': None}
+    i = 1
+    while i < len(argv):
+        name = _FAST_OPTIONS.get(argv[i])
+        if name is None or i + 1 >= len(argv) or options[name] is not None:
+            return None
+        value = argv[i + 1]
+        if value.startswith('-'):
+            return None
+        options[name] = value
+        i += 2
+
+    return argv[0], options['tag'], options['template'], options['output']
+
+
+def run_single(vless_url, tag=None, template_value=None, output=None, json_format=None, routing=False):
+    """Режим с аргументами: конвертирует одну ссылку"""
+    from vless_converter.serialization import get_serializer, binary_stdout, PRETTY, BACKEND_JSON
+    from vless_converter.utils import write_atomic
+    # Модули напрямую: для одной ссылки общий конвертер с кэшем не нужен
+    from vless_converter.parser import parse_vless_url
+    from vless_converter.generator import create_xray_config
+    from vless_converter.templates import apply_template, get_registry, resolve_template_name
+
+    try:
+        vless_data = parse_vless_url(vless_url)
+    except Exception as e:
+        print(f"Ошибка парсинга URL: {e}")
+        return
+    
+    # Запрашиваем тег если не задан
+    if not tag:
+        tag = input("Введите тег для конфигурации (по умолчанию: reverse-proxy): ").strip()
+        if not tag:
+            tag = 'reverse-proxy'
+    
+    # Используем шаблон или генерируем базовую конфигурацию
+    if template_value:
+        try:
+            template = get_registry().compiled(resolve_template_name(template_value))
+            
+            # Применяем шаблон с пользовательским тегом
+            config = apply_template(template, vless_data, tag)
+            if routing:
+                compile_config_routing(config)
+        except ValueError as e:
+            print(f"Ошибка: {e}", file=sys.stderr)
+            return 1
+    else:
+        # Генерируем базовую конфигурацию
+        config = create_xray_config(vless_data, tag)
+    
+    # Кодируем один раз: те же байты идут и в stdout, и в файл.
+    # Для одной конфигурации импорт orjson (~8 мс) дороже, чем сама сериализация
+    data = get_serializer(json_format or PRETTY, BACKEND_JSON).dumps(config)
+    stdout = binary_stdout()
+    stdout.write(data + b'\n')
+    stdout.flush()
+    
+    # Сохраняем в файл
+    if output:
+        try:
+            if write_atomic(output, data):
+                print(f"\nКонфигурация сохранена в файл: {output}")
+            else:
+                print(f"\nКонфигурация не изменилась, файл не перезаписан: {output}")
+        except Exception as e:
+            print(f"Ошибка сохранения файла: {e}")
+
+
+def input_links(args, stack):
+    """Возвращает поток (номер строки, ссылка) из --input; с --scan — ссылки, найденные в дампе"""
+    if args.scan:
+        from vless_converter.scanner import scan_file
+        return scan_file(args.input, args.scan_index)
+    from vless_converter.batch import open_input, read_links
+    return read_links(stack.enter_context(open_input(args.input)))
+
+
+def start_validation(args, links):
+    """Подключает проверку ссылок, если задан --strict или --lenient"""
+    if not args.validation:
+        return links, None
+    from vless_converter.validator import ValidationReport, validate_links
+    report = ValidationReport()
+    return validate_links(links, report, strict=args.validation == 'strict'), report
+
+
+def start_probe(args, links):
+    """Проверяет доступность серверов, если задан --probe: остаются доступные ссылки от быстрых к медленным"""
+    if not args.probe:
+        return links
+    from vless_converter.prober import Prober, probe_links
+    ranked, stats = probe_links(links, Prober(args.probe_timeout, args.probe_concurrency))
+    print(f"Проверка доступности: серверов {stats['servers']}, доступно {stats['reachable']}, "
+          f"отброшено ссылок {stats['dropped']}", file=sys.stderr)
+    return ranked
+
+
+def compile_config_routing(config):
+    """Компилирует routing.rules конфигурации или шаблона (--compile-routing) и выводит статистику"""
+    from vless_converter.routing import compile_routing, format_stats
+    print(format_stats(compile_routing(config)), file=sys.stderr)
+
+
+def finish_validation(args, report):
+    """Выводит отчет проверки и возвращает код завершения"""
+    if report is None:
+        return 0
+    print(report.summary(), file=sys.stderr)
+    # В строгом режиме любые замечания делают запуск неуспешным
+    if args.validation == 'strict' and report.valid < report.total:
+        return 1
+    return 0
+
+
+def run_batch(args):
+    """Пакетный режим: конвертирует все ссылки из файла в JSONL"""
+    import sqlite3
+    from contextlib import ExitStack
+    from vless_converter import resolve_template_name
+    from vless_converter.templates import compile_template, get_registry
+    from vless_converter.batch import convert_links, write_jsonl
+    from vless_converter.cache import ConversionCache, convert_links_cached
+    from vless_converter.parallel import convert_parallel
+    from vless_converter.serialization import get_serializer, binary_stdout, COMPACT, PRETTY
+    from vless_converter.writer import write_files
+
+    template = None
+    template_hash = ''
+    if args.template:
+        try:
+            registry = get_registry()
+            template_name = resolve_template_name(args.template)
+            template_hash = registry.content_hash(template_name)
+            if args.compile_routing:
+                # Правила компилируются один раз в шаблоне: плейсхолдеры в них остаются как есть
+                template = registry.load(template_name)
+                compile_config_routing(template)
+                template = compile_template(template)
+                template_hash += '+routing'
+            else:
+                template = registry.compiled(template_name)
+        except ValueError as e:
+            print(f"Ошибка: {e}", file=sys.stderr)
+            return 1
+
+    cache = None
+    report = None
+    try:
+        with ExitStack() as stack:
+            links, report = start_validation(args, input_links(args, stack))
+            links = start_probe(args, links)
+            if args.cache:
+                cache = stack.enter_context(ConversionCache(args.cache))
+                results = convert_links_cached(links, cache, template, template_hash, args.tag)
+            elif args.jobs > 1:
+                results = convert_parallel(links, template, args.tag,
+                                           jobs=args.jobs, chunk_size=args.chunk_size)
+            else:
+                results = convert_links(links, template, args.tag)
+
+            if args.output_dir:
+                written, unchanged, failed = write_files(results, args.output_dir, args.name_pattern,
+                                                         serializer=get_serializer(args.format or PRETTY))
+                converted = written + unchanged
+                print(f"Файлов записано: {written}, без изменений: {unchanged}", file=sys.stderr)
+                out = None
+            elif args.output:
+                out = stack.enter_context(open(args.output, 'wb'))
+            else:
+                out = binary_stdout()
+            if out is not None:
+                converted, failed = write_jsonl(results, out, serializer=get_serializer(args.format or COMPACT))
+                out.flush()
+    except (OSError, sqlite3.Error) as e:
+        print(f"Ошибка ввода-вывода: {e}", file=sys.stderr)
+        return 1
+    except ValueError as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+
+    print(f"Сконвертировано: {converted}, ошибок: {failed}", file=sys.stderr)
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Кэш: попаданий {stats['hits']}, промахов {stats['misses']}, вытеснено {stats['evicted']}",
+              file=sys.stderr)
+    return finish_validation(args, report)
+
+
+def run_merge(args):
+    """Режим объединения: все ссылки из файла в одну конфигурацию с балансировщиком"""
+    from vless_converter import load_template, resolve_template_name
+    from vless_converter.serialization import get_serializer, binary_stdout, PRETTY
+    from contextlib import ExitStack
+    from vless_converter.utils import write_atomic
+    from vless_converter.batch import parse_links
+    from vless_converter.merge import build_merged_config
+
+    template = None
+    if args.template:
+        try:
+            template = load_template(resolve_template_name(args.template))
+            if args.compile_routing:
+                compile_config_routing(template)
+        except ValueError as e:
+            print(f"Ошибка: {e}", file=sys.stderr)
+            return 1
+
+    try:
+        with ExitStack() as stack:
+            links, report = start_validation(args, input_links(args, stack))
+            links = start_probe(args, links)
+            config, stats = build_merged_config(parse_links(links), template,
+                                                tag_prefix=args.tag or '',
+                                                strategy=args.balancer_strategy)
+    except OSError as e:
+        print(f"Ошибка ввода-вывода: {e}", file=sys.stderr)
+        return 1
+    except ValueError as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+
+    output = get_serializer(args.format or PRETTY).dumps(config)
+    if args.output:
+        try:
+            write_atomic(args.output, output)
+        except OSError as e:
+            print(f"Ошибка сохранения файла: {e}", file=sys.stderr)
+            return 1
+    else:
+        stdout = binary_stdout()
+        stdout.write(output + b'\n')
+        stdout.flush()
+
+    print(f"Ссылок: {stats['links']}, уникальных: {stats['unique']}, дубликатов: {stats['duplicates']}",
+          file=sys.stderr)
+    return finish_validation(args, report)
+
+
+def run_shard(args):
+    """Режим распределения: ссылки из файла по узлам, по объединенной конфигурации на узел"""
+    from vless_converter import load_template, resolve_template_name
+    from vless_converter.serialization import get_serializer, PRETTY
+    from contextlib import ExitStack
+    from vless_converter.batch import parse_links
+    from vless_converter.sharding import DEFAULT_REPLICAS, DEFAULT_VNODES, read_nodes, shard_links
+
+    template = None
+    if args.template:
+        try:
+            template = load_template(resolve_template_name(args.template))
+            if args.compile_routing:
+                compile_config_routing(template)
+        except ValueError as e:
+            print(f"Ошибка: {e}", file=sys.stderr)
+            return 1
+
+    try:
+        nodes = read_nodes(args.shard_nodes)
+        with ExitStack() as stack:
+            links, report = start_validation(args, input_links(args, stack))
+            links = start_probe(args, links)
+            stats = shard_links(parse_links(links), nodes, args.output_dir, template,
+                                replicas=DEFAULT_REPLICAS if args.replicas is None else args.replicas,
+                                vnodes=DEFAULT_VNODES if args.vnodes is None else args.vnodes,
+                                tag_prefix=args.tag or '',
+                                strategy=args.balancer_strategy,
+                                serializer=get_serializer(args.format or PRETTY))
+    except OSError as e:
+        print(f"Ошибка ввода-вывода: {e}", file=sys.stderr)
+        return 1
+    except ValueError as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+
+    print(f"Ссылок: {stats['links']}, уникальных: {stats['unique']}, узлов: {stats['nodes']}, "
+          f"назначений: {stats['assignments']}", file=sys.stderr)
+    print(f"Перемещено назначений: {stats['moved']}, новых ссылок: {stats['added']}, "
+          f"удаленных ссылок: {stats['removed']}", file=sys.stderr)
+    print(f"Файлов записано: {stats['written']}, без изменений: {stats['unchanged']}", file=sys.stderr)
+    if stats['empty']:
+        print(f"Предупреждение: узлам без ссылок конфигурация не создана: {', '.join(stats['empty'])}",
+              file=sys.stderr)
+    return finish_validation(args, report)
+
+
+def run_watch(args):
+    """Режим наблюдения: пересборка результатов при изменении входа или шаблонов"""
+    from vless_converter.watch import IncrementalBuilder, watch
+
+    try:
+        builder = IncrementalBuilder(args.input, args.template, args.tag,
+                                     output=args.output, output_dir=args.output_dir,
+                                     name_pattern=args.name_pattern, merge=args.merge,
+                                     strategy=args.balancer_strategy, json_format=args.format)
+        watch(builder, interval=args.watch_interval, reload_command=args.reload_cmd)
+    except KeyboardInterrupt:
+        return 0
+    return 0
+
+
+def run_instrumented(args, func, *func_args):
+    """Запускает режим со сбором метрик этапов и выводит отчеты"""
+    import cProfile
+    from vless_converter import metrics
+    from vless_converter.serialization import get_serializer, PRETTY
+    from vless_converter.utils import write_atomic
+
+    profiler = cProfile.Profile() if args.profile_dump else None
+    metrics.enable()
+    try:
+        with metrics.measure('total'):
+            if profiler is not None:
+                code = profiler.runcall(func, *func_args)
+            else:
+                code = func(*func_args)
+    finally:
+        metrics.disable()
+
+    if profiler is not None:
+        profiler.dump_stats(args.profile_dump)
+        print(f"Профиль cProfile сохранен в файл: {args.profile_dump}", file=sys.stderr)
+
+    stages = metrics.snapshot()
+    if args.profile:
+        print(metrics.format_table(stages), file=sys.stderr)
+    if args.metrics_json:
+        try:
+            write_atomic(args.metrics_json, get_serializer(PRETTY).dumps(stages))
+        except OSError as e:
+            print(f"Ошибка сохранения файла: {e}", file=sys.stderr)
+            return 1
+    return code
+
+
+def run_serve(argv):
+    """Режим сервиса: HTTP сервер конвертации с прогретыми кэшами"""
+    import argparse
+    from vless_converter.server import serve, DEFAULT_HOST, DEFAULT_PORT
+
+    parser = argparse.ArgumentParser(
+        prog='main.py serve',
+        description='HTTP сервис конвертации VLESS URL в конфигурацию Xray-core'
+    )
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f'Адрес для прослушивания (по умолчанию: {DEFAULT_HOST})')
+    parser.add_argument('--port', '-p', type=int, default=DEFAULT_PORT, help=f'Порт (по умолчанию: {DEFAULT_PORT})')
+    parser.add_argument('--jobs', '-j', type=int, help='Количество процессов для пакетной конвертации (по умолчанию: число CPU)')
+    args = parser.parse_args(argv)
+
+    serve(args.host, args.port, args.jobs)
+    return 0
+
+
+def run_export(argv):
+    """Режим экспорта: VLESS outbound из конфигураций Xray обратно в ссылки"""
+    import argparse
+    from vless_converter.exporter import expand_paths, export_files
+    from vless_converter.serialization import binary_stdout
+    from vless_converter.utils import write_atomic
+
+    parser = argparse.ArgumentParser(
+        prog='main.py export',
+        description='Преобразование VLESS outbound из конфигураций Xray обратно в VLESS ссылки'
+    )
+    parser.add_argument('paths', nargs='+', help='Файлы конфигураций Xray, JSONL пакетного режима или каталоги с ними')
+    parser.add_argument('--output', '-o', help='Сохранить ссылки в файл (по умолчанию: stdout)')
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='Количество процессов для обработки файлов (по умолчанию: 1)')
+    parser.add_argument('--check', action='store_true', help='Проверить, что каждая ссылка восстанавливает исходный outbound; при расхождениях код завершения 1')
+    args = parser.parse_args(argv)
+
+    links, stats = export_files(expand_paths(args.paths), jobs=args.jobs, check=args.check)
+    output = ''.join(link + '\n' for link in links).encode('utf-8')
+    if args.output:
+        try:
+            write_atomic(args.output, output)
+        except OSError as e:
+            print(f"Ошибка сохранения файла: {e}", file=sys.stderr)
+            return 1
+    else:
+        stdout = binary_stdout()
+        stdout.write(output)
+        stdout.flush()
+
+    print(f"Файлов: {stats['files']}, outbound: {stats['outbounds']}, ссылок: {stats['links']}, "
+          f"уникальных: {stats['unique']}, дубликатов: {stats['duplicates']}, ошибок: {stats['errors']}",
+          file=sys.stderr)
+    if args.check:
+        print(f"Проверка обратного преобразования: не совпало {stats['mismatched']}", file=sys.stderr)
+    return 1 if stats['errors'] or stats['mismatched'] else 0
 
 
 def main():
     """Основная функция программы"""
+    argv = sys.argv[1:]
+    if argv and argv[0] == 'serve':
+        sys.exit(run_serve(argv[1:]))
+    if argv and argv[0] == 'export':
+        sys.exit(run_export(argv[1:]))
+    
+    # Быстрый путь для самых частых вызовов
+    if argv == ['--list-templates']:
+        from vless_converter.templates import display_templates_with_numbers
+        display_templates_with_numbers()
+        return
+    
+    fast_args = parse_fast_args(argv)
+    if fast_args is not None:
+        sys.exit(run_single(*fast_args))
+    
+    import argparse
+    from vless_converter import (
+        parse_vless_url,
+        create_xray_config,
+        load_template,
+        apply_template,
+        display_templates_with_numbers,
+        resolve_template_name
+    )
+    from vless_converter.merge import DEFAULT_STRATEGY
+    from vless_converter.parallel import DEFAULT_CHUNK_SIZE
+    from vless_converter.serialization import get_serializer, MODES, PRETTY
+    from vless_converter.utils import write_atomic
+    from vless_converter.writer import DEFAULT_NAME_PATTERN
+    
     parser = argparse.ArgumentParser(
         description='Конвертер VLESS URL в конфигурацию Xray-core',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -38,6 +470,47 @@ def main():
   Использование шаблона:
     python main.py vless://... --template openwrt-reverse
     
+  Пакетная конвертация файла подписки (JSONL):
+    python main.py --input links.txt --output outbounds.jsonl
+    python main.py --input links.txt --jobs 4 --output outbounds.jsonl
+    python main.py --input links.txt --cache cache.db --output outbounds.jsonl
+    
+  Отдельный файл на каждую ссылку:
+    python main.py --input links.txt --template openwrt-reverse --output-dir configs/ --name-pattern "{tag}.json"
+    
+  Проверка ссылок с отчетом (строгий режим исключает ссылки с замечаниями):
+    python main.py --input links.txt --strict --output outbounds.jsonl
+    
+  Объединение ссылок в одну конфигурацию с балансировщиком:
+    python main.py --input links.txt --merge --template openwrt-reverse -o config.json
+    
+  Пересборка при изменении подписки или шаблона с перезагрузкой xray:
+    python main.py --input links.txt --merge --template openwrt-reverse -o config.json --watch --reload-cmd "/etc/init.d/xray reload"
+    
+  Время по этапам конвертации:
+    python main.py --input links.txt --output outbounds.jsonl --profile --metrics-json metrics.json
+    
+  HTTP сервис конвертации:
+    python main.py serve --port 8080
+    
+  Обратное преобразование конфигураций Xray в ссылки:
+    python main.py export configs/ --jobs 4 --check -o links.txt
+    
+  Компактный или канонический (с сортировкой ключей) JSON:
+    python main.py vless://... --format canonical
+    
+  Поиск ссылок в большом дампе (HTML, подписки base64), только новые части:
+    python main.py --input dump.html --scan --scan-index dump.idx --output-dir configs/
+    
+  Распределение ссылок по узлам (каждая ссылка на 2 узла), по конфигурации на узел:
+    python main.py --input links.txt --shard-nodes nodes.txt --replicas 2 --template openwrt-reverse --output-dir nodes/
+    
+  Объединенная конфигурация с уменьшенными правилами маршрутизации:
+    python main.py --input links.txt --merge --template openwrt-reverse --compile-routing -o config.json
+    
+  Только доступные серверы, от быстрых к медленным:
+    python main.py --input links.txt --probe --merge --template openwrt-reverse -o config.json
+    
   Список доступных шаблонов:
     python main.py --list-templates
         '''
@@ -47,6 +520,33 @@ def main():
     parser.add_argument('--tag', '-g', help='Тег для конфигурации (по умолчанию: reverse-proxy)')
     parser.add_argument('--template', '-t', help='Использовать шаблон (номер или имя)')
     parser.add_argument('--output', '-o', help='Сохранить результат в файл')
+    parser.add_argument('--input', '-i', help='Пакетный режим: файл со ссылками (по одной на строку) или "-" для stdin')
+    parser.add_argument('--output-dir', help='Пакетный режим: записать каждую конфигурацию в отдельный файл в этом каталоге')
+    parser.add_argument('--name-pattern', default=DEFAULT_NAME_PATTERN, help=f'Шаблон имени файла для --output-dir, поля: {{tag}}, {{line}}, {{address}}, {{port}} (по умолчанию: {DEFAULT_NAME_PATTERN})')
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='Количество процессов для пакетного режима (по умолчанию: 1)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help=f'Количество ссылок в одной задаче при --jobs > 1 (по умолчанию: {DEFAULT_CHUNK_SIZE})')
+    parser.add_argument('--scan', action='store_true', help='Искать ссылки в --input как в произвольном дампе (HTML, смесь протоколов, подписки base64); номер строки в сообщениях — смещение в байтах')
+    parser.add_argument('--scan-index', help='Файл индекса блоков для --scan: при повторном запуске просматриваются только измененные части дампа, ссылки остальных берутся из индекса')
+    parser.add_argument('--cache', help='Файл кэша конвертации (sqlite3) для пакетного режима: повторно конвертируются только новые или измененные ссылки')
+    parser.add_argument('--merge', action='store_true', help='Объединить все ссылки из --input в одну конфигурацию с балансировщиком (--tag задает префикс тегов)')
+    parser.add_argument('--balancer-strategy', default=DEFAULT_STRATEGY, help=f'Стратегия балансировщика для --merge (по умолчанию: {DEFAULT_STRATEGY})')
+    validation = parser.add_mutually_exclusive_group()
+    validation.add_argument('--strict', dest='validation', action='store_const', const='strict', help='Проверять ссылки и исключать ссылки с замечаниями (UUID, порт, pbk, sid, security, type); при замечаниях код завершения 1')
+    validation.add_argument('--lenient', dest='validation', action='store_const', const='lenient', help='Проверять ссылки и только сообщать о замечаниях')
+    parser.add_argument('--shard-nodes', help='Файл со списком узлов (по одному на строку): разложить ссылки из --input по узлам согласованным хешированием, по объединенной конфигурации на узел в --output-dir')
+    parser.add_argument('--replicas', type=int, help='Число узлов для каждой ссылки в --shard-nodes (по умолчанию: 2)')
+    parser.add_argument('--vnodes', type=int, help='Число виртуальных узлов на кольце для каждого узла в --shard-nodes (по умолчанию: 100)')
+    parser.add_argument('--probe', action='store_true', help='Проверить TCP подключение к серверам ссылок из --input: недоступные отбросить, остальные упорядочить по времени подключения')
+    parser.add_argument('--probe-timeout', type=float, help='Таймаут проверки одного сервера для --probe, секунд (по умолчанию: 3)')
+    parser.add_argument('--probe-concurrency', type=int, help='Число одновременных проверок для --probe (по умолчанию: 64)')
+    parser.add_argument('--compile-routing', action='store_true', help='Уменьшить routing.rules шаблона без изменения маршрутизации: объединить соседние правила с одним outbound, убрать повторы и покрытые поддомены, объединить IP подсети')
+    parser.add_argument('--watch', action='store_true', help='Следить за файлом --input и каталогом шаблонов и пересобирать результат при изменениях')
+    parser.add_argument('--watch-interval', type=float, default=1.0, help='Период опроса файлов в режиме --watch, секунд (по умолчанию: 1)')
+    parser.add_argument('--reload-cmd', help='Команда, выполняемая после изменения результатов в режиме --watch (например, "/etc/init.d/xray reload")')
+    parser.add_argument('--profile', action='store_true', help='Вывести в stderr таблицу времени по этапам (разбор, шаблоны, сериализация, запись)')
+    parser.add_argument('--metrics-json', help='Сохранить метрики этапов (счетчики, время, гистограммы задержек) в JSON файл')
+    parser.add_argument('--profile-dump', help='Сохранить профиль cProfile в файл (для pstats или snakeviz)')
+    parser.add_argument('--format', '-f', choices=MODES, help='Формат JSON: pretty, compact или canonical (по умолчанию: pretty, в пакетном режиме — compact)')
     parser.add_argument('--list-templates', action='store_true', help='Показать список доступных шаблонов')
     
     args = parser.parse_args()
@@ -55,6 +555,73 @@ def main():
         display_templates_with_numbers()
         return
     
+    if args.merge and not args.input:
+        parser.error('--merge требует --input')
+    
+    if args.validation and not args.input:
+        parser.error(f'--{args.validation} требует --input')
+    
+    if args.scan:
+        if not args.input or args.input == '-':
+            parser.error('--scan требует --input с путем к файлу')
+        if args.watch:
+            parser.error('--scan несовместим с --watch')
+    elif args.scan_index:
+        parser.error('--scan-index используется только с --scan')
+    
+    if args.probe:
+        if not args.input:
+            parser.error('--probe требует --input')
+        if args.watch:
+            parser.error('--probe несовместим с --watch')
+    elif args.probe_timeout is not None or args.probe_concurrency is not None:
+        parser.error('--probe-timeout и --probe-concurrency используются только с --probe')
+    
+    if args.shard_nodes:
+        if not args.input or not args.output_dir:
+            parser.error('--shard-nodes требует --input и --output-dir')
+        if args.merge or args.watch or args.cache or args.jobs > 1:
+            parser.error('--shard-nodes несовместим с --merge, --watch, --cache и --jobs')
+        if any(value is not None and value < 1 for value in (args.replicas, args.vnodes)):
+            parser.error('--replicas и --vnodes должны быть не меньше 1')
+    elif args.replicas is not None or args.vnodes is not None:
+        parser.error('--replicas и --vnodes используются только с --shard-nodes')
+    
+    if args.compile_routing:
+        if not args.template or not (args.input or args.vless_url):
+            parser.error('--compile-routing требует --template и VLESS URL или --input')
+        if args.watch:
+            parser.error('--compile-routing несовместим с --watch')
+    
+    if args.output_dir and (not args.input or args.merge or args.output):
+        parser.error('--output-dir используется только в пакетном режиме без --merge и --output')
+    
+    if args.input and not args.merge and not args.output_dir and args.format == PRETTY:
+        parser.error('пакетный режим пишет JSONL: используйте --format compact или canonical')
+    
+    if args.watch:
+        if not args.input or args.input == '-':
+            parser.error('--watch требует --input с путем к файлу')
+        if not (args.output or args.output_dir):
+            parser.error('--watch требует --output или --output-dir')
+        if args.cache or args.jobs > 1 or args.validation:
+            parser.error('--watch несовместим с --cache, --jobs, --strict и --lenient')
+        sys.exit(run_watch(args))
+    
+    if args.reload_cmd:
+        parser.error('--reload-cmd используется только с --watch')
+    
+    instrumented = args.profile or args.metrics_json or args.profile_dump
+    if instrumented and not (args.input or args.vless_url):
+        parser.error('--profile, --metrics-json и --profile-dump не поддерживаются в интерактивном режиме')
+    
+    if args.input:
+        if args.shard_nodes:
+            mode = run_shard
+        else:
+            mode = run_merge if args.merge else run_batch
+        sys.exit(run_instrumented(args, mode, args) if instrumented else mode(args))
+    
     # Интерактивный режим
     if not args.vless_url:
         print("Интерактивный режим")
@@ -83,82 +650,38 @@ def main():
         # Выбираем шаблон
         template_name = input("Введите имя шаблона (номер или имя, или Enter для пропуска): ").strip()
         if template_name:
-            template_path = resolve_template_name(template_name)
-            if not template_path:
-                print(f"Ошибка: Шаблон '{template_name}' не найден")
-                return
-            
-            template = load_template(template_path)
-            if not template:
-                print(f"Ошибка: Не удалось загрузить шаблон '{template_name}'")
-                return
-            
             # Применяем шаблон с пользовательским тегом
-            config = apply_template(template, vless_data, tag)
+            try:
+                template = load_template(resolve_template_name(template_name))
+                config = apply_template(template, vless_data, tag)
+            except ValueError as e:
+                print(f"Ошибка: {e}")
+                return
         else:
             # Генерируем базовую конфигурацию
             config = create_xray_config(vless_data, tag)
         
         # Сохраняем в файл
         output_file = input("\nВведите имя файла для сохранения (или Enter для пропуска): ").strip()
+        serializer = get_serializer(PRETTY)
         if output_file:
             try:
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    json.dump(config, f, indent=2, ensure_ascii=False)
+                write_atomic(output_file, serializer.dumps(config))
                 print(f"Конфигурация сохранена в файл: {output_file}")
             except Exception as e:
                 print(f"Ошибка сохранения файла: {e}")
         else:
             # Выводим результат только если файл не указан
             print("\nСгенерированная конфигурация:")
-            print(json.dumps(config, indent=2, ensure_ascii=False))
+            print(serializer.dumps(config).decode('utf-8'))
         
         return
     
     # Режим с аргументами
-    try:
-        vless_data = parse_vless_url(args.vless_url)
-    except Exception as e:
-        print(f"Ошибка парсинга URL: {e}")
-        return
-    
-    # Запрашиваем тег если не задан
-    if not args.tag:
-        tag = input("Введите тег для конфигурации (по умолчанию: reverse-proxy): ").strip()
-        if not tag:
-            tag = 'reverse-proxy'
-    else:
-        tag = args.tag
-    
-    # Используем шаблон или генерируем базовую конфигурацию
-    if args.template:
-        template_path = resolve_template_name(args.template)
-        if not template_path:
-            print(f"Ошибка: Шаблон '{args.template}' не найден")
-            return
-        
-        template = load_template(template_path)
-        if not template:
-            print(f"Ошибка: Не удалось загрузить шаблон '{args.template}'")
-            return
-        
-        # Применяем шаблон с пользовательским тегом
-        config = apply_template(template, vless_data, tag)
-    else:
-        # Генерируем базовую конфигурацию
-        config = create_xray_config(vless_data, tag)
-    
-    # Выводим результат
-    print(json.dumps(config, indent=2, ensure_ascii=False))
-    
-    # Сохраняем в файл
-    if args.output:
-        try:
-            with open(args.output, 'w', encoding='utf-8') as f:
-                json.dump(config, f, indent=2, ensure_ascii=False)
-            print(f"\nКонфигурация сохранена в файл: {args.output}")
-        except Exception as e:
-            print(f"Ошибка сохранения файла: {e}")
+    single_args = (args.vless_url, args.tag, args.template, args.output, args.format, args.compile_routing)
+    if instrumented:
+        sys.exit(run_instrumented(args, run_single, *single_args))
+    sys.exit(run_single(*single_args))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,23 @@
+"""Тесты объекта конвертера: сообщения об ошибках пакетной конвертации"""
+
+import unittest
+
+from vless_converter.converter import Converter
+
+
+LINK = 'vless://0e7b3e2a-1111-2222-3333-444455556666@h.example.com:443?type=tcp#n'
+
+
+class ConvertManyTest(unittest.TestCase):
+    def test_error_details(self):
+        results = list(Converter().convert_many([LINK, 'vless://u@h.example.com:abc?type=tcp', LINK]))
+        self.assertEqual([result.line_no for result in results], [1, 2, 3])
+        self.assertIsNone(results[0].error)
+        self.assertEqual(results[1].error, 'Ошибка парсинга VLESS URL: Неверный порт: abc')
+        # Ошибка берется из кэша разбора так же, как успешный результат
+        self.assertEqual(list(Converter().convert_many(['vless://u@h:abc'] * 2))[1].error,
+                         'Ошибка парсинга VLESS URL: Неверный порт: abc')
+
+
+if __name__ == '__main__':
+    unittest.main()
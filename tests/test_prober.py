@@ -0,0 +1,77 @@
+"""Тесты проверки доступности серверов на локальных слушающих сокетах"""
+
+import socket
+import asyncio
+import unittest
+
+from vless_converter.prober import Prober, probe_links
+
+
+UUID = '0e7b3e2a-1111-2222-3333-444455556666'
+
+
+def link(port: int, name: str = 'a') -> str:
+    return f"vless://{UUID}@127.0.0.1:{port}?type=tcp&security=none#{name}"
+
+
+def closed_port() -> int:
+    """Порт, на котором гарантированно никто не слушает"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class _SlowDnsProber(Prober):
+    """Prober, у которого разрешение имени не укладывается в таймаут"""
+
+    async def _lookup(self, host: str) -> tuple:
+        await asyncio.sleep(5)
+        return ()
+
+
+class ProberTest(unittest.TestCase):
+    def setUp(self):
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(16)
+        self.port = self.listener.getsockname()[1]
+
+    def tearDown(self):
+        self.listener.close()
+
+    def test_reachable_listener(self):
+        latencies = Prober(timeout=2).run([('127.0.0.1', self.port)])
+        self.assertIsNotNone(latencies[('127.0.0.1', self.port)])
+
+    def test_closed_port(self):
+        port = closed_port()
+        self.assertEqual(Prober(timeout=2).run([('127.0.0.1', port)]), {('127.0.0.1', port): None})
+
+    def test_timeout(self):
+        latencies = _SlowDnsProber(timeout=0.05).run([('example.invalid', 443)])
+        self.assertEqual(latencies, {('example.invalid', 443): None})
+
+    def test_port_out_of_range(self):
+        self.assertEqual(Prober(timeout=2).run([('127.0.0.1', 70000)]), {('127.0.0.1', 70000): None})
+
+    def test_dns_cache(self):
+        prober = Prober(timeout=2)
+        prober.run([('localhost', self.port)])
+        prober.run([('localhost', self.port), ('localhost', closed_port())])
+        self.assertEqual(prober.dns_lookups, 1)
+
+    def test_probe_links(self):
+        links = [
+            (1, link(closed_port(), 'closed')),
+            (2, link(self.port, 'open')),
+            (3, 'vless://broken'),
+            (4, link(70000, 'overflow')),
+            (5, link(self.port, 'same-server')),
+        ]
+        ranked, stats = probe_links(links, Prober(timeout=2))
+        self.assertEqual([line_no for line_no, _ in ranked], [2, 5, 3])
+        self.assertEqual(stats, {'servers': 3, 'reachable': 1, 'dropped': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
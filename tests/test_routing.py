@@ -0,0 +1,105 @@
+"""Тесты компиляции правил маршрутизации на граничных случаях"""
+
+import copy
+import ipaddress
+import unittest
+
+from benchmarks.routing import _Rule, route
+from vless_converter.routing import collapse_domains, collapse_ips, compile_routing, compile_rules
+
+
+DOMAINS = (None, 'a.com', 'b.com', 'x.b.com', 'example.com', 'a.example.com', 'notexample.com', 'c.org')
+IPS = (None, '10.0.0.1', '10.0.0.200', '10.0.1.5', '192.168.1.1', '2001:db8::1')
+INBOUNDS = ('x', 'y')
+
+
+def field(target='A', **conditions):
+    rule = {'type': 'field', 'outboundTag': target}
+    rule.update(conditions)
+    return rule
+
+
+class CompileRulesTest(unittest.TestCase):
+    def assertSameRouting(self, rules, compiled):
+        """Первое сработавшее правило ведет в то же назначение на всех запросах"""
+        before = [_Rule(rule) for rule in rules]
+        after = [_Rule(rule) for rule in compiled]
+        for inbound in INBOUNDS:
+            for domain in DOMAINS:
+                for ip in IPS:
+                    address = ipaddress.ip_address(ip) if ip else None
+                    self.assertEqual(route(before, inbound, domain, address),
+                                     route(after, inbound, domain, address),
+                                     (inbound, domain, ip))
+
+    def compile(self, rules):
+        original = copy.deepcopy(rules)
+        compiled = compile_rules(rules)
+        self.assertEqual(rules, original, 'исходные правила изменены')
+        self.assertSameRouting(rules, compiled)
+        return compiled
+
+    def test_empty_list_subsumes_later_rule(self):
+        rules = [field(inboundTag=['x'], domain=[]), field(inboundTag=['x'], domain=['domain:b.com'])]
+        self.assertEqual(self.compile(rules), [field(inboundTag=['x'], domain=[])])
+
+    def test_later_empty_list_widens_earlier_rule(self):
+        rules = [field(inboundTag=['x'], ip=['10.0.0.0/24']), field(inboundTag=['x'], ip=[]),
+                 field(inboundTag=['x'], ip=['192.168.0.0/16'])]
+        self.assertEqual(self.compile(rules), [field(inboundTag=['x'], ip=[])])
+
+    def test_merge_across_same_target_only(self):
+        rules = [field(domain=['domain:a.com']), field(domain=['domain:b.com']),
+                 field('B', domain=['domain:c.org']), field(domain=['domain:c.org'])]
+        self.assertEqual(self.compile(rules), [
+            field(domain=['domain:a.com', 'domain:b.com']),
+            field('B', domain=['domain:c.org']),
+            field(domain=['domain:c.org']),
+        ])
+
+    def test_other_fields_must_match(self):
+        rules = [field(inboundTag=['x'], domain=['domain:a.com']), field(inboundTag=['y'], domain=['domain:b.com']),
+                 field(domain=['domain:a.com'], ip=['10.0.0.0/24']), field(domain=['domain:b.com'], ip=['10.0.1.0/24'])]
+        self.assertEqual(len(self.compile(rules)), 4)
+
+    def test_duplicates(self):
+        rules = [field(inboundTag=['x']), field(inboundTag=['x']), field(domain=['a.com', 'a.com'])]
+        self.assertEqual(self.compile(rules), [field(inboundTag=['x']), field(domain=['a.com'])])
+
+    def test_both_lists(self):
+        rules = [field(domain=[], ip=['10.0.0.0/25']), field(domain=[], ip=['10.0.0.128/25'])]
+        self.assertEqual(self.compile(rules), [field(domain=[], ip=['10.0.0.0/24'])])
+
+    def test_non_dict_rule_breaks_run(self):
+        rules = [field(domain=['domain:a.com']), 'comment', field(domain=['domain:b.com'])]
+        self.assertEqual(compile_rules(rules), rules)
+
+
+class CollapseTest(unittest.TestCase):
+    def test_collapse_domains(self):
+        entries = ['full:a.example.com', 'domain:example.com', 'full:example.com', 'domain:x.example.com',
+                   'domain:example.com', 'domain:notexample.com', 'keyword:example', 'domain:{{address}}',
+                   'geosite:cn']
+        self.assertEqual(collapse_domains(entries), [
+            'domain:example.com', 'domain:notexample.com', 'keyword:example', 'domain:{{address}}', 'geosite:cn'])
+
+    def test_full_does_not_cover(self):
+        entries = ['full:example.com', 'domain:a.example.com', 'full:a.example.com']
+        self.assertEqual(collapse_domains(entries), ['full:example.com', 'domain:a.example.com'])
+
+    def test_collapse_ips(self):
+        entries = ['10.0.0.0/25', 'geoip:private', '10.0.0.128/25', '10.0.1.5', '10.0.1.5/32',
+                   '2001:db8::/33', '2001:db8:8000::/33', '{{address}}']
+        self.assertEqual(collapse_ips(entries), ['geoip:private', '{{address}}', '10.0.0.0/24',
+                                                 '10.0.1.5', '2001:db8::/32'])
+
+    def test_compile_routing_stats(self):
+        config = {'routing': {'rules': [field(domain=['domain:a.com']), field(domain=['full:x.a.com'])]}}
+        stats = compile_routing(config)
+        self.assertEqual(stats, {'rules': (2, 1), 'domains': (2, 1), 'ips': (0, 0)})
+        self.assertEqual(config['routing']['rules'], [field(domain=['domain:a.com'])])
+        self.assertEqual(compile_routing({}), {'rules': (0, 0), 'domains': (0, 0), 'ips': (0, 0)})
+
+
+if __name__ == '__main__':
+    unittest.main()
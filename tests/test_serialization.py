@@ -0,0 +1,39 @@
+"""Тесты сериализации: совпадение вывода orjson и json, запасной путь для больших целых"""
+
+import io
+import json
+import unittest
+
+from vless_converter.batch import convert_links, write_jsonl
+from vless_converter.serialization import BACKEND_JSON, BACKEND_ORJSON, MODES, COMPACT, Serializer
+
+try:
+    import orjson  # noqa: F401
+except ImportError:
+    orjson = None
+
+
+UUID = '0e7b3e2a-1111-2222-3333-444455556666'
+HUGE_PORT = 99999999999999999999999
+
+
+@unittest.skipIf(orjson is None, 'orjson не установлен')
+class OrjsonFallbackTest(unittest.TestCase):
+    def test_integer_beyond_64_bits(self):
+        obj = {'port': HUGE_PORT, 'name': 'сервер'}
+        for mode in MODES:
+            self.assertEqual(Serializer(mode, BACKEND_ORJSON).dumps(obj),
+                             Serializer(mode, BACKEND_JSON).dumps(obj), mode)
+
+    def test_batch_with_oversized_port(self):
+        links = [(1, f"vless://{UUID}@h.example.com:{HUGE_PORT}?type=tcp#big"),
+                 (2, f"vless://{UUID}@h.example.com:443?type=tcp#ok")]
+        out = io.BytesIO()
+        converted, failed = write_jsonl(convert_links(links), out, Serializer(COMPACT, BACKEND_ORJSON))
+        self.assertEqual((converted, failed), (2, 0))
+        configs = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([config['settings']['vnext'][0]['port'] for config in configs], [HUGE_PORT, 443])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+"""Тесты HTTP сервиса конвертации: запросы через сокет к серверу на свободном порту"""
+
+import json
+import asyncio
+import unittest
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from vless_converter.server import ConversionServer
+
+
+LINK = ('vless://0e7b3e2a-1111-2222-3333-444455556666@h.example.com:443'
+        '?type=tcp&security=reality&sni=a.com&pbk=abc&sid=ab&fp=chrome#n')
+
+
+class _BrokenExecutor(ThreadPoolExecutor):
+    """Пул, рабочие процессы которого завершаются с ошибкой"""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_exception(RuntimeError('рабочий процесс завершился'))
+        return future
+
+
+def chunk(data: bytes) -> bytes:
+    return b'%x\r\n%s\r\n' % (len(data), data)
+
+
+async def read_response(reader: asyncio.StreamReader):
+    """Читает один ответ: (код, заголовки, тело, трейлеры)"""
+    status_line = await reader.readline()
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    trailers = {}
+    if headers.get('transfer-encoding') == 'chunked':
+        parts = []
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            if size == 0:
+                break
+            parts.append(await reader.readexactly(size))
+            await reader.readline()
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            trailers[name.strip().lower()] = value.strip()
+        body = b''.join(parts)
+    elif 'content-length' in headers:
+        body = await reader.readexactly(int(headers['content-length']))
+    else:
+        body = await reader.read()
+    return status, headers, body, trailers
+
+
+class ServerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        # Пул потоков вместо процессов: тот же интерфейс Executor, быстрее запуск
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.server = await ConversionServer(port=0, executor=self.executor).start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+        self.executor.shutdown()
+
+    async def connect(self):
+        return await asyncio.open_connection('127.0.0.1', self.server.port)
+
+    async def request(self, raw: bytes):
+        reader, writer = await self.connect()
+        writer.write(raw)
+        await writer.drain()
+        response = await read_response(reader)
+        rest = await reader.read()
+        writer.close()
+        return response, rest
+
+    async def test_templates_and_etag(self):
+        (status, headers, body, _), _ = await self.request(
+            b'GET /templates HTTP/1.1\r\nConnection: close\r\n\r\n')
+        self.assertEqual(status, 200)
+        self.assertIn('openwrt-reverse', json.loads(body))
+
+        (status, _, body, _), _ = await self.request(
+            b'GET /templates HTTP/1.1\r\nConnection: close\r\nIf-None-Match: '
+            + headers['etag'].encode() + b'\r\n\r\n')
+        self.assertEqual((status, body), (304, b''))
+
+    async def test_convert_keep_alive(self):
+        reader, writer = await self.connect()
+        body = LINK.encode()
+        for _ in range(2):
+            writer.write(b'POST /convert?template=openwrt-reverse&tag=t HTTP/1.1\r\n'
+                         b'Content-Length: %d\r\n\r\n%s' % (len(body), body))
+            status, headers, payload, _ = await read_response(reader)
+            self.assertEqual(status, 200)
+            self.assertNotIn('connection', headers)
+            self.assertIn('t', [outbound['tag'] for outbound in json.loads(payload)['outbounds']])
+        writer.close()
+
+    async def test_convert_errors(self):
+        (status, headers, body, _), _ = await self.request(
+            b'POST /convert HTTP/1.1\r\nContent-Length: 14\r\n\r\nvless://broken')
+        self.assertEqual(status, 400)
+        self.assertEqual(headers['connection'], 'close')
+        self.assertIn('error', json.loads(body))
+
+        (status, _, _, _), _ = await self.request(b'GET /nowhere HTTP/1.1\r\n\r\n')
+        self.assertEqual(status, 404)
+
+    async def test_oversized_header(self):
+        (status, headers, body, _), rest = await self.request(
+            b'GET /templates HTTP/1.1\r\nX-Big: ' + b'a' * 20000 + b'\r\n\r\n')
+        self.assertEqual((status, headers['connection'], rest), (431, 'close', b''))
+        self.assertIn('error', json.loads(body))
+
+    async def test_http10_connection_header(self):
+        (status, headers, _, _), rest = await self.request(b'GET /templates HTTP/1.0\r\n\r\n')
+        self.assertEqual((status, headers['connection'], rest), (200, 'close', b''))
+
+        reader, writer = await self.connect()
+        writer.write(b'GET /templates HTTP/1.0\r\nConnection: keep-alive\r\n\r\n')
+        status, headers, _, _ = await read_response(reader)
+        self.assertEqual(headers['connection'], 'keep-alive')
+        writer.close()
+
+    async def test_batch_stream(self):
+        lines = [LINK, json.dumps({'link': LINK, 'tag': 'custom'}),
+                 json.dumps({'link': LINK, 'tag': 5}), 'vless://broken', json.dumps({'link': ['x']})]
+        body = ('\n'.join(lines) + '\n').encode()
+        (status, headers, payload, trailers), _ = await self.request(
+            b'POST /convert/batch?template=openwrt-reverse&tag=t HTTP/1.1\r\n'
+            b'Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n'
+            + chunk(body[:50]) + chunk(body[50:]) + b'0\r\n\r\n')
+        self.assertEqual(status, 200)
+        self.assertIn('etag', trailers)
+
+        records = [json.loads(line) for line in payload.splitlines()]
+        self.assertEqual([record['line'] for record in records], [1, 2, 3, 4, 5])
+        self.assertIn('config', records[0])
+        self.assertIn('custom', [outbound['tag'] for outbound in records[1]['config']['outbounds']])
+        self.assertEqual(records[2]['error'], 'Тег должен быть строкой')
+        self.assertIn('error', records[3])
+        self.assertEqual(records[4]['error'], 'Ссылка должна быть строкой')
+
+    async def test_batch_http10(self):
+        (status, headers, payload, _), _ = await self.request(
+            b'POST /convert/batch HTTP/1.0\r\nContent-Length: %d\r\n\r\n%s' % (len(LINK), LINK.encode()))
+        self.assertEqual(status, 200)
+        self.assertNotIn('transfer-encoding', headers)
+        self.assertEqual(headers['connection'], 'close')
+        self.assertEqual(json.loads(payload)['line'], 1)
+
+    async def test_batch_malformed_chunk(self):
+        first = (LINK + '\n').encode()
+        (status, _, payload, _), rest = await self.request(
+            b'POST /convert/batch HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n'
+            + chunk(first) + b'zz\r\n')
+        # Один ответ без второй строки статуса внутри тела, затем соединение закрыто
+        self.assertEqual(status, 200)
+        self.assertEqual(rest, b'')
+        self.assertNotIn(b'HTTP/1.1', payload)
+        records = [json.loads(line) for line in payload.splitlines()]
+        self.assertEqual(records[-1]['error'], 'Неверный размер чанка')
+
+
+class BrokenPoolTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.executor = _BrokenExecutor(max_workers=1)
+        self.server = await ConversionServer(port=0, executor=self.executor).start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+        self.executor.shutdown()
+
+    async def test_pool_failure_ends_stream(self):
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.server.port)
+        writer.write(b'POST /convert/batch HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s'
+                     % (len(LINK), LINK.encode()))
+        status, _, payload, trailers = await read_response(reader)
+        self.assertEqual(status, 200)
+        self.assertEqual(trailers, {})
+        self.assertIn('Внутренняя ошибка', json.loads(payload)['error'])
+        self.assertEqual(await reader.read(), b'')
+        writer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
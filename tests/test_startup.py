@@ -0,0 +1,27 @@
+"""Тесты холодного старта CLI: бюджет времени импорта и запрещенные модули быстрого пути"""
+
+import os
+import tempfile
+import unittest
+
+from benchmarks.startup import DEFAULT_BUDGET_MS, FORBIDDEN_MODULES, measure_startup, scenarios
+
+
+# Запас на медленные и загруженные машины CI
+BUDGET_MS = DEFAULT_BUDGET_MS * 4
+
+
+class StartupTest(unittest.TestCase):
+    def test_fast_paths(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, args in scenarios(os.path.join(tmp, 'config.json')).items():
+                with self.subTest(name):
+                    elapsed, modules = measure_startup(args, runs=3)
+                    # Пустой список означал бы, что CLI не запустился
+                    self.assertIn('vless_converter.templates', modules)
+                    self.assertEqual([module for module in FORBIDDEN_MODULES if module in modules], [])
+                    self.assertLess(elapsed, BUDGET_MS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+"""Тесты рендеринга скомпилированных шаблонов: типы значений плейсхолдеров"""
+
+import unittest
+
+from vless_converter.parser import parse_vless_url
+from vless_converter.templates import apply_template, compile_template
+
+
+TEMPLATE = {'address': '{{address}}', 'port': '{{port}}', 'sni': ['{{serverName}}'], 'url': 'h://{{address}}:{{port}}'}
+
+
+class RenderTypesTest(unittest.TestCase):
+    def test_repeated_parameter_uses_first_value(self):
+        data = parse_vless_url('vless://0e7b3e2a-1111-2222-3333-444455556666@h.com:443'
+                               '?type=tcp&sni=a.com&sni=b.com#n')
+        config = apply_template(compile_template(TEMPLATE), data)
+        self.assertEqual(config['sni'], ['a.com'])
+
+    def test_values_converted_or_rejected(self):
+        template = compile_template(TEMPLATE)
+        values = {'address': 'h.com', 'port': '443', 'serverName': 'a.com'}
+        config = template.render(values)
+        self.assertEqual((config['port'], config['url']), (443, 'h://h.com:443'))
+        self.assertEqual(values['port'], '443', 'словарь значений изменен')
+
+        with self.assertRaisesRegex(ValueError, 'port'):
+            template.render(dict(values, port='http'))
+        with self.assertRaisesRegex(ValueError, 'serverName'):
+            template.render(dict(values, serverName=5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,23 +2,57 @@
 VLESS to Xray Converter Package
 
 Пакет для конвертации VLESS конфигураций в формат Xray-core.
-"""
 
-from .parser import parse_vless_url
-from .generator import create_xray_config
-from .templates import get_available_templates, load_template, apply_template, display_templates_with_numbers, resolve_template_name
-from .utils import save_to_file
+Подмодули загружаются лениво при первом обращении к атрибуту пакета,
+поэтому импорт пакета не тянет за собой зависимости неиспользуемых режимов.
+"""
 
 __version__ = "1.0.0"
 __author__ = "SoaQa"
 
-__all__ = [
-    'parse_vless_url',
-    'create_xray_config',
-    'get_available_templates',
-    'load_template',
-    'apply_template',
-    'display_templates_with_numbers',
-    'resolve_template_name',
-    'save_to_file'
-] 
\ No newline at end of file
+# Публичное имя -> подмодуль, в котором оно определено
+_LAZY_ATTRIBUTES = {
+    'parse_vless_url': 'converter',
+    'parse_link': 'parser',
+    'try_parse': 'parser',
+    'VlessLink': 'parser',
+    'create_xray_config': 'generator',
+    'register_transport': 'generator',
+    'register_security': 'generator',
+    'get_available_templates': 'templates',
+    'load_template': 'templates',
+    'apply_template': 'templates',
+    'apply_templates': 'templates',
+    'display_templates_with_numbers': 'templates',
+    'resolve_template_name': 'templates',
+    'compile_template': 'templates',
+    'CompiledTemplate': 'templates',
+    'TemplateRegistry': 'templates',
+    'get_registry': 'templates',
+    'Converter': 'converter',
+    'get_converter': 'converter',
+    'convert': 'converter',
+    'convert_many': 'converter',
+    'build_merged_config': 'merge',
+    'LinkTable': 'table',
+    'save_to_file': 'utils',
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name: str):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    # __import__ вместо importlib.import_module: не загружает пакет importlib
+    module = __import__(f'{__name__}.{module_name}', fromlist=(name,))
+    value = getattr(module, name)
+    # Следующие обращения обходят __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
@@ -0,0 +1,158 @@
+"""
+Модуль пакетной конвертации
+
+Содержит потоковый конвейер для обработки файлов подписок:
+чтение ссылок по одной строке, конвертация и запись в формате JSONL.
+"""
+
+import sys
+from contextlib import contextmanager
+from typing import BinaryIO, Iterable, Iterator, NamedTuple, Optional, TextIO, Tuple
+
+from .parser import ERROR_MESSAGES, try_parse
+from .generator import create_xray_config
+from .templates import CompiledTemplate, compile_template, template_values
+from .serialization import Serializer, get_serializer, COMPACT
+
+
+class ConversionResult(NamedTuple):
+    """Результат конвертации одной строки входного файла"""
+    line_no: int
+    config: Optional[dict]
+    error: Optional[str]
+
+
+@contextmanager
+def open_input(path: str):
+    """
+    Открывает источник ссылок для пакетного режима
+
+    Args:
+        path: Путь к файлу или "-" для стандартного ввода
+
+    Yields:
+        Текстовый поток для построчного чтения
+    """
+    if path == '-':
+        yield sys.stdin
+        return
+
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        yield f
+
+
+def read_links(stream: Iterable[str]) -> Iterator[Tuple[int, str]]:
+    """
+    Лениво читает ссылки из потока
+
+    Пустые строки и комментарии (начинающиеся с #) пропускаются,
+    но нумерация строк сохраняется.
+
+    Args:
+        stream: Итерируемый поток строк
+
+    Yields:
+        Пары (номер строки, ссылка)
+    """
+    for line_no, line in enumerate(stream, 1):
+        link = line.strip()
+        if not link or link.startswith('#'):
+            continue
+        yield line_no, link
+
+
+def parse_links(links: Iterable[Tuple[int, str]], err: TextIO = None) -> Iterator[dict]:
+    """
+    Разбирает поток ссылок, сообщая об ошибочных строках
+
+    Args:
+        links: Пары (номер строки, ссылка)
+        err: Поток для сообщений об ошибках (по умолчанию stderr)
+
+    Yields:
+        Словари с данными VLESS для корректных ссылок
+    """
+    if err is None:
+        err = sys.stderr
+
+    for line_no, link in links:
+        parsed, error = try_parse(link)
+        if error is not None:
+            print(f"Строка {line_no}: Ошибка парсинга VLESS URL: {ERROR_MESSAGES[error]}", file=err)
+            continue
+        yield parsed.to_dict()
+
+
+def convert_links(links: Iterable[Tuple[int, str]], template: dict = None,
+                  tag: str = None) -> Iterator[ConversionResult]:
+    """
+    Конвертирует поток ссылок в конфигурации Xray
+
+    Ошибки отдельных ссылок не прерывают обработку, а возвращаются
+    в поле error результата.
+
+    Args:
+        links: Пары (номер строки, ссылка)
+        template: Шаблон конфигурации или скомпилированный шаблон (опционально)
+        tag: Тег для всех конфигураций (опционально, иначе из fragment)
+
+    Yields:
+        Результаты конвертации в порядке входных строк
+    """
+    if template is not None and not isinstance(template, CompiledTemplate):
+        template = compile_template(template)
+
+    for line_no, link in links:
+        parsed, error = try_parse(link)
+        if error is not None:
+            yield ConversionResult(line_no, None, f"Ошибка парсинга VLESS URL: {ERROR_MESSAGES[error]}")
+            continue
+
+        try:
+            vless_data = parsed.to_dict()
+            if template is not None:
+                config = template.render(template_values(vless_data, tag))
+            else:
+                config = create_xray_config(vless_data, tag)
+        except Exception as e:
+            yield ConversionResult(line_no, None, str(e))
+            continue
+        yield ConversionResult(line_no, config, None)
+
+
+def write_jsonl(results: Iterable[ConversionResult], out: BinaryIO,
+                err: TextIO = None, serializer: Serializer = None) -> Tuple[int, int]:
+    """
+    Записывает результаты в формате JSONL по мере их появления
+
+    Каждая конфигурация кодируется один раз и сразу пишется в поток,
+    общий буфер для всего вывода не создается.
+
+    Args:
+        results: Результаты конвертации
+        out: Бинарный поток для записи конфигураций (одна на строку)
+        err: Поток для сообщений об ошибках (по умолчанию stderr)
+        serializer: Сериализатор однострочного формата (по умолчанию compact)
+
+    Returns:
+        Кортеж (количество успешных, количество ошибочных строк)
+    """
+    if err is None:
+        err = sys.stderr
+    if serializer is None:
+        serializer = get_serializer(COMPACT)
+
+    dumps = serializer.dumps
+    write = out.write
+    converted = 0
+    failed = 0
+    for result in results:
+        if result.error is not None:
+            failed += 1
+            print(f"Строка {result.line_no}: {result.error}", file=err)
+            continue
+        write(dumps(result.config))
+        write(b'\n')
+        converted += 1
+
+    return converted, failed
@@ -0,0 +1,176 @@
+"""
+Модуль постоянного кэша конвертации
+
+Содержит кэш на основе sqlite3, в котором готовые outbound хранятся
+под ключом из хеша текста ссылки, содержимого шаблона, тега и версии
+конвертера. При повторном запуске конвертируются только новые или
+измененные ссылки, а записи, не встретившиеся в текущем запуске,
+вытесняются.
+"""
+
+import sqlite3
+import hashlib
+from typing import Iterable, Iterator, Optional, Tuple
+
+from .batch import ConversionResult, convert_links
+from .serialization import get_serializer, COMPACT
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbounds (
+    key TEXT PRIMARY KEY,
+    config TEXT NOT NULL,
+    generation INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def _converter_version() -> str:
+    """Версия пакета и формата результата: другая версия — другие ключи кэша"""
+    from . import __version__
+    from .generator import OUTPUT_VERSION
+    return f"{__version__}+{OUTPUT_VERSION}"
+
+
+class ConversionCache:
+    """
+    Кэш сконвертированных outbound в файле sqlite3
+
+    Каждый запуск получает номер поколения. Найденные и добавленные записи
+    помечаются текущим поколением, а при завершении запуска записи старых
+    поколений удаляются.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Путь к файлу базы данных
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._version = _converter_version()
+        self._touched = []
+
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(_SCHEMA)
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()
+        self.generation = (row[0] if row else 0) + 1
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (name, value) VALUES ('generation', ?)", (self.generation,)
+        )
+
+    def key(self, link: str, template_hash: str = '', tag: str = None) -> str:
+        """
+        Вычисляет ключ кэша
+
+        Args:
+            link: Текст ссылки
+            template_hash: Хеш содержимого шаблона (пустой без шаблона)
+            tag: Тег конфигурации
+
+        Returns:
+            Шестнадцатеричный SHA-256
+        """
+        material = '\0'.join((link, template_hash, tag or '', self._version))
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Возвращает сохраненный outbound в виде JSON строки
+
+        Args:
+            key: Ключ кэша
+
+        Returns:
+            JSON строка или None при промахе
+        """
+        row = self._conn.execute("SELECT config FROM outbounds WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touched.append((self.generation, key))
+        return row[0]
+
+    def put(self, key: str, config_json: str):
+        """
+        Сохраняет outbound
+
+        Args:
+            key: Ключ кэша
+            config_json: Outbound в виде JSON строки
+        """
+        self._conn.execute(
+            "INSERT OR REPLACE INTO outbounds (key, config, generation) VALUES (?, ?, ?)",
+            (key, config_json, self.generation)
+        )
+
+    def finish(self):
+        """Завершает запуск: обновляет поколение найденных записей и вытесняет устаревшие"""
+        if self._touched:
+            self._conn.executemany("UPDATE outbounds SET generation = ? WHERE key = ?", self._touched)
+            self._touched = []
+        cursor = self._conn.execute("DELETE FROM outbounds WHERE generation < ?", (self.generation,))
+        self.evicted += cursor.rowcount
+        self._conn.commit()
+
+    def close(self):
+        """Закрывает соединение с базой без вытеснения"""
+        self._conn.commit()
+        self._conn.close()
+
+    def stats(self) -> dict:
+        """
+        Возвращает статистику кэша
+
+        Returns:
+            Словарь со счетчиками hits, misses, evicted
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'evicted': self.evicted}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Вытесняем только после успешного полного прохода по входу
+        if exc_type is None:
+            self.finish()
+        self.close()
+
+
+def convert_links_cached(links: Iterable[Tuple[int, str]], cache: ConversionCache,
+                         template=None, template_hash: str = '',
+                         tag: str = None) -> Iterator[ConversionResult]:
+    """
+    Конвертирует поток ссылок, используя кэш
+
+    Ошибочные ссылки не кэшируются и сообщаются при каждом запуске.
+
+    Args:
+        links: Пары (номер строки, ссылка)
+        cache: Кэш конвертации
+        template: Скомпилированный шаблон (опционально)
+        template_hash: Хеш содержимого шаблона
+        tag: Тег для всех конфигураций (опционально)
+
+    Yields:
+        Результаты конвертации в порядке входных строк
+    """
+    serializer = get_serializer(COMPACT)
+    for line_no, link in links:
+        key = cache.key(link, template_hash, tag)
+        cached = cache.get(key)
+        if cached is not None:
+            yield ConversionResult(line_no, serializer.loads(cached), None)
+            continue
+
+        for result in convert_links(((line_no, link),), template, tag):
+            if result.error is None:
+                cache.put(key, serializer.dumps(result.config).decode('utf-8'))
+            yield result
@@ -0,0 +1,289 @@
+"""
+Модуль объекта конвертера
+
+Содержит Converter — объект для встраивания пакета в долгоживущие
+сервисы. Он хранит реестр шаблонов (с кэшем загруженных и
+скомпилированных шаблонов) и LRU-кэш разбора ссылок по тексту ссылки,
+поэтому повторные вызовы не платят за разбор и загрузку шаблона заново.
+Один экземпляр можно использовать из нескольких потоков.
+
+Функции модуля (parse_vless_url, convert, convert_many) работают через
+общий экземпляр get_converter(), который использует общий реестр
+шаблонов get_registry().
+"""
+
+import threading
+from typing import Callable, Iterable, Iterator, Optional
+
+from .parser import ERROR_MESSAGES, VlessLink, parse_link, try_parse
+from .generator import create_xray_config
+from .templates import CompiledTemplate, TemplateRegistry, compile_template, get_registry, template_values
+from .batch import ConversionResult
+
+
+DEFAULT_PARSE_CACHE_SIZE = 10000
+
+
+def _parse_error(link: str, code: str) -> str:
+    """Сообщение об ошибке разбора с подробностями (например, неверный порт), как у parse_link"""
+    # Повторный разбор выполняется только для ошибочных ссылок
+    try:
+        parse_link(link)
+    except ValueError as e:
+        return str(e)
+    return f"Ошибка парсинга VLESS URL: {ERROR_MESSAGES[code]}"
+
+
+class Converter:
+    """
+    Конвертер VLESS ссылок с кэшами, безопасный для использования из потоков
+
+    Шаблон в методах задается именем или номером (как --template),
+    словарем шаблона или скомпилированным шаблоном.
+    """
+
+    def __init__(self, registry: TemplateRegistry = None,
+                 cache_size: int = DEFAULT_PARSE_CACHE_SIZE):
+        """
+        Args:
+            registry: Реестр шаблонов (по умолчанию новый TemplateRegistry)
+            cache_size: Максимальное число ссылок в кэше разбора
+                (0 отключает кэш)
+        """
+        if cache_size < 0:
+            raise ValueError("Размер кэша не может быть отрицательным")
+        self.registry = registry if registry is not None else TemplateRegistry()
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Словарь сохраняет порядок вставки: первый ключ — давно не использованный
+        self._parsed = {}
+
+    def try_parse(self, link: str) -> tuple:
+        """
+        Разбирает ссылку без исключений, используя кэш
+
+        Args:
+            link: Текст VLESS ссылки
+
+        Returns:
+            Кортеж (VlessLink, None) при успехе или (None, код_ошибки)
+        """
+        cache = self._parsed
+        with self._lock:
+            result = cache.pop(link, None)
+            if result is not None:
+                cache[link] = result
+                self.hits += 1
+                return result
+            self.misses += 1
+
+        # Разбор выполняется без блокировки; одновременный разбор одной
+        # ссылки в двух потоках дает одинаковые результаты
+        result = try_parse(link)
+        if self.cache_size:
+            with self._lock:
+                cache[link] = result
+                while len(cache) > self.cache_size:
+                    del cache[next(iter(cache))]
+        return result
+
+    def parse(self, link: str) -> VlessLink:
+        """
+        Разбирает ссылку, используя кэш
+
+        Args:
+            link: Текст VLESS ссылки
+
+        Returns:
+            Разобранная ссылка
+        """
+        parsed, code = self.try_parse(link)
+        if code is not None:
+            # Повторный разбор дает то же сообщение с подробностями, что и parse_link
+            return parse_link(link)
+        return parsed
+
+    def template(self, template) -> Optional[CompiledTemplate]:
+        """
+        Возвращает скомпилированный шаблон
+
+        Args:
+            template: Имя или номер шаблона, словарь, CompiledTemplate или None
+
+        Returns:
+            Скомпилированный шаблон или None, если шаблон не задан
+        """
+        if template is None or isinstance(template, CompiledTemplate):
+            return template
+        if isinstance(template, str):
+            return self.registry.compiled(self.registry.resolve(template))
+        return compile_template(template)
+
+    @staticmethod
+    def _build(parsed: VlessLink, template: Optional[CompiledTemplate], tag: Optional[str]) -> dict:
+        # Копия params: кэшированная ссылка не должна зависеть от результата
+        vless_data = parsed.to_dict()
+        if template is not None:
+            return template.render(template_values(vless_data, tag))
+        return create_xray_config(vless_data, tag)
+
+    def convert(self, link: str, template=None, tag: str = None) -> dict:
+        """
+        Конвертирует одну ссылку
+
+        Args:
+            link: Текст VLESS ссылки
+            template: Шаблон (опционально)
+            tag: Тег конфигурации (по умолчанию fragment ссылки)
+
+        Returns:
+            Конфигурация Xray (новый словарь при каждом вызове)
+        """
+        return self._build(self.parse(link), self.template(template), tag)
+
+    def convert_templates(self, link: str, templates: Iterable, tag: str = None) -> dict:
+        """
+        Конвертирует одну ссылку по нескольким шаблонам
+
+        Ссылка разбирается, а значения плейсхолдеров вычисляются один раз.
+
+        Args:
+            link: Текст VLESS ссылки
+            templates: Шаблоны (имена, номера, словари или CompiledTemplate)
+            tag: Тег конфигурации (по умолчанию fragment ссылки)
+
+        Returns:
+            Словарь {имя шаблона: конфигурация}; для шаблонов, заданных не
+            именем, ключ — позиция шаблона в списке
+        """
+        compiled = {}
+        for position, template in enumerate(templates):
+            if isinstance(template, str):
+                template = self.registry.resolve(template)
+                compiled[template] = self.registry.compiled(template)
+            else:
+                compiled[position] = self.template(template)
+
+        values = template_values(self.parse(link).to_dict(), tag)
+        return {key: template.render(values) for key, template in compiled.items()}
+
+    def convert_many(self, links: Iterable[str], template=None, tag: str = None,
+                     tag_fn: Callable[[VlessLink], Optional[str]] = None) -> Iterator[ConversionResult]:
+        """
+        Лениво конвертирует поток ссылок
+
+        Шаблон загружается один раз при вызове, ошибки отдельных ссылок
+        не прерывают обработку и возвращаются в поле error результата.
+
+        Args:
+            links: Тексты VLESS ссылок
+            template: Шаблон (опционально)
+            tag: Тег для всех конфигураций (опционально)
+            tag_fn: Функция, возвращающая тег по разобранной ссылке;
+                если задана, tag не используется
+
+        Returns:
+            Итератор ConversionResult, line_no — номер ссылки начиная с 1
+        """
+        return self._convert_many(links, self.template(template), tag, tag_fn)
+
+    def _convert_many(self, links, template, tag, tag_fn):
+        for line_no, link in enumerate(links, 1):
+            parsed, code = self.try_parse(link)
+            if code is not None:
+                yield ConversionResult(line_no, None, _parse_error(link, code))
+                continue
+
+            try:
+                config = self._build(parsed, template, tag_fn(parsed) if tag_fn else tag)
+            except Exception as e:
+                yield ConversionResult(line_no, None, str(e))
+                continue
+            yield ConversionResult(line_no, config, None)
+
+    def clear_cache(self):
+        """Очищает кэш разбора ссылок"""
+        with self._lock:
+            self._parsed.clear()
+
+    def stats(self) -> dict:
+        """
+        Возвращает статистику кэшей
+
+        Returns:
+            Словарь с попаданиями и промахами кэша разбора и статистикой реестра шаблонов
+        """
+        with self._lock:
+            parse = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._parsed),
+                'max_entries': self.cache_size,
+            }
+        return {'parse': parse, 'templates': self.registry.stats()}
+
+
+_default_converter = None
+_default_lock = threading.Lock()
+
+
+def get_converter() -> Converter:
+    """
+    Возвращает общий конвертер
+
+    Returns:
+        Экземпляр Converter с общим реестром шаблонов, создаваемый при первом обращении
+    """
+    global _default_converter
+    if _default_converter is None:
+        with _default_lock:
+            if _default_converter is None:
+                _default_converter = Converter(get_registry())
+    return _default_converter
+
+
+def parse_vless_url(vless_url: str) -> dict:
+    """
+    Парсит VLESS URL через общий конвертер (с кэшем разбора)
+
+    Args:
+        vless_url: Строка VLESS конфигурации
+
+    Returns:
+        Новый словарь с параметрами конфигурации
+    """
+    return get_converter().parse(vless_url).to_dict()
+
+
+def convert(link: str, template=None, tag: str = None) -> dict:
+    """
+    Конвертирует одну ссылку через общий конвертер
+
+    Args:
+        link: Текст VLESS ссылки
+        template: Имя или номер шаблона, словарь или CompiledTemplate (опционально)
+        tag: Тег конфигурации (опционально)
+
+    Returns:
+        Конфигурация Xray
+    """
+    return get_converter().convert(link, template, tag)
+
+
+def convert_many(links: Iterable[str], template=None, tag: str = None,
+                 tag_fn: Callable[[VlessLink], Optional[str]] = None) -> Iterator[ConversionResult]:
+    """
+    Лениво конвертирует поток ссылок через общий конвертер
+
+    Args:
+        links: Тексты VLESS ссылок
+        template: Шаблон (опционально)
+        tag: Тег для всех конфигураций (опционально)
+        tag_fn: Функция, возвращающая тег по разобранной ссылке
+
+    Returns:
+        Итератор ConversionResult
+    """
+    return get_converter().convert_many(links, template, tag, tag_fn)
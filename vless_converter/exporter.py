@@ -0,0 +1,578 @@
+"""
+Модуль обратного преобразования
+
+Содержит преобразование outbound конфигураций Xray (в форме, которую
+создает generator.create_xray_config) обратно в VLESS ссылки.
+
+Настройки streamSettings разбираются таблицами обработчиков, обратными
+к обработчикам генератора. Файлы читаются частями: массив outbounds
+обходится по одному элементу, остальные разделы конфигурации
+пропускаются без разбора, поэтому память не зависит от размера файла.
+Несколько файлов обрабатываются в пуле процессов.
+"""
+
+import os
+import re
+import sys
+import json
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Iterable, Iterator, List, TextIO, Tuple
+from urllib.parse import quote
+
+from .generator import create_xray_config
+from .parser import parse_vless_url
+
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Ключи outbound, которые создает create_xray_config
+OUTBOUND_KEYS = ('protocol', 'settings', 'streamSettings', 'tag')
+
+# Порядок параметров в канонической ссылке; остальные идут после по алфавиту
+PARAM_ORDER = ('type', 'security', 'sni', 'fp', 'pbk', 'sid', 'spx', 'alpn', 'flow',
+               'path', 'host', 'headerType', 'serviceName', 'mode', 'seed', 'quicSecurity', 'key')
+_PARAM_RANK = {name: rank for rank, name in enumerate(PARAM_ORDER)}
+
+# security -> (ключ настроек в streamSettings, функция (settings, params))
+_SECURITY_EXPORTERS = {}
+
+# network -> (ключ настроек в streamSettings, функция (settings, params))
+_TRANSPORT_EXPORTERS = {}
+
+
+def register_security_export(name: str, settings_key: str):
+    """
+    Регистрирует обратный обработчик security (см. generator.register_security)
+
+    Функция обработчика принимает словарь streamSettings[settings_key] и
+    словарь параметров ссылки, который она дополняет.
+
+    Args:
+        name: Значение security в streamSettings
+        settings_key: Ключ настроек в streamSettings
+    """
+    def decorator(func):
+        _SECURITY_EXPORTERS[name] = (settings_key, func)
+        return func
+    return decorator
+
+
+def register_transport_export(name: str, settings_key: str):
+    """
+    Регистрирует обратный обработчик транспорта (см. generator.register_transport)
+
+    Args:
+        name: Значение network в streamSettings
+        settings_key: Ключ настроек в streamSettings
+    """
+    def decorator(func):
+        _TRANSPORT_EXPORTERS[name] = (settings_key, func)
+        return func
+    return decorator
+
+
+def _put(params: dict, name: str, value):
+    """Добавляет непустой строковый параметр (пустые значения парсер пропускает)"""
+    if isinstance(value, str) and value:
+        params[name] = value
+
+
+@register_security_export('tls', 'tlsSettings')
+def _tls_params(settings: dict, params: dict):
+    _put(params, 'sni', settings.get('serverName'))
+    alpn = settings.get('alpn')
+    if isinstance(alpn, list):
+        _put(params, 'alpn', ','.join(alpn))
+    _put(params, 'fp', settings.get('fingerprint'))
+
+
+@register_security_export('reality', 'realitySettings')
+def _reality_params(settings: dict, params: dict):
+    _put(params, 'pbk', settings.get('publicKey'))
+    _put(params, 'sni', settings.get('serverName'))
+    _put(params, 'fp', settings.get('fingerprint'))
+    _put(params, 'sid', settings.get('shortId'))
+    _put(params, 'spx', settings.get('spiderX'))
+
+
+@register_transport_export('ws', 'wsSettings')
+def _ws_params(settings: dict, params: dict):
+    _put(params, 'path', settings.get('path'))
+    headers = settings.get('headers')
+    if isinstance(headers, dict):
+        _put(params, 'host', headers.get('Host'))
+
+
+@register_transport_export('tcp', 'tcpSettings')
+def _tcp_params(settings: dict, params: dict):
+    header = settings.get('header')
+    if not isinstance(header, dict):
+        return
+    _put(params, 'headerType', header.get('type'))
+    request = header.get('request')
+    if header.get('type') == 'http' and isinstance(request, dict):
+        paths = request.get('path')
+        if isinstance(paths, list) and paths:
+            _put(params, 'path', paths[0])
+        hosts = (request.get('headers') or {}).get('Host')
+        if isinstance(hosts, list) and hosts:
+            _put(params, 'host', hosts[0])
+
+
+@register_transport_export('grpc', 'grpcSettings')
+def _grpc_params(settings: dict, params: dict):
+    _put(params, 'serviceName', settings.get('serviceName'))
+    if settings.get('multiMode') is True:
+        params['mode'] = 'multi'
+
+
+@register_transport_export('xhttp', 'xhttpSettings')
+def _xhttp_params(settings: dict, params: dict):
+    _put(params, 'path', settings.get('path'))
+    _put(params, 'mode', settings.get('mode'))
+    _put(params, 'host', settings.get('host'))
+
+
+@register_transport_export('httpupgrade', 'httpupgradeSettings')
+def _httpupgrade_params(settings: dict, params: dict):
+    _put(params, 'path', settings.get('path'))
+    _put(params, 'host', settings.get('host'))
+
+
+@register_transport_export('h2', 'httpSettings')
+@register_transport_export('http', 'httpSettings')
+def _http_params(settings: dict, params: dict):
+    _put(params, 'path', settings.get('path'))
+    hosts = settings.get('host')
+    if isinstance(hosts, list):
+        _put(params, 'host', ','.join(hosts))
+
+
+@register_transport_export('kcp', 'kcpSettings')
+def _kcp_params(settings: dict, params: dict):
+    header = settings.get('header')
+    if isinstance(header, dict):
+        _put(params, 'headerType', header.get('type'))
+    _put(params, 'seed', settings.get('seed'))
+
+
+@register_transport_export('quic', 'quicSettings')
+def _quic_params(settings: dict, params: dict):
+    _put(params, 'quicSecurity', settings.get('security'))
+    _put(params, 'key', settings.get('key'))
+    header = settings.get('header')
+    if isinstance(header, dict):
+        _put(params, 'headerType', header.get('type'))
+
+
+def _quote(value: str, safe: str = '/:,@') -> str:
+    # "+" кодируется: парсер декодирует его в пробел
+    return quote(value, safe=safe)
+
+
+def format_link(uuid: str, host: str, port: int, params: dict, fragment: str = None) -> str:
+    """
+    Собирает каноническую VLESS ссылку
+
+    Параметры записываются в порядке PARAM_ORDER, затем остальные по
+    алфавиту; значения кодируются так, чтобы parse_vless_url вернул их
+    без изменений.
+
+    Args:
+        uuid: UUID пользователя
+        host: Адрес сервера (IPv6 без скобок)
+        port: Порт
+        params: Параметры запроса
+        fragment: Фрагмент (тег), опционально
+
+    Returns:
+        Текст ссылки
+    """
+    if ':' in host:
+        host = f'[{host}]'
+    names = sorted(params, key=lambda name: (_PARAM_RANK.get(name, len(PARAM_ORDER)), name))
+    link = f"vless://{uuid}@{host}:{port}"
+    if names:
+        link += '?' + '&'.join(f"{_quote(name)}={_quote(params[name])}" for name in names)
+    if fragment:
+        link += '#' + _quote(fragment, safe='')
+    return link
+
+
+def _stream_params(stream: dict) -> dict:
+    """Восстанавливает параметры ссылки из streamSettings"""
+    params = {}
+    network = stream.get('network', 'tcp')
+    security = stream.get('security', 'none')
+    _put(params, 'type', network)
+    _put(params, 'security', security)
+
+    handler = _SECURITY_EXPORTERS.get(security)
+    if handler is not None and isinstance(stream.get(handler[0]), dict):
+        handler[1](stream[handler[0]], params)
+    handler = _TRANSPORT_EXPORTERS.get(network)
+    if handler is not None and isinstance(stream.get(handler[0]), dict):
+        handler[1](stream[handler[0]], params)
+    return params
+
+
+def export_outbound(outbound: dict) -> List[Tuple[str, dict]]:
+    """
+    Преобразует outbound в VLESS ссылки
+
+    Каждая пара (сервер vnext, пользователь) дает отдельную ссылку.
+
+    Args:
+        outbound: Outbound конфигурации Xray
+
+    Returns:
+        Список пар (ссылка, outbound этой ссылки в форме create_xray_config);
+        пустой список для outbound другого протокола
+    """
+    if not isinstance(outbound, dict) or outbound.get('protocol') != 'vless':
+        return []
+
+    vnext = (outbound.get('settings') or {}).get('vnext')
+    if not isinstance(vnext, list) or not vnext:
+        raise ValueError("В outbound vless нет settings.vnext")
+    stream = outbound.get('streamSettings') or {}
+    if not isinstance(stream, dict):
+        raise ValueError("streamSettings должен быть объектом")
+
+    base_params = _stream_params(stream)
+    tag = outbound.get('tag')
+    result = []
+    for server in vnext:
+        address = server.get('address') if isinstance(server, dict) else None
+        port = server.get('port')
+        if not isinstance(address, str) or not address:
+            raise ValueError("В vnext нет адреса сервера")
+        if not isinstance(port, int) or isinstance(port, bool):
+            raise ValueError(f"Неверный порт сервера {address}: {port!r}")
+        users = server.get('users')
+        if not isinstance(users, list) or not users:
+            raise ValueError(f"В vnext сервера {address} нет пользователей")
+
+        for user in users:
+            uuid = user.get('id') if isinstance(user, dict) else None
+            if not isinstance(uuid, str) or not uuid:
+                raise ValueError(f"У пользователя сервера {address} нет id")
+            params = dict(base_params)
+            _put(params, 'flow', user.get('flow'))
+            link = format_link(uuid, address, port, params, tag if isinstance(tag, str) else None)
+
+            single = {key: outbound[key] for key in OUTBOUND_KEYS if key in outbound}
+            single['settings'] = {'vnext': [dict(server, users=[user])]}
+            result.append((link, single))
+    return result
+
+
+def check_round_trip(link: str, outbound: dict) -> bool:
+    """
+    Проверяет, что ссылка восстанавливает outbound
+
+    Args:
+        link: Ссылка из export_outbound
+        outbound: Outbound этой ссылки из export_outbound
+
+    Returns:
+        True, если create_xray_config(parse_vless_url(link)) совпадает с outbound
+    """
+    generated = create_xray_config(parse_vless_url(link))
+    if 'tag' not in outbound:
+        # Без тега генератор подставляет тег по умолчанию
+        del generated['tag']
+    return generated == outbound
+
+
+def round_trip(link: str) -> bool:
+    """
+    Проверяет цепочку parse -> generate -> export -> parse для ссылки
+
+    Args:
+        link: VLESS ссылка
+
+    Returns:
+        True, если ссылка после экспорта дает ту же конфигурацию Xray
+        и повторный экспорт дает ту же ссылку
+    """
+    config = create_xray_config(parse_vless_url(link))
+    (exported, _), = export_outbound(config)
+    regenerated = create_xray_config(parse_vless_url(exported))
+    return regenerated == config and export_outbound(regenerated)[0][0] == exported
+
+
+_STRUCTURE = re.compile(r'["\[\]{}]')
+_STRING_END = re.compile(r'["\\]')
+_SPACE = re.compile(r'[ \t\r\n]*')
+_TOP_LEVEL_KEYS = frozenset(OUTBOUND_KEYS)
+
+
+class _JsonReader:
+    """Последовательное чтение JSON из потока частями ограниченного размера"""
+
+    def __init__(self, stream: TextIO, chunk_size: int):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self, size: int = 0) -> bool:
+        """Дочитывает поток; прочитанная часть буфера отбрасывается"""
+        if self.eof:
+            return False
+        data = self.stream.read(max(self.chunk_size, size))
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Возвращает следующий непробельный символ без чтения или None в конце потока"""
+        while True:
+            self.pos = _SPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return None
+
+    def take(self, expected: str):
+        """Читает ожидаемый символ структуры"""
+        char = self.peek()
+        if char is None or char not in expected:
+            raise ValueError(f"Неверный JSON: ожидается {' или '.join(expected)}, получено {char or 'конец файла'}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Разбирает следующее значение целиком"""
+        if self.peek() is None:
+            raise ValueError("Неверный JSON: неожиданный конец файла")
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                # Буфер растет вдвое, поэтому длинное значение разбирается за O(n)
+                if not self._fill(len(self.buf) - self.pos):
+                    raise ValueError(f"Неверный JSON: {e.msg}")
+                continue
+            # Число на границе части могло продолжаться в следующей
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def skip(self):
+        """Пропускает следующее значение, не разбирая и не храня его"""
+        char = self.peek()
+        if char not in ('{', '[', '"'):
+            self.value()
+            return
+
+        depth = 0
+        while True:
+            match = _STRUCTURE.search(self.buf, self.pos)
+            if match is None:
+                self.pos = len(self.buf)
+                if not self._fill():
+                    raise ValueError("Неверный JSON: неожиданный конец файла")
+                continue
+            self.pos = match.end()
+            char = match.group()
+            if char == '"':
+                self._skip_string()
+            elif char in '{[':
+                depth += 1
+            else:
+                depth -= 1
+            if depth == 0:
+                return
+
+    def _skip_string(self):
+        while True:
+            match = _STRING_END.search(self.buf, self.pos)
+            if match is None:
+                self.pos = len(self.buf)
+                if not self._fill():
+                    raise ValueError("Неверный JSON: незакрытая строка")
+                continue
+            if match.group() == '"':
+                self.pos = match.end()
+                return
+            # Экранированный символ может оказаться в следующей части
+            if match.end() == len(self.buf):
+                self.pos = match.start()
+                if not self._fill():
+                    raise ValueError("Неверный JSON: незакрытая строка")
+                continue
+            self.pos = match.end() + 1
+
+    def items(self) -> Iterator:
+        """Выдает элементы массива по одному"""
+        self.take('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.take(',]') == ']':
+                return
+
+
+def iter_outbounds(stream: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[dict]:
+    """
+    Выдает outbound из JSON потока по одному
+
+    Поддерживаются конфигурация Xray (объект с массивом outbounds), массив
+    outbound и последовательность outbound (например, JSONL пакетного
+    режима). Разделы конфигурации, кроме outbounds, пропускаются без
+    разбора.
+
+    Args:
+        stream: Текстовый поток
+        chunk_size: Размер части чтения в символах
+
+    Yields:
+        Словари outbound
+    """
+    reader = _JsonReader(stream, chunk_size)
+    while True:
+        char = reader.peek()
+        if char is None:
+            return
+        if char == '[':
+            yield from reader.items()
+            continue
+
+        reader.take('{')
+        fields = {}
+        found = False
+        if reader.peek() == '}':
+            reader.pos += 1
+            continue
+        while True:
+            key = reader.value()
+            if not isinstance(key, str):
+                raise ValueError("Неверный JSON: ключ объекта должен быть строкой")
+            reader.take(':')
+            if key == 'outbounds' and reader.peek() == '[':
+                found = True
+                yield from reader.items()
+            elif key in _TOP_LEVEL_KEYS:
+                # Объект верхнего уровня может сам быть outbound
+                fields[key] = reader.value()
+            else:
+                reader.skip()
+            if reader.take(',}') == '}':
+                break
+        if not found and 'protocol' in fields:
+            yield fields
+
+
+def expand_paths(paths: Iterable[str]) -> List[str]:
+    """
+    Раскрывает каталоги в списки файлов *.json и *.jsonl
+
+    Args:
+        paths: Пути к файлам или каталогам
+
+    Returns:
+        Пути к файлам
+    """
+    result = []
+    for path in paths:
+        if os.path.isdir(path):
+            result.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                          if name.endswith(('.json', '.jsonl')))
+        else:
+            result.append(path)
+    return result
+
+
+def export_file(path: str, check: bool = False) -> Tuple[List[Tuple[str, str]], dict, List[str]]:
+    """
+    Преобразует outbound одного файла в ссылки
+
+    Args:
+        path: Путь к файлу конфигурации
+        check: Проверять, что каждая ссылка восстанавливает свой outbound
+
+    Returns:
+        Кортеж (пары (ключ дедупликации, ссылка), счетчики {outbounds,
+        links, mismatched}, сообщения об ошибках)
+    """
+    links = []
+    errors = []
+    counts = {'outbounds': 0, 'links': 0, 'mismatched': 0}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for index, outbound in enumerate(iter_outbounds(f)):
+                counts['outbounds'] += 1
+                try:
+                    exported = export_outbound(outbound)
+                except ValueError as e:
+                    errors.append(f"{path}: outbound {index}: {e}")
+                    continue
+                for link, single in exported:
+                    counts['links'] += 1
+                    links.append((link.partition('#')[0], link))
+                    if check and not check_round_trip(link, single):
+                        counts['mismatched'] += 1
+                        errors.append(f"{path}: outbound {index}: ссылка {link} "
+                                      f"не восстанавливает исходный outbound")
+    except (OSError, UnicodeDecodeError, ValueError) as e:
+        errors.append(f"{path}: {e}")
+    return links, counts, errors
+
+
+def export_files(paths: Iterable[str], jobs: int = 1, check: bool = False,
+                 err: TextIO = None) -> Tuple[List[str], dict]:
+    """
+    Преобразует outbound из нескольких файлов в VLESS ссылки
+
+    Ссылки, отличающиеся только тегом, считаются дубликатами (остается
+    первая в порядке файлов). Результат отсортирован, поэтому не зависит
+    от порядка завершения процессов.
+
+    Args:
+        paths: Пути к файлам конфигурации
+        jobs: Количество процессов
+        check: Проверять обратное преобразование каждой ссылки
+        err: Поток для сообщений об ошибках (по умолчанию stderr)
+
+    Returns:
+        Кортеж (ссылки, статистика {files, outbounds, links, unique,
+        duplicates, mismatched, errors})
+    """
+    if err is None:
+        err = sys.stderr
+
+    paths = list(paths)
+    worker = partial(export_file, check=check)
+    stats = {'files': len(paths), 'outbounds': 0, 'links': 0, 'mismatched': 0, 'errors': 0}
+    unique = {}
+
+    def collect(results):
+        for links, counts, errors in results:
+            for key in counts:
+                stats[key] += counts[key]
+            stats['errors'] += len(errors) - counts['mismatched']
+            for message in errors:
+                print(message, file=err)
+            for key, link in links:
+                unique.setdefault(key, link)
+
+    if jobs > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as pool:
+            collect(pool.map(worker, paths))
+    else:
+        collect(map(worker, paths))
+
+    stats['unique'] = len(unique)
+    stats['duplicates'] = stats['links'] - len(unique)
+    return sorted(unique.values()), stats
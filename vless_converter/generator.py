@@ -2,22 +2,325 @@
 Модуль для генерации конфигураций Xray
 
 Содержит функции для создания конфигураций в формате Xray-core.
+
+streamSettings собираются из таблиц обработчиков: security (tls, reality)
+и транспорт (ws, tcp, grpc, ...). Для каждой пары (security, network)
+один раз собирается функция-сборщик, которая затем переиспользуется.
+Новый транспорт добавляется регистрацией через register_transport.
 """
 
+# Версия формата результата create_xray_config и применения шаблонов.
+# Входит в ключ постоянного кэша (cache.py): увеличивается при любом
+# изменении генерируемых конфигураций, чтобы старые записи не выдавались
+OUTPUT_VERSION = 2
+
+# security -> (ключ настроек в streamSettings, функция построения настроек)
+_SECURITY_HANDLERS = {}
+
+# network -> (ключ настроек в streamSettings, функция построения настроек)
+_TRANSPORT_HANDLERS = {}
+
+# (security, network) -> сборщик streamSettings
+_stream_builders = {}
+
+# Ограничение на число сборщиков для произвольных значений из ссылок
+_MAX_STREAM_BUILDERS = 256
+
+# Кэш множеств поддерживаемых значений, сбрасывается при регистрации
+_supported = {}
+
+
+def register_security(name: str, settings_key: str):
+    """
+    Регистрирует обработчик параметра security
+
+    Функция обработчика принимает (params, server) и возвращает словарь
+    настроек, который записывается в streamSettings[settings_key].
+
+    Args:
+        name: Значение параметра security в ссылке
+        settings_key: Ключ настроек в streamSettings
+    """
+    def decorator(func):
+        _SECURITY_HANDLERS[name] = (settings_key, func)
+        _stream_builders.clear()
+        _supported.clear()
+        return func
+    return decorator
+
+
+def register_transport(name: str, settings_key: str):
+    """
+    Регистрирует обработчик транспорта (параметр type)
+
+    Функция обработчика принимает params и возвращает словарь настроек,
+    который записывается в streamSettings[settings_key], или None, если
+    настройки не нужны.
+
+    Args:
+        name: Значение параметра type в ссылке
+        settings_key: Ключ настроек в streamSettings
+    """
+    def decorator(func):
+        _TRANSPORT_HANDLERS[name] = (settings_key, func)
+        _stream_builders.clear()
+        _supported.clear()
+        return func
+    return decorator
+
+
+@register_security('tls', 'tlsSettings')
+def _tls_settings(params: dict, server: str) -> dict:
+    settings = {
+        "allowInsecure": False,
+        "serverName": params.get('sni', server)
+    }
+
+    # Добавляем ALPN
+    if 'alpn' in params:
+        alpn_values = params['alpn'].split(',')
+        settings['alpn'] = [value.strip() for value in alpn_values]
+
+    # Настраиваем fingerprint
+    if 'fp' in params:
+        settings['fingerprint'] = params['fp']
+
+    return settings
+
+
+@register_security('reality', 'realitySettings')
+def _reality_settings(params: dict, server: str) -> dict:
+    settings = {}
+
+    # Обязательные параметры для Reality
+    if 'pbk' in params:
+        settings['publicKey'] = params['pbk']
+
+    if 'sni' in params:
+        settings['serverName'] = params['sni']
+
+    settings['fingerprint'] = params.get('fp', 'chrome')
+
+    if 'sid' in params:
+        settings['shortId'] = params['sid']
+
+    settings['spiderX'] = params.get('spx', '/')
+    return settings
+
+
+@register_transport('ws', 'wsSettings')
+def _ws_settings(params: dict) -> dict:
+    settings = {
+        "path": params.get('path', '/'),
+        "headers": {}
+    }
+
+    if 'host' in params:
+        settings['headers']['Host'] = params['host']
+
+    return settings
+
+
+@register_transport('tcp', 'tcpSettings')
+def _tcp_settings(params: dict):
+    if 'headerType' not in params:
+        return None
+
+    settings = {
+        "header": {
+            "type": params['headerType']
+        }
+    }
+
+    if params['headerType'] == 'http':
+        settings['header']['request'] = {
+            "version": "1.1",
+            "method": "GET",
+            "path": [params.get('path', '/')],
+            "headers": {}
+        }
+
+        if 'host' in params:
+            settings['header']['request']['headers']['Host'] = [params['host']]
+
+    return settings
+
+
+@register_transport('grpc', 'grpcSettings')
+def _grpc_settings(params: dict) -> dict:
+    return {
+        "serviceName": params.get('serviceName', params.get('path', '')),
+        "multiMode": params.get('mode', 'gun') == 'multi'
+    }
+
+
+@register_transport('xhttp', 'xhttpSettings')
+def _xhttp_settings(params: dict) -> dict:
+    settings = {
+        "path": params.get('path', '/'),
+        "mode": params.get('mode', 'auto')
+    }
+
+    if 'host' in params:
+        settings['host'] = params['host']
+
+    return settings
+
+
+@register_transport('httpupgrade', 'httpupgradeSettings')
+def _httpupgrade_settings(params: dict) -> dict:
+    settings = {
+        "path": params.get('path', '/')
+    }
+
+    if 'host' in params:
+        settings['host'] = params['host']
+
+    return settings
+
+
+@register_transport('h2', 'httpSettings')
+@register_transport('http', 'httpSettings')
+def _http_settings(params: dict) -> dict:
+    settings = {
+        "path": params.get('path', '/')
+    }
+
+    if 'host' in params:
+        settings['host'] = [value.strip() for value in params['host'].split(',')]
+
+    return settings
+
+
+@register_transport('kcp', 'kcpSettings')
+def _kcp_settings(params: dict) -> dict:
+    settings = {
+        "header": {
+            "type": params.get('headerType', 'none')
+        }
+    }
+
+    if 'seed' in params:
+        settings['seed'] = params['seed']
+
+    return settings
+
+
+@register_transport('quic', 'quicSettings')
+def _quic_settings(params: dict) -> dict:
+    return {
+        "security": params.get('quicSecurity', 'none'),
+        "key": params.get('key', ''),
+        "header": {
+            "type": params.get('headerType', 'none')
+        }
+    }
+
+
+def supported_security() -> frozenset:
+    """
+    Возвращает значения security, для которых есть обработчики
+
+    Returns:
+        Множество значений, включая none
+    """
+    values = _supported.get('security')
+    if values is None:
+        values = _supported['security'] = frozenset(_SECURITY_HANDLERS) | {'none'}
+    return values
+
+
+def supported_networks() -> frozenset:
+    """
+    Возвращает значения type (транспорты), для которых есть обработчики
+
+    Returns:
+        Множество значений
+    """
+    values = _supported.get('network')
+    if values is None:
+        values = _supported['network'] = frozenset(_TRANSPORT_HANDLERS)
+    return values
+
+
+def _compose_stream_builder(security, network):
+    """Собирает функцию построения streamSettings для пары (security, network)"""
+    security_handler = _SECURITY_HANDLERS.get(security)
+    transport_handler = _TRANSPORT_HANDLERS.get(network)
+
+    if security_handler is None:
+        # Неизвестное или отсутствующее значение security — без шифрования
+        if transport_handler is None:
+            def build(params, server, network_value):
+                return {"network": network_value, "security": "none"}
+        else:
+            transport_key, transport = transport_handler
+
+            def build(params, server, network_value):
+                stream = {"network": network_value, "security": "none"}
+                settings = transport(params)
+                if settings is not None:
+                    stream[transport_key] = settings
+                return stream
+        return build
+
+    security_key, security_settings = security_handler
+    if transport_handler is None:
+        def build(params, server, network_value):
+            return {
+                "network": network_value,
+                "security": security,
+                security_key: security_settings(params, server)
+            }
+    else:
+        transport_key, transport = transport_handler
+
+        def build(params, server, network_value):
+            stream = {
+                "network": network_value,
+                "security": security,
+                security_key: security_settings(params, server)
+            }
+            settings = transport(params)
+            if settings is not None:
+                stream[transport_key] = settings
+            return stream
+    return build
+
+
+def _stream_builder(security, network):
+    """Возвращает сборщик streamSettings из кэша или собирает новый"""
+    try:
+        return _stream_builders[security, network]
+    except KeyError:
+        pass
+    except TypeError:
+        # Повторяющийся параметр в ссылке дает список, он не совпадает ни с одним обработчиком
+        if not isinstance(security, str):
+            security = None
+        if not isinstance(network, str):
+            network = None
+        return _stream_builder(security, network)
+
+    builder = _compose_stream_builder(security, network)
+    if len(_stream_builders) < _MAX_STREAM_BUILDERS:
+        _stream_builders[security, network] = builder
+    return builder
+
 
 def create_xray_config(vless_data: dict, tag: str = None) -> dict:
     """
     Создает конфигурацию Xray на основе данных VLESS
-    
+
     Args:
         vless_data: Словарь с данными VLESS
         tag: Тег для конфигурации (опционально)
-        
+
     Returns:
         Словарь конфигурации Xray
     """
     params = vless_data['params']
-    
+
     # Определяем тег: переданный параметр, fragment из URL, или 'reverse-proxy' по умолчанию
     if tag:
         config_tag = tag
@@ -25,116 +328,36 @@ def create_xray_config(vless_data: dict, tag: str = None) -> dict:
         config_tag = vless_data['fragment']
     else:
         config_tag = 'reverse-proxy'
-    
+
+    user = {
+        "id": vless_data['uuid'],
+        "encryption": "none"
+    }
+
+    # Добавляем flow если указан
+    if 'flow' in params:
+        user['flow'] = params['flow']
+
+    security = params.get('security')
+    network = params.get('type')
+    try:
+        build_stream = _stream_builders[security, network]
+    except (KeyError, TypeError):
+        build_stream = _stream_builder(security, network)
+
     # Базовая конфигурация в формате Xray-core
-    config = {
+    return {
         "protocol": "vless",
         "settings": {
             "vnext": [
                 {
                     "address": vless_data['server'],
                     "port": vless_data['port'],
-                    "users": [
-                        {
-                            "id": vless_data['uuid'],
-                            "encryption": "none"
-                        }
-                    ]
+                    "users": [user]
                 }
             ]
         },
-        "streamSettings": {
-            "network": "tcp",
-            "security": "none"
-        },
+        "streamSettings": build_stream(params, vless_data['server'],
+                                       'tcp' if network is None else network),
         "tag": config_tag
     }
-    
-    # Добавляем flow если указан
-    if 'flow' in params:
-        config['settings']['vnext'][0]['users'][0]['flow'] = params['flow']
-    
-    # Настраиваем тип соединения
-    if 'type' in params:
-        config['streamSettings']['network'] = params['type']
-    
-    # Настраиваем TLS
-    if params.get('security') == 'tls':
-        config['streamSettings']['security'] = 'tls'
-        config['streamSettings']['tlsSettings'] = {
-            "allowInsecure": False,
-            "serverName": params.get('sni', vless_data['server'])
-        }
-        
-        # Добавляем ALPN
-        if 'alpn' in params:
-            alpn_values = params['alpn'].split(',')
-            config['streamSettings']['tlsSettings']['alpn'] = [value.strip() for value in alpn_values]
-        
-        # Настраиваем fingerprint
-        if 'fp' in params:
-            config['streamSettings']['tlsSettings']['fingerprint'] = params['fp']
-    
-    # Настраиваем REALITY
-    elif params.get('security') == 'reality':
-        config['streamSettings']['security'] = 'reality'
-        config['streamSettings']['realitySettings'] = {}
-        
-        # Обязательные параметры для Reality
-        if 'pbk' in params:
-            config['streamSettings']['realitySettings']['publicKey'] = params['pbk']
-        
-        if 'sni' in params:
-            config['streamSettings']['realitySettings']['serverName'] = params['sni']
-        
-        if 'fp' in params:
-            config['streamSettings']['realitySettings']['fingerprint'] = params['fp']
-        else:
-            config['streamSettings']['realitySettings']['fingerprint'] = 'chrome'
-        
-        if 'sid' in params:
-            config['streamSettings']['realitySettings']['shortId'] = params['sid']
-        
-        if 'spx' in params:
-            config['streamSettings']['realitySettings']['spiderX'] = params['spx']
-        else:
-            config['streamSettings']['realitySettings']['spiderX'] = '/'
-    
-    # Настраиваем WebSocket
-    if params.get('type') == 'ws':
-        config['streamSettings']['wsSettings'] = {
-            "path": params.get('path', '/'),
-            "headers": {}
-        }
-        
-        if 'host' in params:
-            config['streamSettings']['wsSettings']['headers']['Host'] = params['host']
-    
-    # Настраиваем TCP
-    elif params.get('type') == 'tcp':
-        if 'headerType' in params:
-            config['streamSettings']['tcpSettings'] = {
-                "header": {
-                    "type": params['headerType']
-                }
-            }
-            
-            if params['headerType'] == 'http':
-                config['streamSettings']['tcpSettings']['header']['request'] = {
-                    "version": "1.1",
-                    "method": "GET",
-                    "path": [params.get('path', '/')],
-                    "headers": {}
-                }
-                
-                if 'host' in params:
-                    config['streamSettings']['tcpSettings']['header']['request']['headers']['Host'] = [params['host']]
-    
-    # Настраиваем gRPC
-    elif params.get('type') == 'grpc':
-        config['streamSettings']['grpcSettings'] = {
-            "serviceName": params.get('serviceName', params.get('path', '')),
-            "multiMode": params.get('mode', 'gun') == 'multi'
-        }
-    
-    return config 
\ No newline at end of file
@@ -0,0 +1,213 @@
+"""
+Модуль сборки объединенной конфигурации
+
+Содержит функции для объединения множества VLESS ссылок в одну
+конфигурацию Xray с балансировщиком и observatory.
+"""
+
+import marshal
+from typing import Iterable, Tuple
+
+from .generator import create_xray_config
+from .templates import CompiledTemplate
+
+
+DEFAULT_BALANCER_TAG = 'balancer'
+DEFAULT_STRATEGY = 'leastPing'
+DEFAULT_PROBE_URL = 'https://www.google.com/generate_204'
+DEFAULT_PROBE_INTERVAL = '1m'
+
+# Плейсхолдер тега, по которому в шаблоне находятся outbound и правила маршрутизации
+TAG_PLACEHOLDER = '{{tag}}'
+
+
+def _hashable(value):
+    """Приводит значение параметра к хешируемому виду (повторяющиеся ключи дают список)"""
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+def link_identity(vless_data: dict) -> tuple:
+    """
+    Возвращает канонический идентификатор ссылки для дедупликации
+
+    Две ссылки с одинаковым идентификатором дают одинаковое подключение,
+    даже если отличаются фрагментом или порядком параметров.
+
+    Args:
+        vless_data: Словарь с данными VLESS
+
+    Returns:
+        Кортеж (server, port, uuid, security, sni, pbk, sid, transport)
+    """
+    params = vless_data['params']
+    return (
+        vless_data['server'].lower(),
+        vless_data['port'],
+        vless_data['uuid'].lower(),
+        _hashable(params.get('security')),
+        _hashable(params.get('sni')),
+        _hashable(params.get('pbk')),
+        _hashable(params.get('sid')),
+        _hashable(params.get('type')),
+    )
+
+
+class TagAllocator:
+    """
+    Выдает уникальные теги, разрешая коллизии детерминированными суффиксами
+
+    Для каждого базового тега хранится следующий свободный суффикс,
+    поэтому выделение тега не требует повторного просмотра уже выданных.
+    """
+
+    def __init__(self, reserved: Iterable[str] = ()):
+        """
+        Args:
+            reserved: Теги, которые уже заняты (например, outbound шаблона)
+        """
+        self._used = set(reserved)
+        self._next_suffix = {}
+
+    def allocate(self, base: str) -> str:
+        """
+        Выдает тег: base, если он свободен, иначе base-2, base-3 и т.д.
+
+        Args:
+            base: Желаемый тег
+
+        Returns:
+            Уникальный тег
+        """
+        if base not in self._used:
+            self._used.add(base)
+            return base
+
+        suffix = self._next_suffix.get(base, 2)
+        tag = f"{base}-{suffix}"
+        while tag in self._used:
+            suffix += 1
+            tag = f"{base}-{suffix}"
+        self._next_suffix[base] = suffix + 1
+        self._used.add(tag)
+        return tag
+
+
+def _prepare_template(template: dict, balancer_tag: str) -> Tuple[dict, int]:
+    """
+    Копирует шаблон, удаляет outbound с плейсхолдером тега и
+    перенаправляет правила маршрутизации на балансировщик
+
+    Returns:
+        Кортеж (конфигурация, позиция для вставки outbound)
+    """
+    config = marshal.loads(marshal.dumps(template))
+    outbounds = config.get('outbounds', [])
+    for position, outbound in enumerate(outbounds):
+        if outbound.get('tag') == TAG_PLACEHOLDER:
+            break
+    else:
+        raise ValueError(f"В шаблоне нет outbound с тегом {TAG_PLACEHOLDER}")
+    del outbounds[position]
+
+    for rule in config.get('routing', {}).get('rules', []):
+        if rule.get('outboundTag') == TAG_PLACEHOLDER:
+            del rule['outboundTag']
+            rule['balancerTag'] = balancer_tag
+
+    # Остальные плейсхолдеры заполнить нечем: значения разные для каждой ссылки
+    remaining = CompiledTemplate(config).placeholders
+    if remaining:
+        raise ValueError(f"Плейсхолдеры вне outbound {TAG_PLACEHOLDER} не поддерживаются: {', '.join(sorted(remaining))}")
+
+    return config, position
+
+
+def build_merged_config(links: Iterable[dict], template: dict = None, tag_prefix: str = '',
+                        balancer_tag: str = DEFAULT_BALANCER_TAG,
+                        strategy: str = DEFAULT_STRATEGY,
+                        probe_url: str = DEFAULT_PROBE_URL,
+                        probe_interval: str = DEFAULT_PROBE_INTERVAL) -> Tuple[dict, dict]:
+    """
+    Объединяет ссылки в одну конфигурацию Xray с балансировщиком
+
+    Outbound для каждой уникальной ссылки создается через create_xray_config.
+    Если задан шаблон, outbound с тегом {{tag}} заменяется на список
+    сгенерированных outbound, а правила маршрутизации с outboundTag {{tag}}
+    перенаправляются на балансировщик.
+
+    Селектор балансировщика Xray сравнивает теги по префиксу, поэтому ни
+    префикс тегов, ни (без префикса) сгенерированный тег не должны быть
+    началом тега outbound шаблона: иначе балансировщик выберет и его.
+    Сгенерированный тег, совпадающий с началом такого тега, получает
+    суффикс; совпадающий префикс тегов считается ошибкой.
+
+    Args:
+        links: Словари с данными VLESS
+        template: Шаблон конфигурации (опционально)
+        tag_prefix: Префикс тегов outbound (опционально)
+        balancer_tag: Тег балансировщика
+        strategy: Стратегия балансировки Xray
+        probe_url: URL для проверки доступности в observatory
+        probe_interval: Интервал проверок observatory
+
+    Returns:
+        Кортеж (конфигурация, статистика {links, unique, duplicates})
+    """
+    if template is not None:
+        config, position = _prepare_template(template, balancer_tag)
+        reserved = [outbound.get('tag') for outbound in config['outbounds'] if outbound.get('tag')]
+    else:
+        config, position = {'outbounds': []}, 0
+        reserved = []
+
+    if tag_prefix:
+        for tag in reserved:
+            if tag.startswith(tag_prefix):
+                raise ValueError(f"Префикс тегов '{tag_prefix}' совпадает с началом тега outbound шаблона "
+                                 f"'{tag}': балансировщик выбрал бы и его")
+
+    allocator = TagAllocator(reserved + [balancer_tag])
+    seen = set()
+    generated = []
+    total = 0
+
+    for vless_data in links:
+        total += 1
+        identity = link_identity(vless_data)
+        if identity in seen:
+            continue
+        seen.add(identity)
+
+        base = tag_prefix + (vless_data.get('fragment') or 'reverse-proxy')
+        tag = allocator.allocate(base)
+        # Без префикса селектор состоит из самих тегов
+        while not tag_prefix and any(other.startswith(tag) for other in reserved):
+            tag = allocator.allocate(base)
+        generated.append(create_xray_config(vless_data, tag))
+
+    tags = [outbound['tag'] for outbound in generated]
+    # Селектор Xray сравнивает теги по префиксу
+    selector = [tag_prefix] if tag_prefix else tags
+
+    config['outbounds'][position:position] = generated
+
+    routing = config.setdefault('routing', {})
+    routing.setdefault('balancers', []).append({
+        'tag': balancer_tag,
+        'selector': selector,
+        'strategy': {'type': strategy}
+    })
+    config['observatory'] = {
+        'subjectSelector': selector,
+        'probeURL': probe_url,
+        'probeInterval': probe_interval
+    }
+
+    stats = {
+        'links': total,
+        'unique': len(generated),
+        'duplicates': total - len(generated),
+    }
+    return config, stats
@@ -0,0 +1,321 @@
+"""
+Модуль метрик этапов конвертации
+
+Содержит счетчики вызовов, суммарное время и гистограммы задержек для
+основных функций конвейера (разбор, генерация, шаблоны, сериализация,
+запись файлов и JSONL).
+
+Пока метрики выключены, код пакета работает без изменений и без накладных
+расходов. enable() подменяет целевые функции обертками с замером времени
+во всех загруженных модулях пакета; модули, загруженные позже, получают
+обертки при импорте из модуля, где функция определена. disable() возвращает
+исходные функции во всех модулях пакета, в том числе загруженных после
+enable().
+В дочерних процессах (--jobs > 1) метрики не собираются.
+"""
+
+import sys
+import time
+import functools
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+PACKAGE = __name__.rpartition('.')[0]
+
+# Число интервалов гистограммы: интервал i содержит задержки [2^(i-1), 2^i) нс
+HISTOGRAM_BUCKETS = 64
+
+# Инструментируемые функции: (подмодуль, атрибут или Класс.метод)
+TARGETS = [
+    ('parser', 'parse_vless_url'),
+    ('parser', 'try_parse'),
+    ('generator', 'create_xray_config'),
+    ('templates', 'apply_template'),
+    ('templates', 'load_template'),
+    ('templates', 'TemplateRegistry.compiled'),
+    ('templates', 'CompiledTemplate.render'),
+    ('serialization', 'Serializer.dumps'),
+    ('utils', 'write_atomic'),
+    ('batch', 'write_jsonl'),
+]
+
+
+class Stage:
+    """Счетчики одного этапа"""
+
+    __slots__ = ('name', 'count', 'total_ns', 'max_ns', 'histogram', '_lock')
+
+    def __init__(self, name: str):
+        self.name = name
+        # Запись файлов выполняется в пуле потоков
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+
+    def record(self, elapsed_ns: int):
+        """
+        Учитывает один вызов
+
+        Args:
+            elapsed_ns: Длительность вызова в наносекундах
+        """
+        with self._lock:
+            self.count += 1
+            self.total_ns += elapsed_ns
+            if elapsed_ns > self.max_ns:
+                self.max_ns = elapsed_ns
+            self.histogram[min(elapsed_ns.bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+
+    def percentile(self, fraction: float) -> int:
+        """
+        Оценивает перцентиль по гистограмме
+
+        Внутри интервала гистограммы значение интерполируется линейно.
+
+        Args:
+            fraction: Доля от 0 до 1
+
+        Returns:
+            Оценка в наносекундах
+        """
+        if not self.count:
+            return 0
+        threshold = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            if count and seen + count >= threshold:
+                lower = (1 << bucket) >> 1
+                estimate = lower + (lower or 1) * (threshold - seen) / count
+                return min(int(estimate), self.max_ns)
+            seen += count
+        return self.max_ns
+
+    def to_dict(self) -> dict:
+        """
+        Возвращает счетчики в виде словаря
+
+        Returns:
+            Словарь со счетчиками, временем в микросекундах и гистограммой
+        """
+        return {
+            'count': self.count,
+            'total_ms': round(self.total_ns / 1e6, 3),
+            'mean_us': round(self.total_ns / self.count / 1e3, 3) if self.count else 0.0,
+            'p50_us': round(self.percentile(0.50) / 1e3, 3),
+            'p99_us': round(self.percentile(0.99) / 1e3, 3),
+            'max_us': round(self.max_ns / 1e3, 3),
+            # Ключ — верхняя граница интервала в наносекундах
+            'histogram_ns': {str(1 << bucket): count
+                             for bucket, count in enumerate(self.histogram) if count},
+        }
+
+
+_stages: Dict[str, Stage] = {}
+_hooks: List[Callable[[str, int], None]] = []
+_patches: List[Tuple[object, str, object]] = []
+# id обертки функции модуля -> (обертка, исходная функция)
+_wrappers: Dict[int, Tuple[Callable, Callable]] = {}
+
+
+def get_stage(name: str) -> Stage:
+    """
+    Возвращает счетчики этапа, создавая их при первом обращении
+
+    Args:
+        name: Имя этапа
+
+    Returns:
+        Экземпляр Stage
+    """
+    stage = _stages.get(name)
+    if stage is None:
+        stage = _stages[name] = Stage(name)
+    return stage
+
+
+def record(name: str, elapsed_ns: int):
+    """
+    Учитывает вызов этапа и передает его зарегистрированным обработчикам
+
+    Args:
+        name: Имя этапа
+        elapsed_ns: Длительность в наносекундах
+    """
+    get_stage(name).record(elapsed_ns)
+    for hook in _hooks:
+        hook(name, elapsed_ns)
+
+
+def add_hook(callback: Callable[[str, int], None]):
+    """
+    Регистрирует обработчик, вызываемый после каждого замера
+
+    Args:
+        callback: Функция (имя этапа, длительность в наносекундах)
+    """
+    _hooks.append(callback)
+
+
+def remove_hook(callback: Callable[[str, int], None]):
+    """
+    Удаляет обработчик замеров
+
+    Args:
+        callback: Ранее зарегистрированная функция
+    """
+    _hooks.remove(callback)
+
+
+def register_target(module_name: str, attribute: str):
+    """
+    Добавляет функцию пакета в список инструментируемых
+
+    Действует при следующем вызове enable().
+
+    Args:
+        module_name: Подмодуль пакета (например, 'merge')
+        attribute: Имя функции или "Класс.метод"
+    """
+    if (module_name, attribute) not in TARGETS:
+        TARGETS.append((module_name, attribute))
+
+
+def timed(name: str, func: Callable) -> Callable:
+    """
+    Оборачивает функцию замером времени
+
+    Args:
+        name: Имя этапа
+        func: Исходная функция
+
+    Returns:
+        Обертка, учитывающая каждый вызов
+    """
+    stage = get_stage(name)
+    clock = time.perf_counter_ns
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = clock() - start
+            stage.record(elapsed)
+            for hook in _hooks:
+                hook(name, elapsed)
+
+    return wrapper
+
+
+@contextmanager
+def measure(name: str):
+    """
+    Замеряет произвольный блок кода
+
+    Args:
+        name: Имя этапа
+    """
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter_ns() - start)
+
+
+def is_enabled() -> bool:
+    """Возвращает True, если функции пакета инструментированы"""
+    return bool(_patches)
+
+
+def enable():
+    """Подменяет целевые функции обертками с замером времени"""
+    if _patches:
+        return
+
+    for module_name, attribute in TARGETS:
+        module = __import__(f'{PACKAGE}.{module_name}', fromlist=('_',))
+        class_name, _, method_name = attribute.rpartition('.')
+
+        if class_name:
+            owner = getattr(module, class_name)
+            original = owner.__dict__[method_name]
+            _patches.append((owner, method_name, original))
+            setattr(owner, method_name, timed(attribute, original))
+            continue
+
+        original = getattr(module, attribute)
+        wrapper = timed(attribute, original)
+        _wrappers[id(wrapper)] = (wrapper, original)
+        # Функция могла быть импортирована в другие модули по имени
+        for namespace in _package_namespaces():
+            for key, value in list(namespace.items()):
+                if value is original:
+                    _patches.append((namespace, key, original))
+                    namespace[key] = wrapper
+
+
+def _package_namespaces():
+    """Пространства имен загруженных модулей пакета"""
+    for name, loaded in list(sys.modules.items()):
+        if loaded is not None and (name == PACKAGE or name.startswith(PACKAGE + '.')):
+            yield vars(loaded)
+
+
+def disable():
+    """Возвращает исходные функции"""
+    while _patches:
+        owner, name, original = _patches.pop()
+        if isinstance(owner, dict):
+            owner[name] = original
+        else:
+            setattr(owner, name, original)
+
+    if _wrappers:
+        # Модули, загруженные после enable(), импортировали обертки по имени
+        for namespace in _package_namespaces():
+            for key, value in list(namespace.items()):
+                entry = _wrappers.get(id(value))
+                if entry is not None and entry[0] is value:
+                    namespace[key] = entry[1]
+        _wrappers.clear()
+
+
+def reset():
+    """Сбрасывает накопленные счетчики"""
+    _stages.clear()
+
+
+def snapshot() -> dict:
+    """
+    Возвращает накопленные счетчики всех этапов
+
+    Returns:
+        Словарь {этап: счетчики} в порядке убывания суммарного времени
+    """
+    stages = sorted(_stages.values(), key=lambda stage: -stage.total_ns)
+    return {stage.name: stage.to_dict() for stage in stages if stage.count}
+
+
+def format_table(stages: Optional[dict] = None) -> str:
+    """
+    Форматирует счетчики в таблицу для вывода
+
+    Args:
+        stages: Результат snapshot() (по умолчанию текущие счетчики)
+
+    Returns:
+        Текстовая таблица
+    """
+    if stages is None:
+        stages = snapshot()
+    lines = [f"{'Этап':<28}{'вызовов':>10}{'всего, мс':>12}{'среднее, мкс':>14}"
+             f"{'p50, мкс':>11}{'p99, мкс':>11}"]
+    for name, stage in stages.items():
+        lines.append(f"{name:<28}{stage['count']:>10}{stage['total_ms']:>12.1f}{stage['mean_us']:>14.2f}"
+                     f"{stage['p50_us']:>11.2f}{stage['p99_us']:>11.2f}")
+    return '\n'.join(lines)
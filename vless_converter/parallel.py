@@ -0,0 +1,100 @@
+"""
+Модуль параллельной конвертации
+
+Содержит движок, распределяющий пакетную конвертацию по процессам.
+Входные ссылки делятся на чанки, чанки обрабатываются в пуле процессов,
+а результаты возвращаются строго в порядке входных строк.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple
+
+from .batch import ConversionResult, convert_links
+from .templates import CompiledTemplate, compile_template
+
+
+DEFAULT_CHUNK_SIZE = 256
+
+# Состояние рабочего процесса: шаблон и тег передаются один раз при запуске
+_worker_template = None
+_worker_tag = None
+
+
+def _init_worker(template: CompiledTemplate, tag: str):
+    """Инициализирует рабочий процесс общими параметрами конвертации"""
+    global _worker_template, _worker_tag
+    _worker_template = template
+    _worker_tag = tag
+
+
+def _convert_chunk(chunk: List[Tuple[int, str]]) -> List[ConversionResult]:
+    """Конвертирует один чанк ссылок внутри рабочего процесса"""
+    return list(convert_links(chunk, _worker_template, _worker_tag))
+
+
+def chunked(items: Iterable, size: int) -> Iterator[list]:
+    """
+    Разбивает поток на списки фиксированного размера
+
+    Args:
+        items: Исходный поток
+        size: Размер чанка
+
+    Yields:
+        Списки длиной не более size
+    """
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def convert_parallel(links: Iterable[Tuple[int, str]], template: dict = None,
+                     tag: str = None, jobs: int = None,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     max_pending: int = None) -> Iterator[ConversionResult]:
+    """
+    Конвертирует поток ссылок в пуле процессов
+
+    Одновременно в работе находится не более max_pending чанков: очередь
+    незавершенных задач служит буфером упорядочивания, а чтение входа
+    приостанавливается, пока голова очереди не будет выдана потребителю.
+    Поэтому память ограничена max_pending * chunk_size ссылками
+    независимо от размера входа.
+
+    Args:
+        links: Пары (номер строки, ссылка)
+        template: Шаблон конфигурации или скомпилированный шаблон (опционально)
+        tag: Тег для всех конфигураций (опционально)
+        jobs: Количество процессов (по умолчанию число CPU)
+        chunk_size: Количество ссылок в одной задаче
+        max_pending: Максимум чанков в работе (по умолчанию 2 * jobs)
+
+    Yields:
+        Результаты конвертации в порядке входных строк
+    """
+    jobs = jobs or os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = 2 * jobs
+    if chunk_size < 1 or max_pending < 1:
+        raise ValueError("Размер чанка и размер буфера должны быть положительными")
+
+    if template is not None and not isinstance(template, CompiledTemplate):
+        template = compile_template(template)
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(template, tag)) as pool:
+        pending = deque()
+        for chunk in chunked(links, chunk_size):
+            pending.append(pool.submit(_convert_chunk, chunk))
+            # Обратное давление: не читаем вход дальше, пока буфер полон
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+
+        while pending:
+            yield from pending.popleft().result()
@@ -4,75 +4,231 @@
 Содержит функции для разбора VLESS конфигураций.
 """
 
-import urllib.parse
-from urllib.parse import urlparse, parse_qs
+from collections import namedtuple
+
+
+# Коды ошибок разбора, возвращаемые try_parse
+ERR_EMPTY = 'empty'
+ERR_MISSING_AT = 'missing_at'
+ERR_BAD_HOST = 'bad_host'
+ERR_BAD_PORT = 'bad_port'
+
+ERROR_MESSAGES = {
+    ERR_EMPTY: "Пустой VLESS URL",
+    ERR_MISSING_AT: "Неверный формат VLESS URL: отсутствует @",
+    ERR_BAD_HOST: "Неверный адрес сервера",
+    ERR_BAD_PORT: "Неверный порт",
+}
+
+DEFAULT_PORT = 443
+
+
+_HEX_DIGITS = frozenset('0123456789abcdefABCDEF')
+
+
+class VlessLink(namedtuple('VlessLink', (
+        'uuid', 'host', 'port', 'security', 'network', 'sni', 'pbk', 'sid',
+        'fp', 'spx', 'flow', 'fragment', 'params'))):
+    """
+    Разобранная VLESS ссылка
+
+    Поля: uuid (str), host (str, IPv6 без скобок), port (int), security,
+    network, sni, pbk, sid, fp, spx, flow, fragment (str или None)
+    и params (dict всех параметров запроса).
+    """
+
+    __slots__ = ()
+
+    def to_dict(self) -> dict:
+        """
+        Преобразует ссылку в словарь формата parse_vless_url
+
+        Returns:
+            Словарь с ключами uuid, server, port, params, fragment
+        """
+        return {
+            'uuid': self.uuid,
+            'server': self.host,
+            'port': self.port,
+            'params': dict(self.params),
+            'fragment': self.fragment
+        }
+
+
+def _unquote(text: str, plus: bool = False) -> str:
+    """
+    Декодирует %XX последовательности как urllib.parse.unquote(_plus)
+
+    Некорректные последовательности остаются как есть, байты декодируются
+    как UTF-8 с заменой ошибочных символов.
+    """
+    if plus:
+        text = text.replace('+', ' ')
+    if '%' not in text:
+        return text
+
+    parts = text.split('%')
+    decoded = bytearray(parts[0].encode('utf-8'))
+    for part in parts[1:]:
+        if len(part) >= 2 and part[0] in _HEX_DIGITS and part[1] in _HEX_DIGITS:
+            decoded.append(int(part[:2], 16))
+            decoded += part[2:].encode('utf-8')
+        else:
+            decoded += b'%'
+            decoded += part.encode('utf-8')
+    return decoded.decode('utf-8', 'replace')
+
+
+def _parse_query(query_string: str) -> dict:
+    """
+    Разбирает строку запроса так же, как parse_qs, но без промежуточных списков
+
+    Пары без значения пропускаются, повторяющиеся ключи собираются в список.
+    """
+    params = {}
+    for pair in query_string.split('&'):
+        name, sep, value = pair.partition('=')
+        if not sep or not value:
+            continue
+        if '%' in name or '+' in name:
+            name = _unquote(name, plus=True)
+        if '%' in value or '+' in value:
+            value = _unquote(value, plus=True)
+
+        existing = params.get(name)
+        if existing is None:
+            params[name] = value
+        elif isinstance(existing, list):
+            existing.append(value)
+        else:
+            params[name] = [existing, value]
+    return params
+
+
+def _single(value):
+    """Возвращает одиночное значение параметра (первое, если ключ повторялся)"""
+    if isinstance(value, list):
+        return value[0]
+    return value
+
+
+def _parse(vless_url: str) -> tuple:
+    """Разбирает ссылку, возвращая (ссылка, код ошибки, подробности ошибки)"""
+    # Убираем префикс vless:// если есть
+    if vless_url.startswith('vless://'):
+        vless_url = vless_url[8:]
+    if not vless_url:
+        return None, ERR_EMPTY, None
+
+    # Разделяем на части: uuid@server:port?params#fragment
+    main_part, sep, fragment = vless_url.partition('#')
+    fragment = _unquote(fragment) if sep else None
+
+    connection_part, _, query_string = main_part.partition('?')
+
+    uuid, sep, server_part = connection_part.partition('@')
+    if not sep:
+        return None, ERR_MISSING_AT, None
+
+    # Извлекаем server и port, IPv6 адрес указывается в квадратных скобках
+    if server_part.startswith('['):
+        end = server_part.find(']')
+        if end == -1:
+            return None, ERR_BAD_HOST, server_part
+        server = server_part[1:end]
+        rest = server_part[end + 1:]
+        if not rest:
+            port_str = None
+        elif rest[0] == ':':
+            port_str = rest[1:]
+        else:
+            return None, ERR_BAD_HOST, server_part
+    else:
+        server, sep, port_str = server_part.partition(':')
+        if not sep:
+            port_str = None
+
+    if port_str is None:
+        port = DEFAULT_PORT
+    else:
+        # Пробелы вокруг номера допускаются, как int() в прежнем разборе;
+        # знак, "_" и не-ASCII цифры, которые int() тоже принимал, — нет
+        digits = port_str.strip()
+        if digits.isdigit() and digits.isascii():
+            port = int(digits)
+        else:
+            return None, ERR_BAD_PORT, port_str
+
+    params = _parse_query(query_string) if query_string else {}
+    get = params.get
+
+    link = VlessLink(
+        uuid=uuid,
+        host=server,
+        port=port,
+        security=_single(get('security')),
+        network=_single(get('type')),
+        sni=_single(get('sni')),
+        pbk=_single(get('pbk')),
+        sid=_single(get('sid')),
+        fp=_single(get('fp')),
+        spx=_single(get('spx')),
+        flow=_single(get('flow')),
+        fragment=fragment,
+        params=params
+    )
+    return link, None, None
+
+
+def try_parse(vless_url: str) -> tuple:
+    """
+    Разбирает VLESS URL без выбрасывания исключений
+
+    Args:
+        vless_url: Строка VLESS конфигурации
+
+    Returns:
+        Кортеж (VlessLink, None) при успехе или (None, код_ошибки)
+    """
+    link, error, _ = _parse(vless_url)
+    return link, error
+
+
+def parse_link(vless_url: str) -> VlessLink:
+    """
+    Разбирает VLESS URL в запись VlessLink
+
+    Args:
+        vless_url: Строка VLESS конфигурации
+
+    Returns:
+        Разобранная ссылка
+    """
+    link, error, detail = _parse(vless_url)
+    if error is not None:
+        message = ERROR_MESSAGES[error]
+        if detail is not None:
+            message = f"{message}: {detail}"
+        raise ValueError(f"Ошибка парсинга VLESS URL: {message}")
+    return link
 
 
 def parse_vless_url(vless_url: str) -> dict:
     """
     Парсит VLESS URL и извлекает все параметры
-    
+
     Args:
         vless_url: Строка VLESS конфигурации
-        
+
     Returns:
         Словарь с параметрами конфигурации
     """
-    try:
-        # Убираем префикс vless:// если есть
-        if vless_url.startswith('vless://'):
-            vless_url = vless_url[8:]
-        
-        # Разделяем на части: uuid@server:port?params#fragment
-        if '#' in vless_url:
-            main_part, fragment = vless_url.split('#', 1)
-            fragment = urllib.parse.unquote(fragment)
-        else:
-            main_part = vless_url
-            fragment = None
-        
-        # Разделяем на uuid@server:port и параметры
-        if '?' in main_part:
-            connection_part, query_string = main_part.split('?', 1)
-        else:
-            connection_part = main_part
-            query_string = ''
-        
-        # Извлекаем uuid, server и port
-        if '@' in connection_part:
-            uuid, server_part = connection_part.split('@', 1)
-        else:
-            raise ValueError("Неверный формат VLESS URL: отсутствует @")
-        
-        # Извлекаем server и port
-        if ':' in server_part:
-            server, port_str = server_part.split(':', 1)
-            try:
-                port = int(port_str)
-            except ValueError:
-                raise ValueError(f"Неверный порт: {port_str}")
-        else:
-            server = server_part
-            port = 443  # Порт по умолчанию
-        
-        # Парсим query параметры
-        params = parse_qs(query_string)
-        
-        # Преобразуем списки в одиночные значения где это уместно
-        parsed_params = {}
-        for key, value_list in params.items():
-            if len(value_list) == 1:
-                parsed_params[key] = value_list[0]
-            else:
-                parsed_params[key] = value_list
-        
-        return {
-            'uuid': uuid,
-            'server': server,
-            'port': port,
-            'params': parsed_params,
-            'fragment': fragment
-        }
-        
-    except Exception as e:
-        raise ValueError(f"Ошибка парсинга VLESS URL: {e}") 
\ No newline at end of file
+    link = parse_link(vless_url)
+    # Ссылка создана только для этого вызова, копировать params не нужно
+    return {
+        'uuid': link.uuid,
+        'server': link.host,
+        'port': link.port,
+        'params': link.params,
+        'fragment': link.fragment
+    }
@@ -0,0 +1,185 @@
+"""
+Модуль проверки доступности серверов
+
+Содержит асинхронную проверку TCP подключения к серверам ссылок перед
+генерацией конфигураций. Каждая пара (сервер, порт) проверяется один раз,
+сколько бы ссылок на нее ни указывало, число одновременных подключений
+ограничено, результаты DNS кэшируются по имени сервера.
+
+Ссылки на недоступные серверы отбрасываются, остальные упорядочиваются по
+времени подключения: в объединенной конфигурации и в JSONL первыми идут
+самые быстрые серверы.
+"""
+
+import time
+import socket
+import asyncio
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .parser import try_parse
+
+
+DEFAULT_TIMEOUT = 3.0
+DEFAULT_CONCURRENCY = 64
+
+
+class Prober:
+    """
+    Проверка TCP подключения к множеству серверов
+
+    Экземпляр хранит кэш DNS (в том числе неудачные разрешения), поэтому
+    повторная проверка тех же серверов не разрешает имена заново.
+    """
+
+    def __init__(self, timeout: float = None, concurrency: int = None):
+        """
+        Args:
+            timeout: Время на разрешение имени и подключение к одному
+                серверу в секундах (по умолчанию DEFAULT_TIMEOUT)
+            concurrency: Максимальное число одновременных проверок
+                (по умолчанию DEFAULT_CONCURRENCY)
+        """
+        timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+        concurrency = DEFAULT_CONCURRENCY if concurrency is None else concurrency
+        if timeout <= 0:
+            raise ValueError("Таймаут проверки должен быть положительным")
+        if concurrency < 1:
+            raise ValueError("Число одновременных проверок должно быть не меньше 1")
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.dns_lookups = 0
+        # Имя сервера -> кортеж адресов (пустой, если имя не разрешилось)
+        self._dns = {}
+        self._pending = {}
+
+    async def _lookup(self, host: str) -> tuple:
+        self.dns_lookups += 1
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await loop.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        except (OSError, UnicodeError):
+            addresses = ()
+        else:
+            addresses = tuple(dict.fromkeys(info[4][0] for info in infos))
+        self._dns[host] = addresses
+        return addresses
+
+    async def resolve(self, host: str) -> tuple:
+        """
+        Разрешает имя сервера с кэшированием
+
+        Одновременные запросы одного имени ожидают одно разрешение.
+
+        Args:
+            host: Имя или IP адрес сервера
+
+        Returns:
+            Кортеж адресов (пустой, если имя не разрешилось)
+        """
+        addresses = self._dns.get(host)
+        if addresses is not None:
+            return addresses
+        task = self._pending.get(host)
+        if task is None:
+            task = self._pending[host] = asyncio.ensure_future(self._lookup(host))
+        # Таймаут одной проверки не должен отменять общее разрешение
+        return await asyncio.shield(task)
+
+    async def _connect(self, host: str, port: int) -> Optional[float]:
+        # Парсер принимает любое число в порту, а connect() — только 0-65535
+        if not isinstance(port, int) or not 0 < port <= 65535:
+            return None
+        loop = asyncio.get_running_loop()
+        for address in await self.resolve(host):
+            start = time.perf_counter()
+            try:
+                transport, _ = await loop.create_connection(asyncio.Protocol, address, port)
+            except (OSError, OverflowError, ValueError):
+                continue
+            latency = time.perf_counter() - start
+            transport.close()
+            return latency
+        return None
+
+    async def _probe(self, semaphore: asyncio.Semaphore, host: str, port: int) -> Optional[float]:
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(self._connect(host, port), self.timeout)
+            except asyncio.TimeoutError:
+                return None
+
+    async def probe(self, endpoints: Iterable[Tuple[str, int]]) -> Dict[Tuple[str, int], Optional[float]]:
+        """
+        Проверяет подключение к серверам
+
+        Args:
+            endpoints: Пары (сервер, порт); повторы проверяются один раз
+
+        Returns:
+            Словарь (сервер, порт) -> время подключения в секундах или None,
+            если сервер недоступен
+        """
+        endpoints = list(dict.fromkeys(endpoints))
+        # Задачи разрешения имен привязаны к циклу событий текущего запуска
+        self._pending = {}
+        semaphore = asyncio.Semaphore(self.concurrency)
+        latencies = await asyncio.gather(*(self._probe(semaphore, host, port) for host, port in endpoints))
+        return dict(zip(endpoints, latencies))
+
+    def run(self, endpoints: Iterable[Tuple[str, int]]) -> Dict[Tuple[str, int], Optional[float]]:
+        """
+        Синхронная обертка над probe() для кода без цикла событий
+
+        Args:
+            endpoints: Пары (сервер, порт)
+
+        Returns:
+            Словарь (сервер, порт) -> время подключения в секундах или None
+        """
+        return asyncio.run(self.probe(endpoints))
+
+
+def probe_links(links: Iterable[Tuple[int, str]], prober: Prober = None) -> Tuple[List[Tuple[int, str]], dict]:
+    """
+    Проверяет серверы ссылок и оставляет доступные, от быстрых к медленным
+
+    Поток ссылок читается целиком: порядок известен только после проверки
+    всех серверов. Ссылки, которые не удалось разобрать, идут в конце,
+    чтобы ошибка разбора попала в обычный отчет конвертации.
+
+    Args:
+        links: Пары (номер строки, ссылка)
+        prober: Экземпляр Prober (по умолчанию с параметрами по умолчанию)
+
+    Returns:
+        Кортеж (пары (номер строки, ссылка) в порядке ранга, статистика
+        {servers, reachable, dropped})
+    """
+    if prober is None:
+        prober = Prober()
+
+    parsed = []
+    unparsed = []
+    for line_no, url in links:
+        link, code = try_parse(url)
+        if code is None:
+            parsed.append(((link.host, link.port), line_no, url))
+        else:
+            unparsed.append((line_no, url))
+
+    latencies = prober.run(endpoint for endpoint, _, _ in parsed)
+    ranked = []
+    for endpoint, line_no, url in parsed:
+        latency = latencies[endpoint]
+        if latency is not None:
+            ranked.append((latency, line_no, url))
+    # Сортировка устойчива: при равном времени сохраняется исходный порядок
+    ranked.sort(key=itemgetter(0))
+
+    stats = {
+        'servers': len(latencies),
+        'reachable': sum(1 for latency in latencies.values() if latency is not None),
+        'dropped': len(parsed) - len(ranked),
+    }
+    return [(line_no, url) for _, line_no, url in ranked] + unparsed, stats
@@ -0,0 +1,275 @@
+"""
+Модуль компиляции правил маршрутизации
+
+Содержит уменьшение routing.rules конфигурации Xray без изменения
+маршрутизации:
+
+- повторяющиеся значения в списках правила удаляются;
+- правило, отличающееся от одного из предыдущих только списком domain
+  или ip, объединяется с ним, если между ними нет правил с другим
+  outboundTag/balancerTag (правила проверяются по порядку, поэтому перенос
+  выше через правила с тем же назначением не меняет результат). Пустой
+  список в Xray означает отсутствие условия, то есть любое значение:
+  правило, покрытое таким предыдущим, удаляется, а пустой список
+  последующего правила делает пустым список предыдущего;
+- записи "domain:" и "full:", покрытые записью "domain:" родительского
+  домена, удаляются (обратное дерево меток);
+- IP подсети объединяются через ipaddress.collapse_addresses.
+
+Записи, которые нельзя сравнить статически (keyword:, regexp:, geosite:,
+geoip:, ext:, строки без префикса, плейсхолдеры), сохраняются как есть.
+"""
+
+import json
+import ipaddress
+from typing import List, Tuple
+
+
+# Списки правила, объединяемые при слиянии правил (условие "любое из")
+UNION_FIELDS = ('domain', 'ip')
+
+# Поля назначения правила
+TARGET_FIELDS = ('outboundTag', 'balancerTag')
+
+# Признак записи "domain:" в узле дерева меток
+_SUFFIX = ''
+
+
+def _domain_entry(entry: str) -> Tuple[str, List[str]]:
+    """Возвращает (тип, метки от зоны к поддомену) для domain:/full: записей"""
+    kind, sep, value = entry.partition(':')
+    if not sep or kind not in ('domain', 'full') or not value or '{{' in value:
+        return '', []
+    labels = value.split('.')
+    if '' in labels:
+        return '', []
+    labels.reverse()
+    return kind, labels
+
+
+def collapse_domains(entries: list) -> list:
+    """
+    Удаляет повторы и записи, покрытые записью "domain:" родительского домена
+
+    "domain:example.com" покрывает "domain:a.example.com" и
+    "full:a.example.com", а также "full:example.com". Порядок оставшихся
+    записей сохраняется.
+
+    Args:
+        entries: Значения поля domain правила
+
+    Returns:
+        Новый список значений
+    """
+    unique = _unique(entries)
+    trie = {}
+    parsed = []
+    for entry in unique:
+        kind, labels = _domain_entry(entry) if isinstance(entry, str) else ('', [])
+        parsed.append((entry, kind, labels))
+        if kind == 'domain':
+            node = trie
+            for label in labels:
+                node = node.setdefault(label, {})
+            node[_SUFFIX] = True
+
+    result = []
+    for entry, kind, labels in parsed:
+        if kind:
+            node = trie
+            # Для domain: сама запись не считается покрывающей
+            last = len(labels) - 1 if kind == 'domain' else len(labels)
+            covered = False
+            for depth, label in enumerate(labels):
+                node = node.get(label)
+                if node is None:
+                    break
+                if _SUFFIX in node and depth < last:
+                    covered = True
+                    break
+            if covered:
+                continue
+        result.append(entry)
+    return result
+
+
+def collapse_ips(entries: list) -> list:
+    """
+    Удаляет повторы и объединяет пересекающиеся и соседние IP подсети
+
+    Args:
+        entries: Значения поля ip правила
+
+    Returns:
+        Новый список: сначала записи, которые не являются адресом или
+        подсетью (geoip:, ext:), в исходном порядке, затем подсети IPv4 и IPv6
+    """
+    other = []
+    networks = {4: [], 6: []}
+    for entry in _unique(entries):
+        try:
+            if not isinstance(entry, str):
+                raise TypeError(entry)
+            network = ipaddress.ip_network(entry, strict=False)
+        except (TypeError, ValueError):
+            other.append(entry)
+            continue
+        networks[network.version].append(network)
+
+    result = other
+    for version in (4, 6):
+        for network in ipaddress.collapse_addresses(networks[version]):
+            if network.prefixlen == network.max_prefixlen:
+                result.append(str(network.network_address))
+            else:
+                result.append(str(network))
+    return result
+
+
+def _unique(values: list) -> list:
+    """Копия списка без повторов строковых значений"""
+    if all(isinstance(value, str) for value in values):
+        return list(dict.fromkeys(values))
+    return list(values)
+
+
+def _signature(value):
+    """Представление значения поля для сравнения правил (списки — как множества)"""
+    if isinstance(value, list):
+        return frozenset(item if isinstance(item, str) else json.dumps(item, sort_keys=True)
+                         for item in value)
+    return json.dumps(value, sort_keys=True)
+
+
+def _shapes(rule: dict) -> list:
+    """
+    Ключи, по которым правило находит предыдущее для слияния
+
+    Для каждого списка из UNION_FIELDS — (поле, остальные поля правила);
+    правило без таких списков — (None, все поля), то есть полный дубликат.
+    """
+    fields = {key: _signature(value) for key, value in rule.items()}
+    shapes = []
+    for name in UNION_FIELDS:
+        if isinstance(rule.get(name), list):
+            rest = frozenset(item for item in fields.items() if item[0] != name)
+            shapes.append((name, rest))
+    if not shapes:
+        shapes.append((None, frozenset(fields.items())))
+    return shapes
+
+
+def compile_rules(rules: list) -> list:
+    """
+    Уменьшает список правил маршрутизации без изменения маршрутизации
+
+    Args:
+        rules: Значение routing.rules
+
+    Returns:
+        Новый список правил (исходные правила не изменяются)
+    """
+    compiled = []
+    # Ключ слияния -> правило среди последних правил с одинаковым назначением
+    run = {}
+    run_target = None
+    # Правило -> его ключи в run (слитое правило теряет устаревшие ключи)
+    registered = {}
+
+    for rule in rules:
+        if not isinstance(rule, dict):
+            compiled.append(rule)
+            run, run_target = {}, None
+            continue
+
+        rule = {key: _unique(value) if isinstance(value, list) else value
+                for key, value in rule.items()}
+        target = tuple(_signature(rule.get(name)) for name in TARGET_FIELDS)
+        if target != run_target:
+            run, run_target, registered = {}, target, {}
+
+        shapes = _shapes(rule)
+        merged = False
+        for shape in shapes:
+            previous = run.get(shape)
+            if previous is None:
+                continue
+            name = shape[0]
+            # Пустой список предыдущего правила уже совпадает с любым значением
+            if name is not None and previous[name]:
+                if rule[name]:
+                    previous[name].extend(rule[name])
+                else:
+                    previous[name] = []
+                # Другие ключи предыдущего правила включали измененный список
+                kept = []
+                for key in registered[id(previous)]:
+                    if key[0] == name:
+                        kept.append(key)
+                    else:
+                        run.pop(key, None)
+                registered[id(previous)] = kept
+            merged = True
+            break
+
+        if merged:
+            continue
+        compiled.append(rule)
+        registered[id(rule)] = shapes
+        for shape in shapes:
+            run[shape] = rule
+
+    for rule in compiled:
+        if not isinstance(rule, dict):
+            continue
+        if isinstance(rule.get('domain'), list):
+            rule['domain'] = collapse_domains(rule['domain'])
+        if isinstance(rule.get('ip'), list):
+            rule['ip'] = collapse_ips(rule['ip'])
+    return compiled
+
+
+def _count(rules: list, field: str) -> int:
+    return sum(len(rule[field]) for rule in rules
+               if isinstance(rule, dict) and isinstance(rule.get(field), list))
+
+
+def compile_routing(config: dict) -> dict:
+    """
+    Компилирует routing.rules конфигурации на месте
+
+    Args:
+        config: Конфигурация Xray или шаблон (после apply_template или до него:
+            плейсхолдеры не изменяются)
+
+    Returns:
+        Статистика {rules, domains, ips}: пары (до, после)
+    """
+    routing = config.get('routing')
+    rules = routing.get('rules') if isinstance(routing, dict) else None
+    if not isinstance(rules, list):
+        return {'rules': (0, 0), 'domains': (0, 0), 'ips': (0, 0)}
+
+    compiled = compile_rules(rules)
+    stats = {
+        'rules': (len(rules), len(compiled)),
+        'domains': (_count(rules, 'domain'), _count(compiled, 'domain')),
+        'ips': (_count(rules, 'ip'), _count(compiled, 'ip')),
+    }
+    routing['rules'] = compiled
+    return stats
+
+
+def format_stats(stats: dict) -> str:
+    """
+    Форматирует статистику compile_routing
+
+    Args:
+        stats: Результат compile_routing
+
+    Returns:
+        Строка для вывода в stderr
+    """
+    return (f"Маршрутизация: правил {stats['rules'][0]} -> {stats['rules'][1]}, "
+            f"доменов {stats['domains'][0]} -> {stats['domains'][1]}, "
+            f"IP {stats['ips'][0]} -> {stats['ips'][1]}")
@@ -0,0 +1,333 @@
+"""
+Модуль поиска ссылок в больших дампах
+
+Содержит сканер, который отображает файл в память (mmap), находит
+вхождения vless:// побайтовым поиском и декодирует только найденные
+ссылки, без чтения файла построчно. Блоки base64 (подписки) находятся по
+закодированному фрагменту "vless://" и декодируются по частям
+ограниченного размера.
+
+Файл делится на блоки; для каждого блока запоминаются границы и хеш
+содержимого, а при записи индекса — и найденные ссылки. При повторном сканировании с индексом блоки с тем же
+хешем не просматриваются, их ссылки берутся из индекса, поэтому, например,
+дописанный в конец дамп просматривается только в новой части, а результат
+содержит все ссылки дампа.
+"""
+
+import re
+import sys
+import json
+import mmap
+import base64
+import binascii
+import hashlib
+from operator import itemgetter
+from typing import Iterator, List, Optional, TextIO, Tuple
+
+from .utils import write_atomic
+
+
+PREFIX = b'vless://'
+
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+DEFAULT_CHUNK_SIZE = 64 * 1024
+MAX_LINK_LENGTH = 8192
+INDEX_VERSION = 2
+
+# Ссылка заканчивается пробельным символом, кавычкой или угловой скобкой (HTML).
+# Быстрый поиск идет по непробельным символам, затем совпадение обрезается
+# по _LINK_STOP; _LINK_STRICT ищет следующие ссылки в отрезанной части
+_LINK = re.compile(rb'vless://\S{1,%d}' % (MAX_LINK_LENGTH - len(PREFIX)))
+_LINK_STRICT = re.compile(rb'vless://[^\s"\'<>`]{1,%d}' % (MAX_LINK_LENGTH - len(PREFIX)))
+_STOP_BYTES = b'"\'<>`'
+_LINK_STOP = re.compile(rb'["\'<>`]')
+
+# Блок base64: строки не короче _RUN_MIN_LENGTH символов алфавита (в том
+# числе url-safe), разделенные одиночными переносами (MIME), затем
+# необязательная короткая последняя строка и выравнивание "="
+_RUN_MIN_LENGTH = 32
+_BASE64_RUN = re.compile(
+    rb'[A-Za-z0-9+/_-]{%d,}(?:\r?\n[A-Za-z0-9+/_-]{%d,})*'
+    rb'(?:\r?\n[A-Za-z0-9+/_-]{1,%d}(?=={0,2}(?:[\r\n]|\Z)))?={0,2}'
+    % (_RUN_MIN_LENGTH, _RUN_MIN_LENGTH, _RUN_MIN_LENGTH - 1)
+)
+
+# Байт, который не может входить в блок base64, или пустая строка
+_RUN_BREAK = re.compile(rb'[^A-Za-z0-9+/_=\r\n-]|\n\r?\n')
+
+# Последняя такая граница перед позицией (жадный .* ищет с конца)
+_RUN_START = re.compile(rb'.*(?:[^A-Za-z0-9+/_=\r\n-]|\n\r?\n)', re.DOTALL)
+
+# Фрагменты base64 от "vless://" при трех возможных выравниваниях
+_BASE64_NEEDLES = (b'dmxlc3M6Ly', b'ZsZXNzOi8v', b'2bGVzczovL')
+
+_URLSAFE = bytes.maketrans(b'-_', b'+/')
+
+
+def _decode_link(raw) -> str:
+    """Декодирует ссылку из байтов; &amp; из HTML заменяется на &"""
+    text = str(raw, 'utf-8', 'replace')
+    if '&amp;' in text:
+        text = text.replace('&amp;', '&')
+    return text
+
+
+def decode_base64_links(view, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Декодирует блок base64 по частям и извлекает из него VLESS ссылки
+
+    В памяти одновременно находится не больше одной части блока
+    и незавершенная строка с ее конца.
+
+    Args:
+        view: Байты или memoryview блока base64
+        chunk_size: Размер части в символах base64
+
+    Yields:
+        Найденные ссылки
+    """
+    pending = b''
+    tail = b''
+    total = len(view)
+    for start in range(0, total, chunk_size):
+        chunk = bytes(view[start:start + chunk_size]).translate(_URLSAFE, b'\r\n')
+        chunk = pending + chunk
+        last = start + chunk_size >= total
+        if last:
+            chunk = chunk.rstrip(b'=')
+            chunk += b'=' * (-len(chunk) % 4)
+            pending = b''
+        else:
+            cut = len(chunk) - len(chunk) % 4
+            chunk, pending = chunk[:cut], chunk[cut:]
+
+        try:
+            decoded = base64.b64decode(chunk)
+        except (binascii.Error, ValueError):
+            return
+
+        data = tail + decoded
+        if last:
+            complete, tail = data, b''
+        else:
+            # Ссылка могла не закончиться в этой части
+            cut = max(data.rfind(b'\n'), data.rfind(b' '))
+            if cut == -1:
+                complete, tail = b'', data[-MAX_LINK_LENGTH:]
+            else:
+                complete, tail = data[:cut], data[cut:]
+
+        for match in _LINK_STRICT.finditer(complete):
+            yield _decode_link(match.group())
+
+
+def _block_limit(buf, nominal: int, size: int) -> int:
+    """Сдвигает границу блока за ближайший байт, который не входит в блок base64"""
+    if nominal >= size:
+        return size
+    match = _RUN_BREAK.search(buf, nominal)
+    return match.end() if match else size
+
+
+def _find_run(buf, start: int, end: int):
+    """
+    Находит следующий блок base64 с VLESS ссылками в [start, end)
+
+    Блок ищется не регулярным выражением по всему тексту, а по закодированному
+    фрагменту "vless://" с последующим поиском начала блока.
+    """
+    while True:
+        found = [at for at in (buf.find(needle, start, end) for needle in _BASE64_NEEDLES)
+                 if at != -1]
+        if not found:
+            return None
+        at = min(found)
+        boundary = _RUN_START.match(buf, start, at)
+        run = _BASE64_RUN.search(buf, boundary.end() if boundary else start, end)
+        if run is not None and run.start() <= at < run.end():
+            return run
+        start = at + 1
+
+
+def _scan_block(buf, view, begin: int, limit: int,
+                chunk_size: int) -> Tuple[List[Tuple[int, str]], int]:
+    """
+    Находит ссылки, начинающиеся в [begin, limit)
+
+    Ссылка, начавшаяся до limit, обрабатывается целиком, поэтому
+    фактический конец блока может быть больше limit. Блоки base64 границу
+    не пересекают (см. _block_limit).
+
+    Returns:
+        Кортеж (список (смещение, ссылка) по возрастанию смещения, конец блока)
+    """
+    end = limit
+    links = []
+    stop_search = _LINK_STOP.search
+    for match in _LINK.finditer(buf, begin, limit + MAX_LINK_LENGTH):
+        start = match.start()
+        if start >= limit:
+            break
+        raw = match.group()
+        end = match.end()
+        # translate без таблицы только удаляет байты: дешевая проверка без regex
+        if len(raw.translate(None, _STOP_BYTES)) == len(raw):
+            links.append((start, _decode_link(raw)))
+            continue
+        stop = stop_search(raw)
+        # Например, href="vless://..." или ["vless://a","vless://b"]
+        if stop.start() > len(PREFIX):
+            links.append((start, _decode_link(raw[:stop.start()])))
+        for extra in _LINK_STRICT.finditer(raw, stop.start()):
+            links.append((start + extra.start(), _decode_link(extra.group())))
+    end = max(end, limit)
+
+    decoded = []
+    pos = begin
+    while True:
+        run = _find_run(buf, pos, limit)
+        if run is None:
+            break
+        run_start, pos = run.span()
+        # "...abcvless://": буквы префикса относятся к ссылке, а не к base64
+        if buf[pos - len(PREFIX) + 3:pos + 3] == PREFIX:
+            pos -= len(PREFIX) - 3
+        decoded.extend([(run_start, link) for link in
+                        decode_base64_links(view[run_start:pos], chunk_size)])
+
+    if decoded:
+        links.extend(decoded)
+        links.sort(key=itemgetter(0))
+    return links, end
+
+
+class LinkScanner:
+    """
+    Сканер VLESS ссылок в файле произвольного содержимого
+
+    После scan() атрибут index содержит индекс блоков для следующего
+    запуска, а blocks_scanned и blocks_skipped — статистику. Ссылки блоков
+    хранятся в индексе только при scan(keep_links=True), иначе найденные
+    ссылки не задерживаются в памяти после выдачи.
+    """
+
+    def __init__(self, path: str, block_size: int = DEFAULT_BLOCK_SIZE,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        Args:
+            path: Путь к файлу
+            block_size: Номинальный размер блока индекса в байтах
+            chunk_size: Размер части при декодировании base64
+        """
+        self.path = path
+        self.block_size = block_size
+        self.chunk_size = chunk_size
+        self.index = None
+        self.blocks_scanned = 0
+        self.blocks_skipped = 0
+
+    def _known_blocks(self, index: Optional[dict]) -> dict:
+        """Возвращает блоки из предыдущего индекса по смещению начала"""
+        if not index or index.get('version') != INDEX_VERSION or index.get('block_size') != self.block_size:
+            return {}
+        return {block['begin']: block for block in index.get('blocks', ()) if 'links' in block}
+
+    def scan(self, index: dict = None, keep_links: bool = False) -> Iterator[Tuple[int, str]]:
+        """
+        Сканирует файл
+
+        Args:
+            index: Индекс предыдущего запуска; блоки с тем же содержимым
+                не просматриваются, их ссылки берутся из индекса
+            keep_links: Сохранять ссылки блоков в self.index (нужно, только
+                если индекс будет записан для следующего запуска)
+
+        Yields:
+            Пары (смещение в файле, ссылка). Для ссылок из base64 смещение
+            указывает на начало блока base64
+        """
+        known = self._known_blocks(index)
+        blocks = []
+        self.blocks_scanned = 0
+        self.blocks_skipped = 0
+        self.index = {'version': INDEX_VERSION, 'block_size': self.block_size, 'blocks': blocks}
+
+        with open(self.path, 'rb') as f:
+            size = f.seek(0, 2)
+            if size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                view = memoryview(buf)
+                try:
+                    begin = 0
+                    while begin < size:
+                        block = known.get(begin)
+                        if block is not None and block['end'] <= size:
+                            digest = hashlib.blake2b(view[begin:block['end']], digest_size=16).hexdigest()
+                            if digest == block['hash']:
+                                blocks.append(block if keep_links else
+                                              {'begin': begin, 'end': block['end'], 'hash': digest})
+                                self.blocks_skipped += 1
+                                begin = block['end']
+                                yield from map(tuple, block['links'])
+                                continue
+
+                        limit = _block_limit(buf, begin + self.block_size, size)
+                        links, end = _scan_block(buf, view, begin, limit, self.chunk_size)
+                        digest = hashlib.blake2b(view[begin:end], digest_size=16).hexdigest()
+                        entry = {'begin': begin, 'end': end, 'hash': digest}
+                        if keep_links:
+                            entry['links'] = links
+                        blocks.append(entry)
+                        self.blocks_scanned += 1
+                        begin = end
+                        yield from links
+                finally:
+                    view.release()
+
+
+def load_index(path: str) -> Optional[dict]:
+    """
+    Загружает индекс блоков
+
+    Args:
+        path: Путь к файлу индекса
+
+    Returns:
+        Индекс или None, если файла нет или он поврежден (тогда файл
+        сканируется целиком)
+    """
+    try:
+        with open(path, 'rb') as f:
+            index = json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+    return index if isinstance(index, dict) else None
+
+
+def scan_file(path: str, index_path: str = None, block_size: int = DEFAULT_BLOCK_SIZE,
+              err: TextIO = None) -> Iterator[Tuple[int, str]]:
+    """
+    Сканирует файл и сохраняет индекс блоков после полного прохода
+
+    Args:
+        path: Путь к дампу
+        index_path: Файл индекса (опционально); если он есть, ссылки
+            неизмененных блоков берутся из него без повторного поиска
+        block_size: Номинальный размер блока индекса в байтах
+        err: Поток для статистики (по умолчанию stderr)
+
+    Yields:
+        Пары (смещение в файле, ссылка)
+    """
+    if err is None:
+        err = sys.stderr
+
+    index = load_index(index_path) if index_path else None
+    scanner = LinkScanner(path, block_size)
+    yield from scanner.scan(index, keep_links=bool(index_path))
+
+    print(f"Сканирование: блоков просмотрено {scanner.blocks_scanned}, "
+          f"пропущено без изменений {scanner.blocks_skipped}", file=err)
+    if index_path:
+        write_atomic(index_path, json.dumps(scanner.index, separators=(',', ':')).encode('utf-8'))
@@ -0,0 +1,171 @@
+"""
+Модуль сериализации JSON
+
+Содержит единый сериализатор конфигураций: данные кодируются в байты
+один раз и записываются во все приемники. Если установлен orjson,
+он используется автоматически, иначе применяется стандартный json.
+"""
+
+PRETTY = 'pretty'
+COMPACT = 'compact'
+CANONICAL = 'canonical'
+
+MODES = (PRETTY, COMPACT, CANONICAL)
+
+BACKEND_ORJSON = 'orjson'
+BACKEND_JSON = 'json'
+
+
+def _detect_backend() -> str:
+    try:
+        import orjson  # noqa: F401
+    except ImportError:
+        return BACKEND_JSON
+    return BACKEND_ORJSON
+
+
+class Serializer:
+    """
+    Сериализатор JSON с выбором формата и реализации
+
+    Форматы:
+        pretty     отступ в 2 пробела
+        compact    без пробелов, одна строка (подходит для JSONL)
+        canonical  как compact, но с сортировкой ключей (стабильные хеши)
+    """
+
+    __slots__ = ('mode', 'backend', '_dumps', '_loads')
+
+    def __init__(self, mode: str = PRETTY, backend: str = None):
+        """
+        Args:
+            mode: Формат вывода (pretty, compact или canonical)
+            backend: Реализация (orjson или json), по умолчанию — orjson, если установлен
+        """
+        if mode not in MODES:
+            raise ValueError(f"Неизвестный формат JSON '{mode}'. Доступные: {', '.join(MODES)}")
+
+        self.mode = mode
+        self.backend = backend or _detect_backend()
+        if self.backend not in (BACKEND_ORJSON, BACKEND_JSON):
+            raise ValueError(f"Неизвестная реализация JSON '{backend}'")
+
+        import json
+        kwargs = {
+            PRETTY: {'indent': 2},
+            COMPACT: {'separators': (',', ':')},
+            CANONICAL: {'separators': (',', ':'), 'sort_keys': True},
+        }[mode]
+        encoder = json.JSONEncoder(ensure_ascii=False, **kwargs)
+        json_dumps = lambda obj: encoder.encode(obj).encode('utf-8')
+
+        if self.backend == BACKEND_ORJSON:
+            import orjson
+            option = {
+                PRETTY: orjson.OPT_INDENT_2,
+                COMPACT: 0,
+                CANONICAL: orjson.OPT_SORT_KEYS,
+            }[mode]
+            orjson_dumps = orjson.dumps
+
+            def dumps(obj):
+                try:
+                    return orjson_dumps(obj, option=option)
+                except TypeError:
+                    # orjson не кодирует целые вне 64 бит (например, порт из
+                    # ссылки с лишними цифрами); json кодирует их так же
+                    return json_dumps(obj)
+
+            self._dumps = dumps
+            self._loads = orjson.loads
+        else:
+            self._dumps = json_dumps
+            self._loads = json.loads
+
+    def dumps(self, obj) -> bytes:
+        """
+        Кодирует объект в JSON
+
+        Args:
+            obj: Объект для сериализации
+
+        Returns:
+            JSON в кодировке UTF-8
+        """
+        return self._dumps(obj)
+
+    def loads(self, data):
+        """
+        Декодирует JSON
+
+        Args:
+            data: JSON строка или байты
+
+        Returns:
+            Декодированный объект
+        """
+        return self._loads(data)
+
+    def write(self, obj, *sinks) -> bytes:
+        """
+        Кодирует объект один раз и записывает результат во все приемники
+
+        Args:
+            obj: Объект для сериализации
+            *sinks: Бинарные потоки для записи
+
+        Returns:
+            Закодированные данные
+        """
+        data = self._dumps(obj)
+        for sink in sinks:
+            sink.write(data)
+        return data
+
+    def write_lines(self, objects, sink) -> int:
+        """
+        Записывает объекты в формате JSONL прямо в поток, без общего буфера
+
+        Args:
+            objects: Итерируемые объекты
+            sink: Бинарный поток для записи
+
+        Returns:
+            Количество записанных строк
+        """
+        dumps = self._dumps
+        write = sink.write
+        count = 0
+        for obj in objects:
+            write(dumps(obj))
+            write(b'\n')
+            count += 1
+        return count
+
+
+_serializers = {}
+
+
+def get_serializer(mode: str = PRETTY, backend: str = None) -> Serializer:
+    """
+    Возвращает общий сериализатор для формата
+
+    Args:
+        mode: Формат вывода
+        backend: Реализация (по умолчанию — orjson, если установлен)
+
+    Returns:
+        Экземпляр Serializer
+    """
+    key = (mode, backend)
+    serializer = _serializers.get(key)
+    if serializer is None:
+        serializer = _serializers[key] = Serializer(mode, backend)
+    return serializer
+
+
+def binary_stdout():
+    """Возвращает бинарный поток стандартного вывода"""
+    import sys
+    sys.stdout.flush()
+    return getattr(sys.stdout, 'buffer', sys.stdout)
@@ -0,0 +1,477 @@
+"""
+Модуль HTTP сервиса конвертации
+
+Содержит долгоживущий HTTP/1.1 сервер на asyncio с поддержкой keep-alive.
+Шаблоны загружаются и компилируются один раз при запуске, пакетная
+конвертация выполняется в пуле процессов.
+
+Маршруты:
+    POST /convert?template=NAME&tag=TAG   тело — одна ссылка, ответ — JSON
+    POST /convert/batch?template=NAME     тело — JSONL или ссылки по строкам,
+                                          ответ — потоковый JSONL
+    GET  /templates                        список шаблонов
+"""
+
+import json
+import asyncio
+import hashlib
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import AsyncIterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from .batch import convert_links
+from .templates import CompiledTemplate, get_registry
+from .serialization import get_serializer, COMPACT
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+BATCH_CHUNK_SIZE = 256
+MAX_HEADER_LINE = 8192
+MAX_HEADERS = 100
+MAX_SINGLE_BODY = 64 * 1024
+
+_REASONS = {
+    200: 'OK',
+    304: 'Not Modified',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    411: 'Length Required',
+    413: 'Payload Too Large',
+    414: 'URI Too Long',
+    431: 'Request Header Fields Too Large',
+    500: 'Internal Server Error',
+}
+
+
+class HTTPError(Exception):
+    """Ошибка обработки запроса с HTTP кодом ответа"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _preload_templates():
+    """Загружает и компилирует все шаблоны в текущем процессе"""
+    registry = get_registry()
+    for name in registry.index:
+        try:
+            registry.compiled(name)
+        except ValueError:
+            # Ошибочный шаблон будет сообщен при обращении к нему
+            pass
+
+
+def _convert_batch_chunk(items: List[Tuple[int, str, Optional[str]]],
+                         template_name: Optional[str]) -> List[bytes]:
+    """
+    Конвертирует чанк пакетного запроса в рабочем процессе
+
+    Args:
+        items: Тройки (номер строки, ссылка, тег); ссылка и тег из JSON
+            записи проверяются здесь и могут быть не строками
+        template_name: Имя шаблона (опционально)
+
+    Returns:
+        Закодированные строки JSONL ответа
+    """
+    template = get_registry().compiled(template_name) if template_name else None
+    dumps = get_serializer(COMPACT).dumps
+    lines = []
+    for line_no, link, tag in items:
+        if not isinstance(link, str):
+            lines.append(dumps({'line': line_no, 'error': 'Ссылка должна быть строкой'}) + b'\n')
+            continue
+        if tag is not None and not isinstance(tag, str):
+            lines.append(dumps({'line': line_no, 'error': 'Тег должен быть строкой'}) + b'\n')
+            continue
+        for result in convert_links(((line_no, link),), template, tag):
+            if result.error is not None:
+                record = {'line': line_no, 'error': result.error}
+            else:
+                record = {'line': line_no, 'config': result.config}
+            lines.append(dumps(record) + b'\n')
+    return lines
+
+
+def etag_for(body: bytes) -> str:
+    """
+    Вычисляет ETag по содержимому ответа
+
+    Args:
+        body: Тело ответа
+
+    Returns:
+        Строка ETag в кавычках
+    """
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+class ConversionServer:
+    """
+    HTTP сервер конвертации с прогретыми кэшами шаблонов
+
+    Сервер можно запустить на порту 0 и узнать фактический порт через
+    атрибут port после start(), что удобно для проверок на localhost.
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 jobs: int = None, executor: Executor = None):
+        """
+        Args:
+            host: Адрес для прослушивания
+            port: Порт (0 — выбрать свободный)
+            jobs: Количество процессов для пакетной конвертации
+            executor: Готовый пул исполнителей (опционально, вместо jobs)
+        """
+        self.host = host
+        self.port = port
+        self._jobs = jobs
+        self._executor = executor
+        self._own_executor = executor is None
+        self._server = None
+
+    async def start(self):
+        """Загружает шаблоны, запускает пул процессов и начинает прием соединений"""
+        _preload_templates()
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self._jobs, initializer=_preload_templates)
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                                  limit=MAX_HEADER_LINE)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        """Обслуживает запросы до отмены"""
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        """Останавливает сервер и пул процессов"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._own_executor and self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await self._read_request_head(reader)
+                    if request is None:
+                        break
+                    method, target, version, headers = request
+                    keep_alive = self._keep_alive(version, headers)
+                    # False, если ответ оборван после отправки заголовков
+                    if not await self._dispatch(method, target, version, headers, reader, writer, keep_alive):
+                        break
+                except HTTPError as e:
+                    # Непрочитанное тело запроса делает соединение непригодным
+                    await self._send_json(writer, e.status, {'error': str(e)}, keep_alive=False)
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    raise
+                except Exception as e:
+                    await self._send_json(writer, 500, {'error': f'Внутренняя ошибка: {e}'}, keep_alive=False)
+                    break
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _keep_alive(version: str, headers: dict) -> bool:
+        connection = headers.get('connection', '').lower()
+        if version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+    @staticmethod
+    async def _read_head_line(reader: asyncio.StreamReader, status: int, message: str) -> bytes:
+        """Читает строку заголовка запроса; слишком длинная строка — HTTPError(status)"""
+        try:
+            return await reader.readline()
+        except ValueError:
+            # readline сообщает о превышении MAX_HEADER_LINE через ValueError,
+            # остаток строки не прочитан, поэтому соединение закрывается
+            raise HTTPError(status, message)
+
+    @classmethod
+    async def _read_request_head(cls, reader: asyncio.StreamReader):
+        line = await cls._read_head_line(reader, 414, 'Слишком длинная строка запроса')
+        if not line:
+            return None
+        try:
+            method, target, version = line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(400, 'Неверная строка запроса')
+
+        headers = {}
+        for _ in range(MAX_HEADERS):
+            line = await cls._read_head_line(reader, 431, 'Слишком длинный заголовок')
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, sep, value = line.decode('latin-1').partition(':')
+            if not sep:
+                raise HTTPError(400, 'Неверный заголовок')
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise HTTPError(431, 'Слишком много заголовков')
+
+        return method, target, version, headers
+
+    @staticmethod
+    async def _iter_body(reader: asyncio.StreamReader, headers: dict) -> AsyncIterator[bytes]:
+        """Читает тело запроса частями (Content-Length или chunked)"""
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                try:
+                    size_line = await reader.readline()
+                    size = int(size_line.split(b';', 1)[0].strip(), 16)
+                except ValueError:
+                    raise HTTPError(400, 'Неверный размер чанка')
+                if size == 0:
+                    # Пропускаем трейлеры
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return
+                yield await reader.readexactly(size)
+                await reader.readline()
+            return
+
+        length = headers.get('content-length')
+        if length is None:
+            return
+        try:
+            remaining = int(length)
+        except ValueError:
+            raise HTTPError(400, 'Неверный Content-Length')
+        while remaining > 0:
+            chunk = await reader.read(min(remaining, 65536))
+            if not chunk:
+                raise asyncio.IncompleteReadError(b'', remaining)
+            remaining -= len(chunk)
+            yield chunk
+
+    async def _read_body(self, reader: asyncio.StreamReader, headers: dict, limit: int) -> bytes:
+        parts = []
+        size = 0
+        async for chunk in self._iter_body(reader, headers):
+            size += len(chunk)
+            if size > limit:
+                raise HTTPError(413, 'Слишком большое тело запроса')
+            parts.append(chunk)
+        return b''.join(parts)
+
+    async def _dispatch(self, method: str, target: str, version: str, headers: dict,
+                        reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                        keep_alive: bool) -> bool:
+        """
+        Обрабатывает запрос
+
+        Returns:
+            False, если ответ был оборван и соединение нужно закрыть
+        """
+        url = urlsplit(target)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if url.path == '/templates':
+            if method != 'GET':
+                raise HTTPError(405, 'Метод не поддерживается')
+            await self._send_json(writer, 200, self._templates_payload(), headers, keep_alive, version)
+        elif url.path == '/convert':
+            if method != 'POST':
+                raise HTTPError(405, 'Метод не поддерживается')
+            body = await self._read_body(reader, headers, MAX_SINGLE_BODY)
+            await self._send_json(writer, 200, self._convert_single(body, query), headers, keep_alive, version)
+        elif url.path == '/convert/batch':
+            if method != 'POST':
+                raise HTTPError(405, 'Метод не поддерживается')
+            return await self._convert_batch(reader, writer, version, headers, query, keep_alive)
+        else:
+            raise HTTPError(404, 'Маршрут не найден')
+        return True
+
+    @staticmethod
+    def _templates_payload() -> dict:
+        registry = get_registry()
+        return {
+            name: {'number': number, 'path': path, 'hash': registry.content_hash(name)}
+            for number, (name, path) in enumerate(registry.index.items(), 1)
+        }
+
+    @staticmethod
+    def _resolve_template(query: dict) -> Tuple[Optional[str], Optional[CompiledTemplate]]:
+        value = query.get('template')
+        if not value:
+            return None, None
+        registry = get_registry()
+        try:
+            template_name = registry.resolve(value)
+        except ValueError as e:
+            raise HTTPError(404, str(e))
+        try:
+            return template_name, registry.compiled(template_name)
+        except ValueError as e:
+            raise HTTPError(500, str(e))
+
+    def _convert_single(self, body: bytes, query: dict) -> dict:
+        _, template = self._resolve_template(query)
+        link = body.decode('utf-8', errors='replace').strip()
+        result = next(convert_links(((1, link),), template, query.get('tag')))
+        if result.error is not None:
+            raise HTTPError(400, result.error)
+        return result.config
+
+    @staticmethod
+    def _parse_batch_line(line: bytes) -> Optional[Tuple[str, Optional[str]]]:
+        text = line.decode('utf-8', errors='replace').strip()
+        if not text or text.startswith('#'):
+            return None
+        if text.startswith('{'):
+            try:
+                record = json.loads(text)
+            except json.JSONDecodeError:
+                return text, None
+            return record.get('link', ''), record.get('tag')
+        return text, None
+
+    async def _convert_batch(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                             version: str, headers: dict, query: dict, keep_alive: bool) -> bool:
+        template_name, _ = self._resolve_template(query)
+        default_tag = query.get('tag')
+        loop = asyncio.get_running_loop()
+        # Клиент HTTP/1.0 не понимает chunked: тело идет до закрытия соединения
+        chunked = version != 'HTTP/1.0'
+
+        head = ['HTTP/1.1 200 OK', 'Content-Type: application/x-ndjson; charset=utf-8']
+        if chunked:
+            head += ['Transfer-Encoding: chunked', 'Trailer: ETag']
+        if not keep_alive or not chunked:
+            head.append('Connection: close')
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+        digest = hashlib.sha256()
+        pending = deque()
+        max_pending = 4
+
+        def write_body(data: bytes):
+            writer.write(b'%x\r\n%s\r\n' % (len(data), data) if chunked else data)
+
+        async def flush_head():
+            lines = await pending.popleft()
+            data = b''.join(lines)
+            if data:
+                digest.update(data)
+                write_body(data)
+                await writer.drain()
+
+        chunk = []
+        buffer = b''
+        line_no = 0
+
+        async def submit():
+            nonlocal chunk
+            pending.append(loop.run_in_executor(self._executor, _convert_batch_chunk, chunk, template_name))
+            chunk = []
+            # Обратное давление: не читаем тело дальше, пока буфер полон
+            if len(pending) >= max_pending:
+                await flush_head()
+
+        try:
+            async for data in self._iter_body(reader, headers):
+                buffer += data
+                *lines, buffer = buffer.split(b'\n')
+                for line in lines:
+                    line_no += 1
+                    item = self._parse_batch_line(line)
+                    if item is None:
+                        continue
+                    link, tag = item
+                    chunk.append((line_no, link, tag or default_tag))
+                    if len(chunk) >= BATCH_CHUNK_SIZE:
+                        await submit()
+
+            if buffer:
+                line_no += 1
+                item = self._parse_batch_line(buffer)
+                if item is not None:
+                    chunk.append((line_no, item[0], item[1] or default_tag))
+            if chunk:
+                await submit()
+            while pending:
+                await flush_head()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            raise
+        except Exception as e:
+            # Заголовки уже отправлены: ошибка становится последней записью
+            # тела, затем тело завершается и соединение закрывается
+            for future in pending:
+                future.cancel()
+            message = str(e) if isinstance(e, HTTPError) else f'Внутренняя ошибка: {e}'
+            write_body(get_serializer(COMPACT).dumps({'line': line_no, 'error': message}) + b'\n')
+            if chunked:
+                writer.write(b'0\r\n\r\n')
+            await writer.drain()
+            return False
+
+        if chunked:
+            etag = '"' + digest.hexdigest()[:32] + '"'
+            writer.write(f'0\r\nETag: {etag}\r\n\r\n'.encode('latin-1'))
+        await writer.drain()
+        return keep_alive and chunked
+
+    @staticmethod
+    async def _send_json(writer: asyncio.StreamWriter, status: int, payload,
+                         request_headers: dict = None, keep_alive: bool = True,
+                         version: str = 'HTTP/1.1'):
+        body = get_serializer(COMPACT).dumps(payload)
+        etag = etag_for(body)
+        if status == 200 and request_headers and request_headers.get('if-none-match') == etag:
+            status = 304
+            body = b''
+
+        head = [
+            f'HTTP/1.1 {status} {_REASONS.get(status, "")}',
+            'Content-Type: application/json; charset=utf-8',
+            f'Content-Length: {len(body)}',
+        ]
+        if status in (200, 304):
+            head.append(f'ETag: {etag}')
+        if not keep_alive:
+            head.append('Connection: close')
+        elif version == 'HTTP/1.0':
+            # Для HTTP/1.0 постоянное соединение нужно подтвердить явно
+            head.append('Connection: keep-alive')
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, jobs: int = None):
+    """
+    Запускает сервис конвертации и обслуживает запросы до прерывания
+
+    Args:
+        host: Адрес для прослушивания
+        port: Порт
+        jobs: Количество процессов для пакетной конвертации
+    """
+    async def run():
+        server = await ConversionServer(host, port, jobs).start()
+        print(f"Сервис конвертации запущен: http://{server.host}:{server.port}")
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,306 @@
+"""
+Модуль распределения ссылок по узлам
+
+Содержит кольцо согласованного хеширования с виртуальными узлами и
+раскладку ссылок по парку роутеров: каждая ссылка назначается K узлам,
+для каждого узла собирается объединенная конфигурация (merge) с его
+ссылками. При добавлении ссылок или узлов назначения остальных ссылок
+почти не меняются.
+
+Назначения сохраняются в манифест в каталоге результатов; при следующем
+запуске по нему считается, сколько назначений переместилось.
+"""
+
+import os
+import json
+import bisect
+import hashlib
+from typing import Dict, Iterable, List, Tuple
+
+from .merge import DEFAULT_STRATEGY, build_merged_config, link_identity
+from .serialization import Serializer, get_serializer, PRETTY
+from .utils import fsync_dir, write_atomic
+from .writer import sanitize_filename
+
+
+DEFAULT_REPLICAS = 2
+DEFAULT_VNODES = 100
+MANIFEST_NAME = 'shards-manifest.json'
+MANIFEST_VERSION = 1
+
+
+def _ring_hash(key: str) -> int:
+    """Позиция ключа на кольце"""
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def link_key(vless_data: dict) -> str:
+    """
+    Возвращает ключ ссылки для кольца и манифеста
+
+    Ключ строится по link_identity, поэтому ссылки, отличающиеся только
+    фрагментом или порядком параметров, попадают на те же узлы.
+
+    Args:
+        vless_data: Словарь с данными VLESS
+
+    Returns:
+        Шестнадцатеричный хеш канонического идентификатора ссылки
+    """
+    identity = '\x00'.join(map(str, link_identity(vless_data)))
+    return hashlib.blake2b(identity.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class HashRing:
+    """
+    Кольцо согласованного хеширования
+
+    Каждый узел занимает vnodes точек на кольце; ключ назначается первым
+    различным узлам по часовой стрелке от своей позиции. При добавлении
+    или удалении узла меняются назначения только соседних с его точками
+    ключей.
+    """
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = DEFAULT_VNODES):
+        """
+        Args:
+            nodes: Имена узлов
+            vnodes: Число виртуальных узлов (точек на кольце) для каждого узла
+        """
+        self.nodes = list(nodes)
+        if not self.nodes:
+            raise ValueError("Список узлов пуст")
+        if len(set(self.nodes)) != len(self.nodes):
+            raise ValueError("Имена узлов повторяются")
+        if vnodes < 1:
+            raise ValueError("Число виртуальных узлов должно быть не меньше 1")
+        self.vnodes = vnodes
+
+        points = sorted((_ring_hash(f"{node}#{index}"), node)
+                        for node in self.nodes for index in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def nodes_for(self, key: str, replicas: int = 1) -> List[str]:
+        """
+        Возвращает узлы для ключа
+
+        Args:
+            key: Ключ (например, link_key)
+            replicas: Число узлов (не больше числа узлов кольца)
+
+        Returns:
+            Список различных узлов в порядке обхода кольца
+        """
+        if replicas < 1:
+            raise ValueError("Число реплик должно быть не меньше 1")
+        replicas = min(replicas, len(self.nodes))
+        owners = self._owners
+        total = len(owners)
+        position = bisect.bisect_right(self._hashes, _ring_hash(key))
+
+        result = []
+        for step in range(total):
+            node = owners[(position + step) % total]
+            if node not in result:
+                result.append(node)
+                if len(result) == replicas:
+                    break
+        return result
+
+
+def read_nodes(path: str) -> List[str]:
+    """
+    Читает список узлов: одно имя на строку, пустые строки и строки с # пропускаются
+
+    Args:
+        path: Путь к файлу
+
+    Returns:
+        Имена узлов в порядке файла
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+
+def assign_links(links: Iterable[dict], ring: HashRing,
+                 replicas: int = DEFAULT_REPLICAS) -> Tuple[Dict[str, List[dict]], Dict[str, List[str]], int]:
+    """
+    Назначает ссылки узлам за один проход
+
+    Дубликаты (одинаковый link_key) назначаются один раз.
+
+    Args:
+        links: Словари с данными VLESS
+        ring: Кольцо узлов
+        replicas: Число узлов для каждой ссылки
+
+    Returns:
+        Кортеж (узел -> список ссылок, ключ ссылки -> список узлов, всего ссылок)
+    """
+    per_node = {node: [] for node in ring.nodes}
+    assignments = {}
+    total = 0
+    for vless_data in links:
+        total += 1
+        key = link_key(vless_data)
+        if key in assignments:
+            continue
+        nodes = assignments[key] = ring.nodes_for(key, replicas)
+        for node in nodes:
+            per_node[node].append(vless_data)
+    return per_node, assignments, total
+
+
+def diff_assignments(previous: Dict[str, List[str]], current: Dict[str, List[str]]) -> dict:
+    """
+    Сравнивает назначения с предыдущим запуском
+
+    Args:
+        previous: Назначения из манифеста (ключ ссылки -> узлы)
+        current: Текущие назначения
+
+    Returns:
+        Словарь {assignments, moved, added, removed}: всего назначений,
+        назначений сохранившихся ссылок на новые узлы, новых и удаленных ссылок
+    """
+    moved = 0
+    added = 0
+    for key, nodes in current.items():
+        old = previous.get(key)
+        if old is None:
+            added += 1
+        else:
+            moved += len(set(nodes).difference(old))
+    return {
+        'assignments': sum(len(nodes) for nodes in current.values()),
+        'moved': moved,
+        'added': added,
+        'removed': sum(1 for key in previous if key not in current),
+    }
+
+
+def load_manifest(path: str) -> dict:
+    """
+    Загружает манифест предыдущего запуска
+
+    Args:
+        path: Путь к манифесту
+
+    Returns:
+        Манифест или пустой словарь, если файла нет или он поврежден
+    """
+    try:
+        with open(path, 'rb') as f:
+            manifest = json.loads(f.read())
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest
+
+
+def _is_own_file(real_directory: str, filename) -> bool:
+    """
+    Проверяет, что имя из манифеста указывает на файл внутри каталога узлов
+
+    Манифест читается с диска, поэтому имена вроде "../x" или абсолютные
+    пути (в том числе через символические ссылки) не удаляются.
+    """
+    if (not isinstance(filename, str) or os.path.basename(filename) != filename
+            or filename in ('', '.', '..', MANIFEST_NAME)):
+        return False
+    path = os.path.realpath(os.path.join(real_directory, filename))
+    return os.path.dirname(path) == real_directory
+
+
+def shard_links(links: Iterable[dict], nodes: List[str], directory: str, template: dict = None,
+                replicas: int = DEFAULT_REPLICAS, vnodes: int = DEFAULT_VNODES,
+                tag_prefix: str = '', strategy: str = DEFAULT_STRATEGY,
+                serializer: Serializer = None) -> dict:
+    """
+    Раскладывает ссылки по узлам и записывает конфигурацию каждого узла
+
+    Для каждого узла в каталоге создается файл <узел>.json с объединенной
+    конфигурацией (см. build_merged_config) из назначенных ему ссылок.
+    Файлы пишутся атомарно, неизменившиеся не перезаписываются, файлы
+    узлов, исключенных из списка, удаляются. Узлу без ссылок файл не
+    создается (балансировщик с пустым селектором бесполезен), его файл
+    от предыдущего запуска удаляется. Манифест назначений
+    обновляется после записи конфигураций.
+
+    Args:
+        links: Словари с данными VLESS
+        nodes: Имена узлов
+        directory: Каталог результатов
+        template: Шаблон конфигурации (опционально)
+        replicas: Число узлов для каждой ссылки
+        vnodes: Число виртуальных узлов на кольце для каждого узла
+        tag_prefix: Префикс тегов outbound
+        strategy: Стратегия балансировщика Xray
+        serializer: Сериализатор JSON (по умолчанию pretty)
+
+    Returns:
+        Статистика {links, unique, nodes, assignments, moved, added, removed,
+        written, unchanged, empty}; empty — список узлов без ссылок
+    """
+    if serializer is None:
+        serializer = get_serializer(PRETTY)
+
+    filenames = {node: sanitize_filename(node) + '.json' for node in nodes}
+    if len(set(filenames.values())) != len(filenames):
+        raise ValueError("Разные узлы дают одинаковое имя файла")
+    if MANIFEST_NAME in filenames.values():
+        raise ValueError(f"Имя узла совпадает с именем манифеста {MANIFEST_NAME}")
+
+    ring = HashRing(nodes, vnodes)
+    per_node, assignments, total = assign_links(links, ring, replicas)
+
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    previous = load_manifest(manifest_path)
+
+    written = 0
+    unchanged = 0
+    empty = []
+    for node, node_links in per_node.items():
+        if not node_links:
+            empty.append(node)
+            continue
+        config, _ = build_merged_config(node_links, template, tag_prefix=tag_prefix, strategy=strategy)
+        if write_atomic(os.path.join(directory, filenames[node]), serializer.dumps(config), sync_dir=False):
+            written += 1
+        else:
+            unchanged += 1
+
+    current_files = {filenames[node] for node in nodes if per_node[node]}
+    real_directory = os.path.realpath(directory)
+    for filename in previous.get('files', ()):
+        if filename in current_files or not _is_own_file(real_directory, filename):
+            continue
+        try:
+            os.unlink(os.path.join(directory, filename))
+        except FileNotFoundError:
+            pass
+
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'replicas': replicas,
+        'vnodes': vnodes,
+        'files': sorted(current_files),
+        'assignments': assignments,
+    }
+    write_atomic(manifest_path, json.dumps(manifest, separators=(',', ':'), sort_keys=True).encode('utf-8'),
+                 sync_dir=False)
+    fsync_dir(directory)
+
+    stats = diff_assignments(previous.get('assignments', {}), assignments)
+    stats.update({
+        'links': total,
+        'unique': len(assignments),
+        'nodes': len(nodes),
+        'written': written,
+        'unchanged': unchanged,
+        'empty': empty,
+    })
+    return stats
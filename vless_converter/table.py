@@ -0,0 +1,437 @@
+"""
+Модуль колоночного хранения ссылок
+
+Содержит LinkTable — таблицу разобранных ссылок, в которой каждое поле
+хранится отдельной колонкой: порты в array('H'), UUID по 16 байт в
+bytearray, строковые поля со словарным кодированием (список различных
+значений и массив кодов). Серверы, SNI, pbk, fingerprint и flow в больших
+подписках сильно повторяются, поэтому таблица занимает в разы меньше
+памяти, чем список словарей parse_vless_url. Словари, VlessLink и
+конфигурации Xray создаются только при обращении к строкам.
+"""
+
+import re
+from array import array
+from itertools import compress
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from .parser import VlessLink, try_parse
+from .generator import create_xray_config
+
+
+# Колонки со словарным кодированием
+STRING_COLUMNS = ('host', 'security', 'network', 'sni', 'pbk', 'sid', 'fp', 'spx', 'flow', 'fragment')
+COLUMNS = ('uuid', 'port') + STRING_COLUMNS
+
+# Колонка -> параметр ссылки, из которого берется значение
+_PARAM_COLUMNS = (
+    ('security', 'security'), ('network', 'type'), ('sni', 'sni'), ('pbk', 'pbk'),
+    ('sid', 'sid'), ('fp', 'fp'), ('spx', 'spx'), ('flow', 'flow'),
+)
+_COLUMN_PARAMS = frozenset(key for _, key in _PARAM_COLUMNS)
+
+# Ширина кода растет вместе со словарем: 1, 2, затем 4 байта
+_MAX_CODE = {'B': 0xFF, 'H': 0xFFFF}
+_WIDER = {'B': 'H', 'H': 'I'}
+
+_UUID_MATCH = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}').fullmatch
+_NO_UUID = bytes(16)
+_MAX_PORT = 0xFFFF
+
+
+def _format_uuid(packed: bytes) -> str:
+    value = packed.hex()
+    return f"{value[:8]}-{value[8:12]}-{value[12:16]}-{value[16:20]}-{value[20:]}"
+
+
+def _pack_uuid(uuid: str) -> Optional[bytes]:
+    """Упаковывает UUID в 16 байт, если он восстанавливается из них без изменений"""
+    # Верхний регистр при упаковке не сохраняется, поэтому такие UUID хранятся как есть
+    if _UUID_MATCH(uuid) is None:
+        return None
+    return bytes.fromhex(uuid.replace('-', ''))
+
+
+class DictColumn:
+    """Колонка со словарным кодированием; код 0 означает None"""
+
+    __slots__ = ('values', 'codes', '_index')
+
+    def __init__(self):
+        self.values = [None]
+        self.codes = array('B')
+        self._index = {None: 0}
+
+    def encode(self, value) -> int:
+        """
+        Возвращает код значения, добавляя значение в словарь при необходимости
+
+        Args:
+            value: Хешируемое значение или None
+
+        Returns:
+            Код значения
+        """
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.values)
+            self.values.append(value)
+            typecode = self.codes.typecode
+            if typecode in _MAX_CODE and code > _MAX_CODE[typecode]:
+                self.codes = array(_WIDER[typecode], self.codes)
+        return code
+
+    def append(self, value):
+        """Добавляет значение в конец колонки"""
+        code = self._index.get(value)
+        if code is None:
+            # encode может заменить массив кодов более широким
+            code = self.encode(value)
+        self.codes.append(code)
+
+    def code_of(self, value) -> Optional[int]:
+        """Возвращает код значения или None, если значения нет в словаре"""
+        return self._index.get(value)
+
+    def __getitem__(self, row: int):
+        return self.values[self.codes[row]]
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+
+class LinkTable:
+    """
+    Колоночная таблица разобранных VLESS ссылок
+
+    Строка таблицы адресуется номером (0, 1, ...). Выборки filter и
+    group_by возвращают номера строк в array('I'), которые затем можно
+    передать в links, dicts или configs для ленивой материализации.
+    """
+
+    def __init__(self):
+        self._size = 0
+        self._uuids = bytearray()
+        self._ports = array('H')
+        self._columns = {name: DictColumn() for name in STRING_COLUMNS}
+        self._column_list = [self._columns[name] for name in STRING_COLUMNS]
+        # Остальные параметры ссылки: кортеж пар (ключ, значение)
+        self._params = DictColumn()
+        # Редкие значения, которые не помещаются в компактные колонки: строка -> значение
+        self._raw_uuids = {}
+        self._wide_ports = {}
+        # Число неразобранных ссылок при создании через from_urls
+        self.rejected = 0
+
+    @classmethod
+    def from_urls(cls, urls: Iterable[str]) -> 'LinkTable':
+        """
+        Создает таблицу из текстов ссылок
+
+        Неразбираемые ссылки пропускаются, их число доступно в атрибуте rejected.
+
+        Args:
+            urls: Тексты VLESS ссылок
+
+        Returns:
+            Заполненная таблица
+        """
+        table = cls()
+        rejected = 0
+        for url in urls:
+            link, code = try_parse(url)
+            if code is not None:
+                rejected += 1
+            else:
+                table.append(link)
+        table.rejected = rejected
+        return table
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, link: VlessLink) -> int:
+        """
+        Добавляет разобранную ссылку
+
+        Args:
+            link: Ссылка (результат parse_link или try_parse)
+
+        Returns:
+            Номер добавленной строки
+        """
+        row = self._size
+
+        packed = _pack_uuid(link.uuid)
+        if packed is None:
+            self._raw_uuids[row] = link.uuid
+            packed = _NO_UUID
+        self._uuids += packed
+
+        if link.port <= _MAX_PORT:
+            self._ports.append(link.port)
+        else:
+            self._wide_ports[row] = link.port
+            self._ports.append(0)
+
+        # Поля security ... fragment идут в VlessLink подряд, в порядке STRING_COLUMNS
+        values = (link.host,) + link[3:12]
+        for column, value in zip(self._column_list, values):
+            code = column._index.get(value)
+            if code is None:
+                code = column.encode(value)
+            column.codes.append(code)
+
+        params = link.params
+        if list in map(type, params.values()):
+            # Повторяющийся параметр (список) хранится целиком вместе с остальными
+            extra = tuple((key, tuple(value) if isinstance(value, list) else value)
+                          for key, value in params.items()
+                          if key not in _COLUMN_PARAMS or isinstance(value, list))
+        else:
+            extra = tuple([item for item in params.items() if item[0] not in _COLUMN_PARAMS])
+        self._params.append(extra or None)
+
+        self._size = row + 1
+        return row
+
+    def extend(self, links: Iterable[VlessLink]):
+        """
+        Добавляет несколько разобранных ссылок
+
+        Args:
+            links: Ссылки
+        """
+        for link in links:
+            self.append(link)
+
+    def _uuid(self, row: int) -> str:
+        if self._raw_uuids:
+            raw = self._raw_uuids.get(row)
+            if raw is not None:
+                return raw
+        return _format_uuid(self._uuids[row * 16:row * 16 + 16])
+
+    def _port(self, row: int) -> int:
+        if self._wide_ports:
+            wide = self._wide_ports.get(row)
+            if wide is not None:
+                return wide
+        return self._ports[row]
+
+    def _column(self, name: str) -> DictColumn:
+        column = self._columns.get(name)
+        if column is None and name not in ('uuid', 'port'):
+            raise ValueError(f"Неизвестная колонка: {name}. Доступные колонки: {', '.join(COLUMNS)}")
+        return column
+
+    def value(self, row: int, name: str):
+        """
+        Возвращает значение одной ячейки
+
+        Args:
+            row: Номер строки
+            name: Имя колонки
+
+        Returns:
+            Значение (str, int или None)
+        """
+        if not 0 <= row < self._size:
+            raise IndexError(row)
+        column = self._column(name)
+        if column is not None:
+            return column[row]
+        return self._uuid(row) if name == 'uuid' else self._port(row)
+
+    def distinct(self, name: str) -> list:
+        """
+        Возвращает различные значения строковой колонки
+
+        Args:
+            name: Имя колонки из STRING_COLUMNS
+
+        Returns:
+            Значения в порядке первого появления (без None)
+        """
+        column = self._column(name)
+        if column is None:
+            raise ValueError(f"Колонка {name} не кодируется словарем")
+        return column.values[1:]
+
+    def _selector(self, name: str, condition):
+        """Возвращает (последовательность по строкам, проверка элемента) для условия"""
+        column = self._column(name)
+        if column is not None:
+            # Условие проверяется один раз для каждого различного значения, а не для строки
+            if callable(condition):
+                codes = {code for code, value in enumerate(column.values)
+                         if value is not None and condition(value)}
+                return column.codes, codes.__contains__
+            code = column.code_of(condition)
+            if code is None:
+                return None, None
+            return column.codes, code.__eq__
+
+        if name == 'port' and not self._wide_ports:
+            if callable(condition):
+                return self._ports, condition
+            if not isinstance(condition, int):
+                return None, None
+            return self._ports, condition.__eq__
+
+        read = self._uuid if name == 'uuid' else self._port
+        if callable(condition):
+            return range(self._size), lambda row: condition(read(row))
+        return range(self._size), lambda row: read(row) == condition
+
+    def filter(self, rows: Iterable[int] = None, **conditions) -> array:
+        """
+        Выбирает строки, удовлетворяющие всем условиям
+
+        Условие — значение для сравнения на равенство или функция-предикат,
+        например filter(host='1.2.3.4', sni=lambda sni: sni.endswith('.com')).
+
+        Args:
+            rows: Номера строк, среди которых выбирать (по умолчанию все)
+            **conditions: Имя колонки -> значение или предикат
+
+        Returns:
+            Номера подходящих строк по возрастанию
+        """
+        selected = rows
+        for name, condition in conditions.items():
+            values, test = self._selector(name, condition)
+            if values is None:
+                return array('I')
+            if selected is None:
+                selected = array('I', compress(range(self._size), map(test, values)))
+            else:
+                selected = array('I', [row for row in selected if test(values[row])])
+        if selected is None:
+            return array('I', range(self._size))
+        return selected if isinstance(selected, array) else array('I', selected)
+
+    def group_by(self, name: str, rows: Iterable[int] = None) -> Dict[Any, array]:
+        """
+        Группирует строки по значению колонки
+
+        Args:
+            name: Имя колонки
+            rows: Номера строк для группировки (по умолчанию все)
+
+        Returns:
+            Словарь {значение: номера строк} в порядке первого появления значения
+        """
+        if rows is None:
+            rows = range(self._size)
+        column = self._column(name)
+        if column is None:
+            keys = self._uuid if name == 'uuid' else self._port
+        else:
+            keys = column.codes.__getitem__
+
+        groups = {}
+        for row in rows:
+            key = keys(row)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = array('I')
+            group.append(row)
+
+        if column is None:
+            return groups
+        values = column.values
+        return {values[code]: group for code, group in groups.items()}
+
+    def params(self, row: int) -> dict:
+        """
+        Восстанавливает параметры запроса ссылки
+
+        Args:
+            row: Номер строки
+
+        Returns:
+            Новый словарь параметров, как в VlessLink.params
+        """
+        extra = self._params[row]
+        params = {key: list(value) if isinstance(value, tuple) else value
+                  for key, value in extra} if extra else {}
+        columns = self._columns
+        for name, key in _PARAM_COLUMNS:
+            value = columns[name][row]
+            if value is not None and key not in params:
+                params[key] = value
+        return params
+
+    def link(self, row: int) -> VlessLink:
+        """
+        Материализует строку в VlessLink
+
+        Args:
+            row: Номер строки
+
+        Returns:
+            Разобранная ссылка
+        """
+        if not 0 <= row < self._size:
+            raise IndexError(row)
+        columns = self._columns
+        return VlessLink(
+            uuid=self._uuid(row),
+            host=columns['host'][row],
+            port=self._port(row),
+            security=columns['security'][row],
+            network=columns['network'][row],
+            sni=columns['sni'][row],
+            pbk=columns['pbk'][row],
+            sid=columns['sid'][row],
+            fp=columns['fp'][row],
+            spx=columns['spx'][row],
+            flow=columns['flow'][row],
+            fragment=columns['fragment'][row],
+            params=self.params(row)
+        )
+
+    def to_dict(self, row: int) -> dict:
+        """
+        Материализует строку в словарь формата parse_vless_url
+
+        Args:
+            row: Номер строки
+
+        Returns:
+            Словарь с ключами uuid, server, port, params, fragment
+        """
+        if not 0 <= row < self._size:
+            raise IndexError(row)
+        return {
+            'uuid': self._uuid(row),
+            'server': self._columns['host'][row],
+            'port': self._port(row),
+            'params': self.params(row),
+            'fragment': self._columns['fragment'][row]
+        }
+
+    def links(self, rows: Iterable[int] = None) -> Iterator[VlessLink]:
+        """Лениво материализует строки в VlessLink"""
+        for row in range(self._size) if rows is None else rows:
+            yield self.link(row)
+
+    def dicts(self, rows: Iterable[int] = None) -> Iterator[dict]:
+        """Лениво материализует строки в словари формата parse_vless_url"""
+        for row in range(self._size) if rows is None else rows:
+            yield self.to_dict(row)
+
+    def configs(self, rows: Iterable[int] = None, tag: str = None) -> Iterator[dict]:
+        """
+        Лениво создает конфигурации Xray для строк
+
+        Args:
+            rows: Номера строк (по умолчанию все)
+            tag: Тег для всех конфигураций (по умолчанию fragment ссылки)
+
+        Yields:
+            Результаты create_xray_config
+        """
+        for row in range(self._size) if rows is None else rows:
+            yield create_xray_config(self.to_dict(row), tag)
@@ -2,10 +2,390 @@
 Модуль для работы с шаблонами
 
 Содержит функции для загрузки и применения шаблонов конфигураций.
+
+Шаблон может наследовать другие: ключ "extends" задает имя родителя
+(или список слоев), остальное содержимое файла накладывается на результат
+по правилам JSON Merge Patch (RFC 7386): объекты объединяются рекурсивно,
+списки и значения заменяются, null удаляет ключ.
 """
 
 import os
-import json
+import marshal
+import _thread
+
+# json, re и hashlib импортируются при первом использовании: список шаблонов
+# и разрешение имени не должны платить за них при старте CLI
+
+# Плейсхолдер вида {{name}}, компилируется при первой компиляции шаблона
+_placeholder_re = None
+
+
+def _placeholder_pattern():
+    global _placeholder_re
+    if _placeholder_re is None:
+        import re
+        _placeholder_re = re.compile(r'\{\{(\w+)\}\}')
+    return _placeholder_re
+
+# Известные плейсхолдеры и тип подставляемого значения (проверяется при рендеринге)
+PLACEHOLDER_TYPES = {
+    'address': str,
+    'port': int,
+    'id': str,
+    'tag': str,
+    'publicKey': str,
+    'serverName': str,
+    'fingerprint': str,
+    'shortId': str,
+    'spiderX': str,
+    'flow': str,
+}
+
+# Необязательные плейсхолдеры: если значения нет, ключ удаляется из результата
+OPTIONAL_PLACEHOLDERS = frozenset({'flow'})
+
+
+# Каталог встроенных шаблонов (не зависит от текущей рабочей директории)
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+
+# Переменная окружения с дополнительными каталогами шаблонов (через os.pathsep)
+TEMPLATES_PATH_ENV = 'VLESS_TEMPLATES_PATH'
+
+# Ключ шаблона со списком родительских слоев
+EXTENDS_KEY = 'extends'
+
+# Исторические короткие имена шаблонов {имя_файла_без_расширения: имя}
+_LEGACY_NAMES = {
+    'openwrt-reverse-proxy': 'openwrt-reverse',
+}
+
+
+class _CacheEntry:
+    """Запись кэша шаблонов, действительная пока не изменились mtime и размер файла"""
+
+    __slots__ = ('mtime_ns', 'size', 'content', 'content_hash', 'template', 'compiled')
+
+    def __init__(self, mtime_ns: int, size: int, content: bytes, template: dict):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.content = content
+        self.content_hash = None
+        self.template = template
+        self.compiled = None
+
+
+class _ResolvedChain:
+    """Результат наложения слоев шаблона, действительный пока не изменились хеши слоев"""
+
+    __slots__ = ('key', 'content_hash', 'template', 'compiled')
+
+    def __init__(self, key: tuple, template: dict):
+        import hashlib
+        self.key = key
+        self.content_hash = hashlib.sha256('\n'.join(key).encode('ascii')).hexdigest()
+        self.template = template
+        self.compiled = None
+
+
+def merge_overlay(base: dict, overlay: dict) -> dict:
+    """
+    Накладывает фрагмент на шаблон по правилам JSON Merge Patch (RFC 7386)
+
+    Args:
+        base: Изменяемый словарь шаблона
+        overlay: Фрагмент; вложенные словари объединяются, null удаляет ключ,
+            остальные значения (в том числе списки) заменяются
+
+    Returns:
+        base после изменения
+    """
+    for key, value in overlay.items():
+        if value is None:
+            base.pop(key, None)
+        elif isinstance(value, dict):
+            target = base.get(key)
+            base[key] = merge_overlay(target if isinstance(target, dict) else {}, value)
+        else:
+            base[key] = marshal.loads(marshal.dumps(value))
+    return base
+
+
+class TemplateRegistry:
+    """
+    Реестр шаблонов конфигураций
+
+    Каталоги шаблонов сканируются один раз, шаблоны индексируются по имени
+    и номеру. Загруженные и скомпилированные шаблоны хранятся в ограниченном
+    LRU-кэше и перечитываются только при изменении mtime или размера файла.
+    Для шаблонов с "extends" результат наложения слоев запоминается по
+    хешам содержимого всех слоев и пересобирается при изменении любого из
+    них. Реестр можно использовать из нескольких потоков.
+    """
+
+    def __init__(self, search_paths: list = None, max_entries: int = 32):
+        """
+        Args:
+            search_paths: Дополнительные каталоги шаблонов (опционально)
+            max_entries: Максимальное количество шаблонов в кэше
+        """
+        paths = [TEMPLATES_DIR]
+        if search_paths:
+            paths.extend(search_paths)
+        env_paths = os.environ.get(TEMPLATES_PATH_ENV)
+        if env_paths:
+            paths.extend(path for path in env_paths.split(os.pathsep) if path)
+
+        self.search_paths = [os.path.abspath(path) for path in paths]
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._index = None
+        self._stems = None
+        # Словарь сохраняет порядок вставки: первый ключ — давно не использованный
+        self._cache = {}
+        # Имя шаблона с extends -> _ResolvedChain
+        self._chains = {}
+        # _thread вместо threading: модуль встроенный и не замедляет старт CLI
+        self._lock = _thread.RLock()
+
+    def scan(self):
+        """Пересканирует каталоги шаблонов и перестраивает индекс"""
+        with self._lock:
+            self._scan()
+
+    def _scan(self):
+        found = {}
+        stems = {}
+        for directory in self.search_paths:
+            try:
+                filenames = sorted(os.listdir(directory))
+            except OSError:
+                continue
+            for filename in filenames:
+                stem, ext = os.path.splitext(filename)
+                if ext != '.json':
+                    continue
+                name = _LEGACY_NAMES.get(stem, stem)
+                # Шаблон из более раннего каталога имеет приоритет
+                if name not in found:
+                    found[name] = os.path.join(directory, filename)
+                    stems.setdefault(stem, name)
+
+        self._index = dict(sorted(found.items()))
+        self._stems = stems
+
+    @property
+    def index(self) -> dict:
+        """Словарь {имя_шаблона: путь_к_файлу}"""
+        index = self._index
+        if index is None:
+            with self._lock:
+                if self._index is None:
+                    self._scan()
+                index = self._index
+        return index
+
+    def resolve(self, input_value: str) -> str:
+        """
+        Определяет имя шаблона по номеру или имени
+
+        Args:
+            input_value: Номер, имя шаблона или имя файла без расширения
+
+        Returns:
+            Имя шаблона
+        """
+        index = self.index
+        names = list(index)
+
+        if input_value.isdigit() and 1 <= int(input_value) <= len(names):
+            return names[int(input_value) - 1]
+
+        if input_value in index:
+            return input_value
+
+        if input_value in self._stems:
+            return self._stems[input_value]
+
+        available_options = [f"{i} ({name})" for i, name in enumerate(names, 1)]
+        raise ValueError(f"Неверное название или номер шаблона '{input_value}'. Доступные: {', '.join(available_options)}")
+
+    def _load_entry(self, template_name: str) -> _CacheEntry:
+        """Возвращает актуальную запись кэша, при необходимости перечитывая файл"""
+        index = self.index
+        if template_name not in index:
+            available = ", ".join(index)
+            raise ValueError(f"Неизвестный шаблон '{template_name}'. Доступные: {available}")
+
+        template_path = index[template_name]
+        try:
+            stat = os.stat(template_path)
+        except OSError:
+            self._cache.pop(template_path, None)
+            raise ValueError(f"Файл шаблона не найден: {template_path}")
+
+        entry = self._cache.pop(template_path, None)
+        if entry is not None and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+            self.hits += 1
+            self._cache[template_path] = entry
+            return entry
+
+        import json
+
+        self.misses += 1
+        try:
+            with open(template_path, 'rb') as f:
+                content = f.read()
+            template = json.loads(content.decode('utf-8'))
+        except OSError:
+            raise ValueError(f"Файл шаблона не найден: {template_path}")
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise ValueError(f"Ошибка в JSON шаблоне {template_path}: {e}")
+
+        entry = _CacheEntry(stat.st_mtime_ns, stat.st_size, content, template)
+        self._cache[template_path] = entry
+        while len(self._cache) > self.max_entries:
+            del self._cache[next(iter(self._cache))]
+        return entry
+
+    @staticmethod
+    def _entry_hash(entry: _CacheEntry) -> str:
+        if entry.content_hash is None:
+            import hashlib
+            entry.content_hash = hashlib.sha256(entry.content).hexdigest()
+        return entry.content_hash
+
+    def _layers(self, template_name: str, entry: _CacheEntry, parents: tuple) -> list:
+        """Возвращает записи слоев шаблона от базового к самому шаблону"""
+        extends = entry.template.get(EXTENDS_KEY)
+        if isinstance(extends, str):
+            extends = [extends]
+        if not isinstance(extends, list) or not extends or not all(isinstance(name, str) for name in extends):
+            raise ValueError(f"Ключ {EXTENDS_KEY} шаблона '{template_name}' должен быть именем шаблона или списком имен")
+
+        parents += (template_name,)
+        layers = []
+        for parent in extends:
+            parent_name = self.resolve(parent)
+            if parent_name in parents:
+                chain = ' -> '.join(parents + (parent_name,))
+                raise ValueError(f"Циклическое наследование шаблонов: {chain}")
+            parent_entry = self._load_entry(parent_name)
+            if isinstance(parent_entry.template, dict) and EXTENDS_KEY in parent_entry.template:
+                layers.extend(self._layers(parent_name, parent_entry, parents))
+            else:
+                layers.append(parent_entry)
+        layers.append(entry)
+        return layers
+
+    def _resolve(self, template_name: str):
+        """
+        Возвращает запись с итоговым шаблоном: сам файл или результат
+        наложения слоев, если шаблон наследует другие
+        """
+        entry = self._load_entry(template_name)
+        if not isinstance(entry.template, dict) or EXTENDS_KEY not in entry.template:
+            return entry
+
+        layers = self._layers(template_name, entry, ())
+        key = tuple(self._entry_hash(layer) for layer in layers)
+        resolved = self._chains.get(template_name)
+        if resolved is not None and resolved.key == key:
+            return resolved
+
+        template = {}
+        for layer in layers:
+            if not isinstance(layer.template, dict):
+                raise ValueError(f"Слой шаблона '{template_name}' должен быть JSON объектом")
+            merge_overlay(template, layer.template)
+        template.pop(EXTENDS_KEY, None)
+
+        resolved = self._chains[template_name] = _ResolvedChain(key, template)
+        return resolved
+
+    def load(self, template_name: str) -> dict:
+        """
+        Загружает шаблон конфигурации
+
+        Args:
+            template_name: Имя шаблона
+
+        Returns:
+            Новая копия словаря шаблона (кэш не изменяется при правке результата)
+        """
+        with self._lock:
+            template = self._resolve(template_name).template
+        return marshal.loads(marshal.dumps(template))
+
+    def compiled(self, template_name: str) -> 'CompiledTemplate':
+        """
+        Возвращает скомпилированный шаблон
+
+        Args:
+            template_name: Имя шаблона
+
+        Returns:
+            Скомпилированный шаблон
+        """
+        with self._lock:
+            entry = self._resolve(template_name)
+            if entry.compiled is None:
+                entry.compiled = CompiledTemplate(entry.template)
+            return entry.compiled
+
+    def content_hash(self, template_name: str) -> str:
+        """
+        Возвращает SHA-256 содержимого файла шаблона
+
+        Для шаблона с extends хеш вычисляется по хешам всех слоев, поэтому
+        он меняется при изменении любого из них.
+
+        Args:
+            template_name: Имя шаблона
+
+        Returns:
+            Шестнадцатеричная строка хеша
+        """
+        with self._lock:
+            entry = self._resolve(template_name)
+            if isinstance(entry, _ResolvedChain):
+                return entry.content_hash
+            return self._entry_hash(entry)
+
+    def stats(self) -> dict:
+        """
+        Возвращает статистику кэша
+
+        Returns:
+            Словарь со счетчиками попаданий и промахов
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._cache),
+                'chains': len(self._chains),
+                'max_entries': self.max_entries,
+            }
+
+
+_default_registry = None
+_default_lock = _thread.allocate_lock()
+
+
+def get_registry() -> TemplateRegistry:
+    """
+    Возвращает общий реестр шаблонов
+
+    Returns:
+        Экземпляр TemplateRegistry, создаваемый при первом обращении
+    """
+    global _default_registry
+    if _default_registry is None:
+        with _default_lock:
+            if _default_registry is None:
+                _default_registry = TemplateRegistry()
+    return _default_registry
 
 
 def get_available_templates() -> dict:
@@ -15,10 +395,7 @@ def get_available_templates() -> dict:
     Returns:
         Словарь с доступными шаблонами {простое_имя: путь_к_файлу}
     """
-    templates = {
-        "openwrt-reverse": "templates/openwrt-reverse-proxy.json"
-    }
-    return templates
+    return dict(get_registry().index)
 
 
 def display_templates_with_numbers() -> dict:
@@ -52,27 +429,7 @@ def resolve_template_name(input_value: str) -> str:
     Returns:
         Имя шаблона
     """
-    templates = get_available_templates()
-    numbered_templates = {}
-    
-    # Создаем mapping номер -> имя
-    for i, name in enumerate(templates.keys(), 1):
-        numbered_templates[str(i)] = name
-    
-    # Проверяем, является ли input номером
-    if input_value.isdigit() and input_value in numbered_templates:
-        return numbered_templates[input_value]
-    
-    # Проверяем, является ли input именем шаблона
-    if input_value in templates:
-        return input_value
-    
-    # Если ничего не подошло, выбрасываем ошибку
-    available_options = []
-    for i, name in enumerate(templates.keys(), 1):
-        available_options.append(f"{i} ({name})")
-    
-    raise ValueError(f"Неверное название или номер шаблона '{input_value}'. Доступные: {', '.join(available_options)}")
+    return get_registry().resolve(input_value)
 
 
 def load_template(template_name: str) -> dict:
@@ -85,38 +442,203 @@ def load_template(template_name: str) -> dict:
     Returns:
         Словарь с шаблоном конфигурации
     """
-    templates = get_available_templates()
-    
-    if template_name not in templates:
-        available = ", ".join(templates.keys())
-        raise ValueError(f"Неизвестный шаблон '{template_name}'. Доступные: {available}")
-    
-    template_path = templates[template_name]
-    
-    if not os.path.exists(template_path):
-        raise ValueError(f"Файл шаблона не найден: {template_path}")
-    
-    try:
-        with open(template_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Ошибка в JSON шаблоне {template_path}: {e}")
+    return get_registry().load(template_name)
 
 
-def apply_template(template: dict, vless_data: dict, custom_tag: str = None) -> dict:
+def _coerce_value(name: str, value):
     """
-    Применяет данные VLESS к шаблону
-    
+    Приводит значение плейсхолдера к типу из PLACEHOLDER_TYPES
+
+    Повторенный параметр ссылки (список) заменяется первым значением, как
+    в разборе ссылок; номер порта строкой из цифр приводится к int.
+
+    Raises:
+        ValueError: Значение нельзя привести к нужному типу
+    """
+    expected = PLACEHOLDER_TYPES[name]
+    if isinstance(value, (list, tuple)) and value:
+        value = value[0]
+    if type(value) is expected:
+        return value
+    if expected is int and isinstance(value, str) and value.strip().isdigit() and value.isascii():
+        return int(value)
+    raise ValueError(f"Неверный тип значения плейсхолдера {name}: "
+                     f"ожидается {expected.__name__}, получено {type(value).__name__}")
+
+
+class CompiledTemplate:
+    """
+    Скомпилированный шаблон конфигурации
+
+    При компиляции шаблон сохраняется в виде сериализованного скелета,
+    а для каждого плейсхолдера запоминается путь до места подстановки.
+    Рендеринг копирует скелет и заполняет только эти места.
+    """
+
+    __slots__ = ('_skeleton', '_slots', 'placeholders')
+
+    def __init__(self, template: dict):
+        slots = []
+        _collect_slots(template, (), slots)
+
+        unknown = sorted({name for *_, names in slots for name in names
+                          if name not in PLACEHOLDER_TYPES})
+        if unknown:
+            raise ValueError(f"Неизвестные плейсхолдеры в шаблоне: {', '.join(unknown)}")
+
+        self._skeleton = marshal.dumps(template)
+        self._slots = tuple(slots)
+        self.placeholders = frozenset(name for *_, names in slots for name in names)
+
+    def render(self, values: dict) -> dict:
+        """
+        Заполняет шаблон значениями
+
+        Args:
+            values: Словарь {имя_плейсхолдера: значение}
+
+        Returns:
+            Новый словарь конфигурации
+
+        Raises:
+            ValueError: Не заполнены обязательные плейсхолдеры или значение
+                не приводится к типу из PLACEHOLDER_TYPES
+        """
+        checked = None
+        for name in self.placeholders:
+            value = values.get(name)
+            if value is not None and type(value) is not PLACEHOLDER_TYPES[name]:
+                if checked is None:
+                    checked = dict(values)
+                checked[name] = _coerce_value(name, value)
+        if checked is not None:
+            values = checked
+
+        config = marshal.loads(self._skeleton)
+        missing = None
+
+        for path, key, parts, names in self._slots:
+            node = config
+            for step in path:
+                node = node[step]
+
+            if parts is None:
+                # Значение целиком состоит из одного плейсхолдера
+                name = names[0]
+                value = values.get(name)
+                if value is None:
+                    if name in OPTIONAL_PLACEHOLDERS and isinstance(node, dict):
+                        del node[key]
+                        continue
+                    missing = missing or set()
+                    missing.add(name)
+                    continue
+                node[key] = value
+                continue
+
+            # Плейсхолдеры внутри строки
+            chunks = []
+            for i, part in enumerate(parts):
+                if i % 2:
+                    value = values.get(part)
+                    if value is None:
+                        missing = missing or set()
+                        missing.add(part)
+                        break
+                    chunks.append(str(value))
+                else:
+                    chunks.append(part)
+            else:
+                node[key] = ''.join(chunks)
+
+        if missing:
+            raise ValueError(f"Не заполнены плейсхолдеры шаблона: {', '.join(sorted(missing))}")
+
+        return config
+
+
+def _collect_slots(node, path: tuple, slots: list):
+    """Рекурсивно собирает места подстановки плейсхолдеров"""
+    pattern = _placeholder_pattern()
+    if isinstance(node, dict):
+        items = node.items()
+        for key in node:
+            if isinstance(key, str) and pattern.search(key):
+                raise ValueError(f"Плейсхолдеры в ключах шаблона не поддерживаются: {key}")
+    elif isinstance(node, list):
+        items = enumerate(node)
+    else:
+        return
+
+    for key, value in items:
+        if isinstance(value, str):
+            parts = pattern.split(value)
+            if len(parts) == 1:
+                continue
+            names = tuple(parts[1::2])
+            if len(parts) == 3 and parts[0] == '' and parts[2] == '':
+                slots.append((path, key, None, names))
+            else:
+                slots.append((path, key, tuple(parts), names))
+        else:
+            _collect_slots(value, path + (key,), slots)
+
+
+def compile_template(template: dict) -> CompiledTemplate:
+    """
+    Компилирует шаблон для многократного применения
+
     Args:
         template: Шаблон конфигурации
+
+    Returns:
+        Скомпилированный шаблон
+    """
+    return CompiledTemplate(template)
+
+
+def apply_templates(templates, vless_data: dict, custom_tag: str = None) -> dict:
+    """
+    Применяет одни данные VLESS к нескольким шаблонам
+
+    Значения плейсхолдеров вычисляются один раз для всех шаблонов.
+
+    Args:
+        templates: Имена (номера) шаблонов из общего реестра или словарь
+            {ключ: шаблон | CompiledTemplate}
         vless_data: Данные VLESS
         custom_tag: Пользовательский тег (опционально)
-        
+
     Returns:
-        Заполненный шаблон
+        Словарь {имя шаблона или ключ: заполненный шаблон}
+    """
+    if isinstance(templates, dict):
+        compiled = {key: template if isinstance(template, CompiledTemplate) else compile_template(template)
+                    for key, template in templates.items()}
+    else:
+        registry = get_registry()
+        compiled = {}
+        for value in templates:
+            name = registry.resolve(value)
+            compiled[name] = registry.compiled(name)
+
+    values = template_values(vless_data, custom_tag)
+    return {key: template.render(values) for key, template in compiled.items()}
+
+
+def template_values(vless_data: dict, custom_tag: str = None) -> dict:
+    """
+    Подготавливает значения плейсхолдеров из данных VLESS
+
+    Args:
+        vless_data: Данные VLESS
+        custom_tag: Пользовательский тег (опционально)
+
+    Returns:
+        Словарь {имя_плейсхолдера: значение}
     """
     params = vless_data['params']
-    
+
     # Определяем тег: пользовательский, из фрагмента URL, или 'reverse-proxy' по умолчанию
     if custom_tag:
         tag_to_use = custom_tag
@@ -124,40 +646,39 @@ def apply_template(template: dict, vless_data: dict, custom_tag: str = None) ->
         tag_to_use = vless_data['fragment']
     else:
         tag_to_use = 'reverse-proxy'
-    
-    # Подготавливаем данные для замены
-    replacements = {
+
+    return {
         'address': vless_data['server'],
-        'port': str(vless_data['port']),
+        'port': vless_data['port'],
         'id': vless_data['uuid'],
-        'tag': tag_to_use
+        'tag': tag_to_use,
+        'publicKey': params.get('pbk'),
+        'serverName': params.get('sni'),
+        'fingerprint': params.get('fp', 'chrome'),
+        'shortId': params.get('sid'),
+        'spiderX': params.get('spx', '/'),
+        'flow': params.get('flow'),
     }
+
+
+def apply_template(template: 'dict | CompiledTemplate | str', vless_data: dict,
+                   custom_tag: str = None) -> dict:
+    """
+    Применяет данные VLESS к шаблону
     
-    # Добавляем параметры из URL
-    if 'pbk' in params:
-        replacements['publicKey'] = params['pbk']
-    if 'sni' in params:
-        replacements['serverName'] = params['sni']
-    if 'fp' in params:
-        replacements['fingerprint'] = params['fp']
-    else:
-        replacements['fingerprint'] = 'chrome'
-    if 'sid' in params:
-        replacements['shortId'] = params['sid']
-    if 'spx' in params:
-        replacements['spiderX'] = params['spx']
-    else:
-        replacements['spiderX'] = '/'
-    if 'flow' in params:
-        replacements['flow'] = params['flow']
-    
-    # Конвертируем в JSON строку и заменяем плейсхолдеры
-    template_str = json.dumps(template, ensure_ascii=False)
-    
-    for key, value in replacements.items():
-        template_str = template_str.replace(f'{{{{{key}}}}}', value)
-    
-    # Конвертируем port обратно в число
-    template_str = template_str.replace(f'"{vless_data["port"]}"', str(vless_data['port']))
-    
-    return json.loads(template_str) 
\ No newline at end of file
+    Args:
+        template: Шаблон конфигурации, скомпилированный шаблон или имя
+            (номер) шаблона из общего реестра
+        vless_data: Данные VLESS
+        custom_tag: Пользовательский тег (опционально)
+        
+    Returns:
+        Заполненный шаблон
+    """
+    if isinstance(template, str):
+        registry = get_registry()
+        template = registry.compiled(registry.resolve(template))
+    elif not isinstance(template, CompiledTemplate):
+        template = compile_template(template)
+
+    return template.render(template_values(vless_data, custom_tag))
@@ -4,25 +4,108 @@
 Содержит вспомогательные функции для работы с файлами и другими задачами.
 """
 
-import json
-import sys
+import os
 
+from .serialization import get_serializer, PRETTY
 
-def save_to_file(data: dict, filename: str):
+
+def _is_unchanged(path: str, data: bytes) -> bool:
+    """Проверяет, что файл уже содержит ровно эти данные"""
+    try:
+        if os.stat(path).st_size != len(data):
+            return False
+        with open(path, 'rb') as f:
+            return f.read() == data
+    except OSError:
+        return False
+
+
+def fsync_dir(directory: str):
     """
-    Сохраняет данные в файл
+    Сбрасывает на диск запись каталога (новые имена файлов после os.replace)
+
+    Args:
+        directory: Путь к каталогу
+    """
+    if os.name == 'nt':
+        # Windows не позволяет открыть каталог для fsync
+        return
+    fd = os.open(directory or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_atomic(path: str, data: bytes, sync_dir: bool = True) -> bool:
+    """
+    Атомарно записывает данные в файл
+
+    Данные пишутся во временный файл в том же каталоге, сбрасываются
+    на диск и переименовываются поверх целевого файла, поэтому читатель
+    видит либо старое, либо новое содержимое целиком.
+
+    Args:
+        path: Путь к файлу
+        data: Данные для записи
+        sync_dir: Сбросить на диск запись каталога (при пакетной записи
+            делается один раз в конце)
+
+    Returns:
+        True, если файл записан, False, если содержимое не изменилось
+    """
+    if _is_unchanged(path, data):
+        return False
+
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except OSError:
+        mode = None
+
+    directory, name = os.path.split(path)
+    tmp_path = os.path.join(directory, f'.{name}.{os.getpid()}.{os.urandom(4).hex()}.tmp')
+    # 0o666 с учетом umask — те же права, что у обычного open()
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if mode is not None:
+                # Замена сохраняет права существующего файла (например, 0600),
+                # права выставляются до записи данных
+                if hasattr(os, 'fchmod'):
+                    os.fchmod(f.fileno(), mode)
+                else:
+                    os.chmod(tmp_path, mode)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    if sync_dir:
+        fsync_dir(directory)
+    return True
+
+
+def save_to_file(data: dict, filename: str) -> bool:
+    """
+    Атомарно сохраняет данные в файл
     
     Args:
         data: Данные для сохранения
         filename: Имя файла
+        
+    Returns:
+        True, если файл записан, False, если содержимое не изменилось
+        
+    Raises:
+        OSError: Если файл не удалось записать
     """
-    try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
-        print(f"Конфигурация сохранена в файл: {filename}")
-    except Exception as e:
-        print(f"Ошибка сохранения файла: {e}")
-        sys.exit(1)
+    return write_atomic(filename, get_serializer(PRETTY).dumps(data))
 
 
 def format_json_output(data: dict) -> str:
@@ -35,4 +118,4 @@ def format_json_output(data: dict) -> str:
     Returns:
         Отформатированная JSON строка
     """
-    return json.dumps(data, indent=4, ensure_ascii=False) 
\ No newline at end of file
+    return get_serializer(PRETTY).dumps(data).decode('utf-8')
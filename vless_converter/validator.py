@@ -0,0 +1,220 @@
+"""
+Модуль проверки VLESS ссылок
+
+Содержит пакетную проверку ссылок без исключений: каждое замечание
+записывается как Issue (строка, поле, код, сообщение), а итог по всему
+пакету собирается в ValidationReport. Проверки выполняются заранее
+скомпилированными регулярными выражениями и таблицами допустимых значений.
+"""
+
+import re
+import sys
+from typing import Iterable, Iterator, List, NamedTuple, TextIO, Tuple
+
+from .parser import ERROR_MESSAGES, VlessLink, try_parse
+from .generator import supported_networks, supported_security
+
+
+# Коды замечаний
+ISSUE_PARSE = 'parse'
+ISSUE_UUID = 'invalid_uuid'
+ISSUE_PORT = 'port_range'
+ISSUE_PBK = 'invalid_pbk'
+ISSUE_PBK_MISSING = 'missing_pbk'
+ISSUE_SID = 'invalid_sid'
+ISSUE_SECURITY = 'unknown_security'
+ISSUE_NETWORK = 'unknown_network'
+
+ISSUE_MESSAGES = {
+    ISSUE_UUID: "UUID должен иметь вид xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx",
+    ISSUE_PORT: "Порт должен быть в диапазоне 1-65535",
+    ISSUE_PBK: "Публичный ключ REALITY должен состоять из 43 символов base64url",
+    ISSUE_PBK_MISSING: "Для REALITY не указан публичный ключ (pbk)",
+    ISSUE_SID: "shortId должен содержать четное число шестнадцатеричных символов, не более 16",
+    ISSUE_SECURITY: "Неизвестное значение security",
+    ISSUE_NETWORK: "Неизвестный транспорт (type)",
+}
+
+_UUID_MATCH = re.compile(
+    r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}'
+).fullmatch
+_PBK_MATCH = re.compile(r'[A-Za-z0-9_-]{43}').fullmatch
+_SID_MATCH = re.compile(r'(?:[0-9a-fA-F]{2}){0,8}').fullmatch
+
+_NO_ISSUES = ()
+
+
+class Issue(NamedTuple):
+    """Замечание проверки"""
+    line: int
+    field: str
+    code: str
+    message: str
+
+
+def validate_link(link: VlessLink, line_no: int = 0,
+                  securities: frozenset = None, networks: frozenset = None) -> Tuple[Issue, ...]:
+    """
+    Проверяет разобранную ссылку
+
+    Args:
+        link: Разобранная ссылка
+        line_no: Номер строки для записей замечаний
+        securities: Допустимые значения security (по умолчанию из generator)
+        networks: Допустимые транспорты (по умолчанию из generator)
+
+    Returns:
+        Кортеж замечаний (пустой, если ссылка корректна)
+    """
+    if securities is None:
+        securities = supported_security()
+    if networks is None:
+        networks = supported_networks()
+
+    issues = None
+    if not _UUID_MATCH(link.uuid):
+        issues = [Issue(line_no, 'uuid', ISSUE_UUID, ISSUE_MESSAGES[ISSUE_UUID])]
+
+    if not 0 < link.port < 65536:
+        issues = issues or []
+        issues.append(Issue(line_no, 'port', ISSUE_PORT, ISSUE_MESSAGES[ISSUE_PORT]))
+
+    security = link.security
+    if security is not None and security not in securities:
+        issues = issues or []
+        issues.append(Issue(line_no, 'security', ISSUE_SECURITY,
+                            f"{ISSUE_MESSAGES[ISSUE_SECURITY]}: {security}"))
+    elif security == 'reality':
+        if link.pbk is None:
+            issues = issues or []
+            issues.append(Issue(line_no, 'pbk', ISSUE_PBK_MISSING, ISSUE_MESSAGES[ISSUE_PBK_MISSING]))
+        elif not _PBK_MATCH(link.pbk):
+            issues = issues or []
+            issues.append(Issue(line_no, 'pbk', ISSUE_PBK, ISSUE_MESSAGES[ISSUE_PBK]))
+
+    if link.sid is not None and not _SID_MATCH(link.sid):
+        issues = issues or []
+        issues.append(Issue(line_no, 'sid', ISSUE_SID, ISSUE_MESSAGES[ISSUE_SID]))
+
+    network = link.network
+    if network is not None and network not in networks:
+        issues = issues or []
+        issues.append(Issue(line_no, 'type', ISSUE_NETWORK,
+                            f"{ISSUE_MESSAGES[ISSUE_NETWORK]}: {network}"))
+
+    return tuple(issues) if issues else _NO_ISSUES
+
+
+class ValidationReport:
+    """Итог проверки пакета ссылок"""
+
+    def __init__(self):
+        self.total = 0
+        self.valid = 0
+        self.rejected = 0
+        self.counts = {}
+
+    def add(self, issues: Iterable[Issue], rejected: bool = False):
+        """
+        Учитывает результат проверки одной ссылки
+
+        Args:
+            issues: Замечания по ссылке
+            rejected: Ссылка исключена из дальнейшей обработки
+        """
+        self.total += 1
+        if rejected:
+            self.rejected += 1
+        found = False
+        for issue in issues:
+            found = True
+            self.counts[issue.code] = self.counts.get(issue.code, 0) + 1
+        if not found:
+            self.valid += 1
+
+    def to_dict(self) -> dict:
+        """
+        Возвращает итог в виде словаря
+
+        Returns:
+            Словарь с ключами total, valid, rejected, issues
+        """
+        return {
+            'total': self.total,
+            'valid': self.valid,
+            'rejected': self.rejected,
+            'issues': dict(sorted(self.counts.items())),
+        }
+
+    def summary(self) -> str:
+        """
+        Формирует текстовый отчет
+
+        Returns:
+            Отчет: общие счетчики и число замечаний по кодам
+        """
+        lines = [f"Проверка: строк {self.total}, корректных {self.valid}, "
+                 f"с замечаниями {self.total - self.valid}, исключено {self.rejected}"]
+        for code, count in sorted(self.counts.items(), key=lambda item: (-item[1], item[0])):
+            lines.append(f"  {code}: {count}")
+        return '\n'.join(lines)
+
+
+def validate_links(links: Iterable[Tuple[int, str]], report: ValidationReport,
+                   strict: bool = False, err: TextIO = None) -> Iterator[Tuple[int, str]]:
+    """
+    Проверяет поток ссылок и пропускает дальше допустимые
+
+    Неразбираемые ссылки исключаются всегда. В строгом режиме исключаются
+    также ссылки с любыми замечаниями, в мягком они только сообщаются.
+
+    Args:
+        links: Пары (номер строки, ссылка)
+        report: Отчет, в который добавляются результаты
+        strict: Строгий режим
+        err: Поток для сообщений о замечаниях (по умолчанию stderr)
+
+    Yields:
+        Пары (номер строки, ссылка), прошедшие проверку
+    """
+    if err is None:
+        err = sys.stderr
+    securities = supported_security()
+    networks = supported_networks()
+
+    for line_no, text in links:
+        link, code = try_parse(text)
+        if code is not None:
+            issues = (Issue(line_no, 'url', ISSUE_PARSE, ERROR_MESSAGES[code]),)
+            rejected = True
+        else:
+            issues = validate_link(link, line_no, securities, networks)
+            rejected = strict and bool(issues)
+
+        report.add(issues, rejected)
+        for issue in issues:
+            print(f"Строка {issue.line}: {issue.field}: {issue.message}", file=err)
+        if not rejected:
+            yield line_no, text
+
+
+def collect_issues(links: Iterable[Tuple[int, str]]) -> List[Issue]:
+    """
+    Проверяет ссылки и возвращает все замечания списком
+
+    Args:
+        links: Пары (номер строки, ссылка)
+
+    Returns:
+        Список замечаний в порядке строк
+    """
+    securities = supported_security()
+    networks = supported_networks()
+    issues = []
+    for line_no, text in links:
+        link, code = try_parse(text)
+        if code is not None:
+            issues.append(Issue(line_no, 'url', ISSUE_PARSE, ERROR_MESSAGES[code]))
+        else:
+            issues.extend(validate_link(link, line_no, securities, networks))
+    return issues
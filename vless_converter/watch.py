@@ -0,0 +1,358 @@
+"""
+Модуль режима наблюдения
+
+Содержит опрос файлов по stat с подавлением дребезга и инкрементальную
+пересборку результатов: при изменении входного файла конвертируются
+только новые или измененные строки, при изменении шаблона — все ссылки.
+Результаты записываются атомарно, после изменения выходных файлов может
+выполняться пользовательская команда перезагрузки.
+"""
+
+import os
+import sys
+import time
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple
+
+from .batch import convert_links, open_input, read_links
+from .merge import DEFAULT_STRATEGY, build_merged_config
+from .parser import ERROR_MESSAGES, try_parse
+from .serialization import get_serializer, COMPACT, PRETTY
+from .templates import get_registry
+from .utils import fsync_dir, write_atomic
+from .writer import DEFAULT_NAME_PATTERN, DEFAULT_WORKERS, render_filename
+
+
+DEFAULT_INTERVAL = 1.0
+DEFAULT_DEBOUNCE = 0.5
+
+
+def stat_snapshot(paths: Iterable[str]) -> Dict[str, Tuple[int, int]]:
+    """
+    Снимает (mtime_ns, size) файлов
+
+    Для каталога учитываются вложенные файлы *.json.
+
+    Args:
+        paths: Файлы и каталоги
+
+    Returns:
+        Словарь {путь: (mtime_ns, size)}; отсутствующие файлы пропускаются
+    """
+    snapshot = {}
+    for path in paths:
+        try:
+            if os.path.isdir(path):
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if entry.name.endswith('.json') and entry.is_file():
+                            st = entry.stat()
+                            snapshot[entry.path] = (st.st_mtime_ns, st.st_size)
+            else:
+                st = os.stat(path)
+                snapshot[path] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            continue
+    return snapshot
+
+
+def diff_snapshots(old: dict, new: dict) -> set:
+    """
+    Возвращает пути, которые появились, исчезли или изменились
+
+    Args:
+        old: Предыдущий снимок
+        new: Текущий снимок
+
+    Returns:
+        Множество путей
+    """
+    changed = {path for path, stat in new.items() if old.get(path) != stat}
+    changed.update(path for path in old if path not in new)
+    return changed
+
+
+class ChangeWatcher:
+    """Опрос файлов по stat с подавлением дребезга"""
+
+    def __init__(self, paths: List[str], interval: float = DEFAULT_INTERVAL,
+                 debounce: float = DEFAULT_DEBOUNCE):
+        """
+        Args:
+            paths: Файлы и каталоги для наблюдения
+            interval: Период опроса в секундах
+            debounce: Сколько секунд файлы должны оставаться неизменными
+                после изменения, прежде чем оно будет сообщено
+        """
+        self.paths = list(paths)
+        self.interval = interval
+        self.debounce = debounce
+        self._snapshot = stat_snapshot(self.paths)
+
+    def poll(self) -> set:
+        """
+        Проверяет изменения без ожидания
+
+        Returns:
+            Множество измененных путей (пустое, если изменений нет)
+        """
+        current = stat_snapshot(self.paths)
+        changed = diff_snapshots(self._snapshot, current)
+        self._snapshot = current
+        return changed
+
+    def wait(self) -> set:
+        """
+        Ожидает изменения и возвращает его после периода тишины
+
+        Returns:
+            Множество измененных путей
+        """
+        while True:
+            time.sleep(self.interval)
+            changed = self.poll()
+            if changed:
+                break
+
+        # Файл может сохраняться по частям: ждем, пока снимок перестанет меняться
+        step = min(self.interval, self.debounce) or self.debounce
+        quiet_since = time.monotonic()
+        while time.monotonic() - quiet_since < self.debounce:
+            time.sleep(step)
+            more = self.poll()
+            if more:
+                changed |= more
+                quiet_since = time.monotonic()
+        return changed
+
+
+class IncrementalBuilder:
+    """
+    Инкрементальная пересборка результатов для режима наблюдения
+
+    Результат каждой ссылки хранится под ключом ее текста. При изменении
+    содержимого шаблона сконвертированные результаты сбрасываются целиком.
+    """
+
+    def __init__(self, input_path: str, template_value: str = None, tag: str = None,
+                 output: str = None, output_dir: str = None,
+                 name_pattern: str = DEFAULT_NAME_PATTERN, merge: bool = False,
+                 strategy: str = DEFAULT_STRATEGY, json_format: str = None,
+                 err: TextIO = None):
+        """
+        Args:
+            input_path: Файл со ссылками
+            template_value: Шаблон (номер или имя, опционально)
+            tag: Тег для всех конфигураций (в режиме merge — префикс тегов)
+            output: Файл результата (JSONL, а в режиме merge — конфигурация)
+            output_dir: Каталог для отдельных файлов конфигураций
+            name_pattern: Шаблон имени файла для output_dir
+            merge: Объединять ссылки в одну конфигурацию
+            strategy: Стратегия балансировщика для merge
+            json_format: Формат JSON (по умолчанию compact для JSONL, иначе pretty)
+            err: Поток для сообщений (по умолчанию stderr)
+        """
+        if not output and not output_dir:
+            raise ValueError("Для режима наблюдения нужен файл (--output) или каталог (--output-dir)")
+
+        self.input_path = input_path
+        self.template_value = template_value
+        self.tag = tag
+        self.output = output
+        self.output_dir = output_dir
+        self.name_pattern = name_pattern
+        self.merge = merge
+        self.strategy = strategy
+        self.err = err if err is not None else sys.stderr
+
+        jsonl = output and not merge
+        self.serializer = get_serializer(json_format or (COMPACT if jsonl else PRETTY))
+
+        self.converted = 0
+        self.reused = 0
+        self._template_hash = None
+        self._cache = {}
+        self._written = {}
+
+    def template_paths(self) -> List[str]:
+        """Возвращает каталоги шаблонов, за которыми нужно следить"""
+        return list(get_registry().search_paths) if self.template_value else []
+
+    def _refresh_template(self):
+        """Возвращает шаблон, сбрасывая кэш при изменении его содержимого"""
+        if not self.template_value:
+            return None
+
+        registry = get_registry()
+        registry.scan()
+        # Неизвестное имя: resolve бросает ValueError с перечнем доступных шаблонов
+        template_name = registry.resolve(self.template_value)
+
+        template_hash = registry.content_hash(template_name)
+        if template_hash != self._template_hash:
+            # Разобранные ссылки для объединения от шаблона не зависят
+            if not self.merge:
+                self._cache.clear()
+            self._template_hash = template_hash
+        if self.merge:
+            return registry.load(template_name)
+        return registry.compiled(template_name)
+
+    def _convert(self, links: List[Tuple[int, str]], template) -> list:
+        """Конвертирует ссылки, которых нет в кэше, и возвращает значения для всех ссылок"""
+        missing = [(line_no, link) for line_no, link in links if link not in self._cache]
+        self.converted = len(missing)
+        self.reused = len(links) - len(missing)
+
+        if self.merge:
+            # Для объединения хранятся разобранные ссылки
+            for line_no, link in missing:
+                parsed, code = try_parse(link)
+                if code is not None:
+                    print(f"Строка {line_no}: Ошибка парсинга VLESS URL: {ERROR_MESSAGES[code]}",
+                          file=self.err)
+                    self._cache[link] = None
+                else:
+                    self._cache[link] = parsed.to_dict()
+        else:
+            # Для JSONL и отдельных файлов хранятся (конфигурация, закодированные байты)
+            texts = dict(missing)
+            dumps = self.serializer.dumps
+            for result in convert_links(missing, template, self.tag):
+                if result.error is not None:
+                    print(f"Строка {result.line_no}: {result.error}", file=self.err)
+                    value = None
+                else:
+                    value = (result.config, dumps(result.config))
+                self._cache[texts[result.line_no]] = value
+
+        # Удаленные из входа ссылки вытесняются
+        self._cache = {link: self._cache[link] for _, link in links}
+        return [(line_no, self._cache[link]) for line_no, link in links]
+
+    def _write_merged(self, values: list, template) -> bool:
+        links = (data for _, data in values if data is not None)
+        config, _ = build_merged_config(links, template, tag_prefix=self.tag or '',
+                                        strategy=self.strategy)
+        return write_atomic(self.output, self.serializer.dumps(config))
+
+    def _write_jsonl(self, values: list) -> bool:
+        data = b''.join(value[1] + b'\n' for _, value in values if value is not None)
+        return write_atomic(self.output, data)
+
+    def _write_dir(self, values: list) -> bool:
+        files = {}
+        for line_no, value in values:
+            if value is None:
+                continue
+            name = render_filename(self.name_pattern, value[0], line_no)
+            path = os.path.normpath(os.path.join(self.output_dir, name))
+            if path in files:
+                print(f"Строка {line_no}: файл {path} уже записан для другой строки", file=self.err)
+                continue
+            files[path] = value[1]
+
+        # Пишем только файлы, содержимое которых отличается от записанного ранее
+        changed = [(path, data) for path, data in files.items() if self._written.get(path) != data]
+        stale = [path for path in self._written if path not in files]
+
+        dirs = set()
+        if changed:
+            for path, _ in changed:
+                dirs.add(os.path.dirname(path))
+            for directory in dirs:
+                os.makedirs(directory, exist_ok=True)
+            with ThreadPoolExecutor(max_workers=DEFAULT_WORKERS) as pool:
+                written = list(pool.map(lambda item: write_atomic(item[0], item[1], False), changed))
+            if not any(written):
+                dirs.clear()
+
+        # Файлы ссылок, исчезнувших из входа, удаляются; чужие файлы не трогаем
+        for path in stale:
+            try:
+                os.unlink(path)
+                dirs.add(os.path.dirname(path))
+            except FileNotFoundError:
+                pass
+
+        for directory in dirs:
+            fsync_dir(directory)
+        self._written = files
+        return bool(dirs)
+
+    def build(self) -> bool:
+        """
+        Пересобирает результаты
+
+        Returns:
+            True, если хотя бы один выходной файл изменился
+        """
+        template = self._refresh_template()
+        with open_input(self.input_path) as stream:
+            links = list(read_links(stream))
+
+        values = self._convert(links, template)
+        if self.merge:
+            return self._write_merged(values, template)
+        if self.output_dir:
+            return self._write_dir(values)
+        return self._write_jsonl(values)
+
+
+def run_reload(command: str, err: TextIO = None) -> int:
+    """
+    Выполняет команду перезагрузки через оболочку
+
+    Args:
+        command: Команда
+        err: Поток для сообщений (по умолчанию stderr)
+
+    Returns:
+        Код завершения команды
+    """
+    if err is None:
+        err = sys.stderr
+    result = subprocess.run(command, shell=True, check=False)
+    if result.returncode != 0:
+        print(f"Команда перезагрузки завершилась с кодом {result.returncode}", file=err)
+    return result.returncode
+
+
+def watch(builder: IncrementalBuilder, interval: float = DEFAULT_INTERVAL,
+          debounce: float = DEFAULT_DEBOUNCE, reload_command: Optional[str] = None,
+          err: TextIO = None):
+    """
+    Следит за входным файлом и шаблонами и пересобирает результаты
+
+    Работает до прерывания (KeyboardInterrupt). Ошибки пересборки
+    (например, шаблон сохранен не полностью) сообщаются, а наблюдение
+    продолжается.
+
+    Args:
+        builder: Инкрементальный сборщик
+        interval: Период опроса в секундах
+        debounce: Период тишины перед пересборкой в секундах
+        reload_command: Команда, выполняемая после изменения результатов
+        err: Поток для сообщений (по умолчанию stderr)
+    """
+    if err is None:
+        err = sys.stderr
+
+    watcher = ChangeWatcher([os.path.abspath(builder.input_path)] + builder.template_paths(),
+                            interval, debounce)
+    changed = None
+    while True:
+        try:
+            updated = builder.build()
+        except (OSError, ValueError) as e:
+            print(f"Ошибка пересборки: {e}", file=err)
+        else:
+            state = 'результаты обновлены' if updated else 'результаты не изменились'
+            print(f"Сконвертировано: {builder.converted}, из кэша: {builder.reused}, {state}", file=err)
+            if updated and reload_command:
+                run_reload(reload_command, err)
+
+        changed = watcher.wait()
+        names = ', '.join(sorted(os.path.basename(path) for path in changed))
+        print(f"Изменения: {names}", file=err)
@@ -0,0 +1,180 @@
+"""
+Модуль атомарной записи конфигураций
+
+Содержит параллельную раскладку результатов пакетной конвертации по
+отдельным файлам. Каждый файл пишется атомарно (utils.write_atomic),
+файлы с неизменившимся содержимым не перезаписываются, поэтому их mtime
+и завязанные на него перезагрузки не срабатывают.
+"""
+
+import os
+import re
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional, TextIO, Tuple
+
+from .batch import ConversionResult
+from .serialization import Serializer, get_serializer, PRETTY
+from .utils import write_atomic, fsync_dir
+
+
+DEFAULT_NAME_PATTERN = '{tag}.json'
+DEFAULT_WORKERS = 8
+
+_UNSAFE_CHARS = re.compile(r'[^\w.-]+')
+
+
+def sanitize_filename(name: str) -> str:
+    """
+    Приводит строку к безопасному имени файла
+
+    Args:
+        name: Исходная строка (например, тег)
+
+    Returns:
+        Имя без разделителей путей и служебных символов
+    """
+    name = _UNSAFE_CHARS.sub('_', name).lstrip('.')
+    return name or '_'
+
+
+def config_tag(config: dict) -> Optional[str]:
+    """
+    Возвращает тег VLESS outbound конфигурации
+
+    Args:
+        config: Outbound или полная конфигурация из шаблона
+
+    Returns:
+        Тег или None, если он не найден
+    """
+    if config.get('protocol') == 'vless':
+        return config.get('tag')
+    for outbound in config.get('outbounds', ()):
+        if isinstance(outbound, dict) and outbound.get('protocol') == 'vless':
+            return outbound.get('tag')
+    return None
+
+
+def render_filename(pattern: str, config: dict, line_no: int) -> str:
+    """
+    Формирует имя файла по шаблону
+
+    Доступные поля: {tag}, {line}, {address}, {port}. Значения полей
+    очищаются от разделителей путей.
+
+    Args:
+        pattern: Шаблон имени, например "{tag}.json"
+        config: Конфигурация
+        line_no: Номер строки входа
+
+    Returns:
+        Относительный путь файла
+    """
+    vnext = {}
+    outbound = config
+    if config.get('protocol') != 'vless':
+        outbound = next((item for item in config.get('outbounds', ())
+                         if isinstance(item, dict) and item.get('protocol') == 'vless'), {})
+    try:
+        vnext = outbound['settings']['vnext'][0]
+    except (KeyError, IndexError, TypeError):
+        pass
+
+    fields = {
+        'tag': sanitize_filename(config_tag(config) or f'line-{line_no}'),
+        'line': line_no,
+        'address': sanitize_filename(str(vnext.get('address', ''))),
+        'port': vnext.get('port', ''),
+    }
+    try:
+        return pattern.format_map(fields)
+    except (KeyError, IndexError, AttributeError, ValueError) as e:
+        raise ValueError(f"Неверный шаблон имени файла '{pattern}': {e}. "
+                         f"Доступные поля: {', '.join('{' + name + '}' for name in fields)}")
+
+
+def write_files(results: Iterable[ConversionResult], directory: str,
+                pattern: str = DEFAULT_NAME_PATTERN, workers: int = None,
+                serializer: Serializer = None, err: TextIO = None) -> Tuple[int, int, int]:
+    """
+    Раскладывает результаты конвертации по отдельным файлам
+
+    Конфигурации кодируются в вызывающем потоке, а запись выполняется
+    в пуле потоков. Каждый файл пишется атомарно; запись каталогов
+    сбрасывается на диск один раз в конце пакета.
+
+    Args:
+        results: Результаты конвертации
+        directory: Каталог для файлов (создается при необходимости)
+        pattern: Шаблон имени файла
+        workers: Количество потоков записи (по умолчанию: 8)
+        serializer: Сериализатор (по умолчанию pretty)
+        err: Поток для сообщений об ошибках (по умолчанию stderr)
+
+    Returns:
+        Кортеж (записано, без изменений, ошибок)
+    """
+    if err is None:
+        err = sys.stderr
+    if serializer is None:
+        serializer = get_serializer(PRETTY)
+    if workers is None:
+        workers = DEFAULT_WORKERS
+
+    os.makedirs(directory, exist_ok=True)
+    written = 0
+    unchanged = 0
+    failed = 0
+    owners = {}
+    dirs = set()
+
+    def collect(item):
+        nonlocal written, unchanged, failed
+        line_no, path, future = item
+        try:
+            if future.result():
+                written += 1
+                dirs.add(os.path.dirname(path))
+            else:
+                unchanged += 1
+        except OSError as e:
+            failed += 1
+            print(f"Строка {line_no}: Ошибка записи файла {path}: {e}", file=err)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Ограничиваем число закодированных, но не записанных конфигураций
+        max_pending = 4 * workers
+        pending = deque()
+        for result in results:
+            if result.error is not None:
+                failed += 1
+                print(f"Строка {result.line_no}: {result.error}", file=err)
+                continue
+
+            name = render_filename(pattern, result.config, result.line_no)
+            path = os.path.normpath(os.path.join(directory, name))
+            if path in owners:
+                failed += 1
+                print(f"Строка {result.line_no}: файл {path} уже записан для строки {owners[path]}",
+                      file=err)
+                continue
+            owners[path] = result.line_no
+
+            parent = os.path.dirname(path)
+            if parent != os.path.normpath(directory):
+                os.makedirs(parent, exist_ok=True)
+
+            data = serializer.dumps(result.config)
+            pending.append((result.line_no, path, pool.submit(write_atomic, path, data, False)))
+            if len(pending) >= max_pending:
+                collect(pending.popleft())
+
+        while pending:
+            collect(pending.popleft())
+
+    for parent in dirs:
+        fsync_dir(parent)
+
+    return written, unchanged, failed